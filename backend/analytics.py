@@ -0,0 +1,351 @@
+"""Columnar in-memory snapshot of orders for ad-hoc report breakdowns.
+
+The snapshot keeps one NumPy array per column (created day as days since
+1970-01-01 and its month, status code, client type code, manager, totals) for orders and
+for their items, so any date/status/service/client breakdown is a boolean
+mask plus a bincount instead of a table scan.
+
+It is loaded on first use and then refreshed before each query: orders with
+an id above the last loaded one are added (with their items), and orders
+named by `orders.*` events published since the last refresh get their status
+re-read. Orders are never deleted and items never change after creation, so
+nothing else can go stale.
+
+Ids do not commit in order on PostgreSQL (see backend/outbox.py): an id
+missing below the loaded end is looked up again on every refresh for
+GAP_HORIZON_SECONDS, and an `orders.*` event for an order that is not in the
+snapshot loads it. Items are read after their orders and kept only for
+orders that were read, so an order committed between the two reads comes in
+whole with a later refresh.
+
+NumPy is optional: without it `breakdown` raises RuntimeError.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
+from backend.database import get_db, stream_rows
+from backend.outbox import GAP_HORIZON_SECONDS, MAX_TRACKED_GAPS
+from backend.realtime import add_publish_listener
+
+ORDER_STATUSES = (
+    "created", "design", "design_done", "production", "printed",
+    "postprocess", "ready", "closed", "cancelled", "defect",
+)
+CLIENT_TYPES = ("retail", "dealer")
+GROUP_BY = ("day", "week", "month", "status", "client_type", "manager", "service")
+
+_STATUS_CODES = {name: code for code, name in enumerate(ORDER_STATUSES)}
+_CLIENT_CODES = {name: code for code, name in enumerate(CLIENT_TYPES)}
+_EPOCH = date(1970, 1, 1)
+
+# _lock serialises refreshes; the publisher only ever takes _dirty_lock, so
+# the event loop never waits for a snapshot load.
+_lock = threading.Lock()
+_dirty_lock = threading.Lock()
+_snapshot: dict | None = None
+_dirty_order_ids: set[int] = set()
+# Order id missing below the loaded end -> monotonic time after which it is given up on.
+_gaps: dict[int, float] = {}
+LOOKUP_CHUNK = 500
+
+
+def _on_event(kind: str, payload: dict) -> None:
+    if kind.startswith("orders.") and payload.get("order_id"):
+        with _dirty_lock:
+            _dirty_order_ids.add(int(payload["order_id"]))
+
+
+add_publish_listener(_on_event)
+
+
+def _day_number(value) -> int:
+    return (date.fromisoformat(str(value)[:10]) - _EPOCH).days
+
+
+def _columns(query: str, params: tuple) -> list[tuple]:
+    """Read a result as one tuple per column, skipping per-row dict wrapping."""
+    stream = stream_rows(query, params, chunk_size=20000)
+    names = next(stream)
+    rows = [row for chunk in stream for row in chunk]
+    return list(zip(*rows)) if rows else [()] * len(names)
+
+
+def _load(order_where: str, order_params: tuple, item_where: str, item_params: tuple) -> tuple[dict, dict]:
+    """Orders matching order_where, and those of their items that match item_where.
+
+    Items are read after the orders, so they may include items of orders
+    committed in between: only items of orders that were read are kept.
+    """
+    ids, created_day, status, client_type, manager, total, cost = _columns(
+        f"""SELECT id, created_day, status, client_type, created_by, total_price, material_cost
+           FROM orders WHERE {order_where} ORDER BY id""",
+        order_params,
+    )
+    ymd = np.array(created_day, dtype=np.int64)  # YYYYMMDD
+    months = ((ymd // 10000 - 1970) * 12 + ymd // 100 % 100 - 1).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (ymd % 100 - 1)
+    orders = {
+        "id": np.array(ids, dtype=np.int64),
+        "day": days.astype(np.int32),
+        "month": days.astype("datetime64[M]").astype(np.int32),
+        "status": np.array([_STATUS_CODES[s] for s in status], dtype=np.int8),
+        "client_type": np.array([_CLIENT_CODES[c] for c in client_type], dtype=np.int8),
+        "manager": np.array(manager, dtype=np.int32),
+        "total": np.array(total, dtype=np.float64),
+        "material_cost": np.array(cost, dtype=np.float64),
+    }
+    if not len(ids):
+        item_columns = [(), (), ()]
+    else:
+        item_columns = _columns(
+            f"SELECT order_id, service_id, total FROM order_items WHERE {item_where} ORDER BY order_id, id",
+            item_params,
+        )
+    items = {
+        "order_id": np.array(item_columns[0], dtype=np.int64),
+        "service_id": np.array(item_columns[1], dtype=np.int32),
+        "total": np.array(item_columns[2], dtype=np.float64),
+    }
+    loaded = np.isin(items["order_id"], orders["id"])
+    if not loaded.all():
+        items = {k: v[loaded] for k, v in items.items()}
+    return orders, items
+
+
+def _load_ids(order_ids: list[int]) -> tuple[dict, dict]:
+    parts = []
+    for start in range(0, len(order_ids), LOOKUP_CHUNK):
+        chunk = tuple(order_ids[start:start + LOOKUP_CHUNK])
+        placeholders = ",".join("?" * len(chunk))
+        parts.append(_load(f"id IN ({placeholders})", chunk, f"order_id IN ({placeholders})", chunk))
+    return _concat([orders for orders, _ in parts]), _concat([items for _, items in parts])
+
+
+def _concat(parts: list[dict]) -> dict:
+    return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+
+def _positions(order_ids, ids):
+    """Positions of ids in the sorted order_ids, and which of them are really there."""
+    pos = np.searchsorted(order_ids, ids)
+    found = pos < len(order_ids)
+    found[found] = order_ids[pos[found]] == ids[found]
+    return pos, found
+
+
+def _track_gaps(after_id: int, new_ids, now: float) -> None:
+    """Remember the ids in (after_id, last new id) that were not loaded, newest MAX_TRACKED_GAPS only."""
+    if not len(new_ids):
+        return
+    end = int(new_ids[-1])
+    candidates = np.arange(max(after_id + 1, end - MAX_TRACKED_GAPS), end, dtype=np.int64)
+    for order_id in candidates[~np.isin(candidates, new_ids)]:
+        _gaps[int(order_id)] = now + GAP_HORIZON_SECONDS
+    while len(_gaps) > MAX_TRACKED_GAPS:
+        del _gaps[min(_gaps)]
+
+
+def _refresh(db) -> dict:
+    """Bring the snapshot up to date. Called with _lock held.
+
+    Never modifies arrays in place: queries running without the lock keep
+    reading the snapshot they started with.
+    """
+    global _snapshot
+    with _dirty_lock:
+        dirty = sorted(_dirty_order_ids)
+        _dirty_order_ids.clear()
+    now = time.monotonic()
+
+    if _snapshot is None:
+        _gaps.clear()
+        orders, items = _load("id > ?", (0,), "order_id > ?", (0,))
+        _track_gaps(0, orders["id"], now)
+        item_pos = None
+    else:
+        orders, items, item_pos = _snapshot["orders"], _snapshot["items"], _snapshot["item_pos"]
+        last_id = int(orders["id"][-1]) if len(orders["id"]) else 0
+
+        dirty_ids = np.array([order_id for order_id in dirty if order_id <= last_id], dtype=np.int64)
+        pos, found = _positions(orders["id"], dirty_ids)
+        for order_id, deadline in list(_gaps.items()):
+            if deadline < now:
+                del _gaps[order_id]
+        # Ids that committed below the loaded end, and changed orders that were never loaded.
+        late_ids = sorted(set(_gaps) | {int(order_id) for order_id in dirty_ids[~found]})
+
+        dirty_ids, pos = dirty_ids[found], pos[found]
+        for start in range(0, len(dirty_ids), LOOKUP_CHUNK):
+            chunk = [int(order_id) for order_id in dirty_ids[start:start + LOOKUP_CHUNK]]
+            rows = db.execute(
+                f"SELECT id, status FROM orders WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            if rows:
+                if orders["status"] is _snapshot["orders"]["status"]:
+                    orders = {**orders, "status": orders["status"].copy()}
+                ids = np.array([r["id"] for r in rows], dtype=np.int64)
+                row_pos, row_found = _positions(orders["id"], ids)
+                codes = np.array([_STATUS_CODES[r["status"]] for r in rows], dtype=np.int8)
+                orders["status"][row_pos[row_found]] = codes[row_found]
+
+        new_orders, new_items = _load("id > ?", (last_id,), "order_id > ?", (last_id,))
+        _track_gaps(last_id, new_orders["id"], now)
+        parts = [(orders, items), (new_orders, new_items)]
+        if late_ids:
+            late_orders, late_items = _load_ids(late_ids)
+            for order_id in late_orders["id"]:
+                _gaps.pop(int(order_id), None)
+            parts.append((late_orders, late_items))
+
+        late = len(parts) > 2 and len(parts[2][0]["id"]) > 0
+        if any(len(part_orders["id"]) for part_orders, _ in parts[1:]):
+            orders = _concat([part_orders for part_orders, _ in parts])
+        if any(len(part_items["order_id"]) for _, part_items in parts[1:]):
+            items = _concat([part_items for _, part_items in parts])
+            item_pos = None
+        if late:
+            # Late orders belong below the loaded end: keep both tables in order id order.
+            order = np.argsort(orders["id"], kind="stable")
+            orders = {k: v[order] for k, v in orders.items()}
+            order = np.argsort(items["order_id"], kind="stable")
+            items = {k: v[order] for k, v in items.items()}
+            item_pos = None
+
+    if item_pos is None:
+        # Item -> order position, for filtering items by order columns.
+        item_pos = np.searchsorted(orders["id"], items["order_id"])
+    _snapshot = {"orders": orders, "items": items, "item_pos": item_pos}
+    return _snapshot
+
+
+def reset_snapshot() -> None:
+    """Drop the snapshot; the next query reloads it from the database."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+        _gaps.clear()
+
+
+def _group_keys(group_by: str, orders: dict, index, service_id):
+    """Group key per selected row; index selects order rows (mask or positions)."""
+    if group_by == "service":
+        return service_id
+    if group_by == "week":
+        day = orders["day"][index]
+        # Monday of the week; day 0 (1970-01-01) was a Thursday.
+        return day - (day + 3) % 7
+    return orders[group_by][index]
+
+
+def _group(keys):
+    """(sorted distinct keys, group index of every element), like np.unique(return_inverse=True).
+
+    Keys here are small integers (days, codes, ids), so a dense bincount over
+    their range replaces the sort np.unique would do.
+    """
+    if not len(keys):
+        return keys[:0], np.zeros(0, dtype=np.int64)
+    low = int(keys.min())
+    offsets = keys.astype(np.int64) - low
+    span = int(offsets.max()) + 1
+    if span > 1 << 20:
+        return np.unique(keys, return_inverse=True)
+    present = np.flatnonzero(np.bincount(offsets, minlength=span))
+    lookup = np.zeros(span, dtype=np.int64)
+    lookup[present] = np.arange(len(present))
+    return present + low, lookup[offsets]
+
+
+def _label(group_by: str, key: int):
+    if group_by in ("day", "week"):
+        return (_EPOCH + timedelta(days=key)).isoformat()
+    if group_by == "month":
+        return f"{1970 + key // 12:04d}-{key % 12 + 1:02d}"
+    if group_by == "status":
+        return ORDER_STATUSES[key]
+    if group_by == "client_type":
+        return CLIENT_TYPES[key]
+    return key
+
+
+def breakdown(
+    group_by: str,
+    date_from: str = "",
+    date_to: str = "",
+    statuses: list[str] | None = None,
+    service_ids: list[int] | None = None,
+    client_type: str = "",
+) -> list[dict]:
+    """Orders grouped by one dimension, filtered by date range, status, service and client type.
+
+    Order-level groups return orders_count, revenue and material_cost. When
+    grouping by service or filtering by services, figures come from the
+    matching items: items_count, orders_count (distinct orders) and revenue.
+    """
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+    if group_by not in GROUP_BY:
+        raise ValueError(f"unknown group_by: {group_by}")
+
+    db = get_db()
+    with _lock:
+        snap = _refresh(db)
+    db.close()
+    orders, items, item_pos = snap["orders"], snap["items"], snap["item_pos"]
+
+    mask = np.ones(len(orders["id"]), dtype=bool)
+    if date_from:
+        mask &= orders["day"] >= _day_number(date_from)
+    if date_to:
+        mask &= orders["day"] <= _day_number(date_to)
+    if statuses:
+        mask &= np.isin(orders["status"], [_STATUS_CODES[s] for s in statuses])
+    if client_type:
+        mask &= orders["client_type"] == _CLIENT_CODES[client_type]
+
+    if group_by == "service" or service_ids:
+        item_mask = mask[item_pos]
+        if service_ids:
+            item_mask &= np.isin(items["service_id"], service_ids)
+        pos = item_pos[item_mask]
+        keys = _group_keys(group_by, orders, pos, items["service_id"][item_mask])
+        groups, inverse = _group(keys)
+        items_count = np.bincount(inverse, minlength=len(groups))
+        revenue = np.bincount(inverse, weights=items["total"][item_mask], minlength=len(groups))
+        # Distinct orders per group: distinct (order position, group) pairs.
+        # Items are stored in order id order, so the stable sort is near-linear.
+        pairs = np.sort(pos.astype(np.int64) * max(len(groups), 1) + inverse, kind="stable")
+        first = np.ones(len(pairs), dtype=bool)
+        first[1:] = pairs[1:] != pairs[:-1]
+        orders_count = np.bincount(pairs[first] % max(len(groups), 1), minlength=len(groups))
+        return [
+            {
+                "key": _label(group_by, int(key)),
+                "items_count": int(items_count[i]),
+                "orders_count": int(orders_count[i]),
+                "revenue": round(float(revenue[i]), 2),
+            }
+            for i, key in enumerate(groups)
+        ]
+
+    keys = _group_keys(group_by, orders, mask, None)
+    groups, inverse = _group(keys)
+    orders_count = np.bincount(inverse, minlength=len(groups))
+    revenue = np.bincount(inverse, weights=orders["total"][mask], minlength=len(groups))
+    material_cost = np.bincount(inverse, weights=orders["material_cost"][mask], minlength=len(groups))
+    return [
+        {
+            "key": _label(group_by, int(key)),
+            "orders_count": int(orders_count[i]),
+            "revenue": round(float(revenue[i]), 2),
+            "material_cost": round(float(material_cost[i]), 2),
+        }
+        for i, key in enumerate(groups)
+    ]
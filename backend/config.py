@@ -28,3 +28,52 @@ DB_ENGINE = "postgres" if DATABASE_URL.startswith(("postgres://", "postgresql://
 JWT_EXPIRY_HOURS = 72
 UPLOAD_DIR = os.getenv("POLYCONTROL_UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
 ALLOWED_ROLES = ("director", "manager", "designer", "master", "assistant")
+
+# What to do when a realtime client's queue is full: drop_oldest | resync | disconnect
+REALTIME_QUEUE_SIZE = int(os.getenv("POLYCONTROL_REALTIME_QUEUE_SIZE", "128"))
+REALTIME_OVERFLOW_POLICY = os.getenv("POLYCONTROL_REALTIME_OVERFLOW", "resync").strip().lower()
+REALTIME_HEARTBEAT_SECONDS = float(os.getenv("POLYCONTROL_REALTIME_HEARTBEAT", "15"))
+
+# Outbox relay: poll interval (picks up commits from other workers) and rows kept for replay.
+OUTBOX_POLL_SECONDS = float(os.getenv("POLYCONTROL_OUTBOX_POLL", "1"))
+OUTBOX_RETENTION_ROWS = int(os.getenv("POLYCONTROL_OUTBOX_RETENTION", "10000"))
+
+# Server-side cache for expensive GET responses (reports, payroll, work journal).
+RESPONSE_CACHE_MAX_BYTES = int(float(os.getenv("POLYCONTROL_RESPONSE_CACHE_MB", "32")) * 1024 * 1024)
+# How long an invalidated report may still be served while it is recomputed in the background (0 = never).
+REPORT_MAX_STALE_SECONDS = float(os.getenv("POLYCONTROL_REPORT_MAX_STALE", "30"))
+
+# API responses from this size (bytes) are sent gzip/brotli-compressed when the client accepts it.
+COMPRESSION_MIN_BYTES = int(os.getenv("POLYCONTROL_COMPRESS_MIN_BYTES", "1024"))
+
+# Bearer token for GET /metrics. Loopback clients are let in without it only on
+# explicit opt-in: behind a reverse proxy every client connects from 127.0.0.1.
+# With neither, the endpoint does not exist (404).
+METRICS_TOKEN = os.getenv("POLYCONTROL_METRICS_TOKEN", "").strip()
+METRICS_ALLOW_LOCAL = os.getenv("POLYCONTROL_METRICS_ALLOW_LOCAL", "").strip().lower() in ("1", "true", "yes", "on")
+
+# SQL tracing: statements from this many ms go to the slow-query log with their plan;
+# per-statement traces of the last N requests are kept for /api/debug/sql (0 = counts only).
+SQL_SLOW_MS = float(os.getenv("POLYCONTROL_SQL_SLOW_MS", "200"))
+SQL_TRACE_REQUESTS = int(os.getenv("POLYCONTROL_SQL_TRACE_REQUESTS", "200"))
+
+# On-demand profiling of single requests by the director (X-Profile header); off = no hooks at all.
+PROFILING_ENABLED = os.getenv("POLYCONTROL_PROFILING", "").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_DIR = os.getenv("POLYCONTROL_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+# Threads for running independent report queries in parallel (1 = sequential).
+# On SQLite the queries share the app's CPU and opening extra connections costs
+# more than it saves for small reads, so fan-out is on by default only for Postgres.
+QUERY_FANOUT_WORKERS = int(os.getenv("POLYCONTROL_QUERY_FANOUT_WORKERS", "4" if DB_ENGINE == "postgres" else "1"))
+# PostgreSQL connections per worker process. Sizing: the fan-out threads keep
+# QUERY_FANOUT_WORKERS of them (when > 1), everything else (requests, the
+# outbox relay, cache refreshes, report jobs) shares the rest and waits up to
+# DB_POOL_TIMEOUT seconds for a free one instead of failing. So DB_POOL_MAX
+# should be QUERY_FANOUT_WORKERS + the concurrent requests to serve without
+# waiting, and workers * DB_POOL_MAX must stay below the server's max_connections.
+DB_POOL_MAX = int(os.getenv("POLYCONTROL_DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("POLYCONTROL_DB_POOL_TIMEOUT", "30"))
+
+# Background report jobs: worker threads per process and how long results are kept.
+REPORT_JOB_WORKERS = int(os.getenv("POLYCONTROL_REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_RETENTION_HOURS = float(os.getenv("POLYCONTROL_REPORT_JOB_RETENTION_HOURS", "24"))
@@ -1,9 +1,24 @@
 ﻿import sqlite3
-from typing import Any, Iterable
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from datetime import date
+from typing import Any, Callable, Iterable
 import os
 import mimetypes
 
-from backend.config import DB_ENGINE, DB_PATH, DATABASE_URL, UPLOAD_DIR
+from backend.config import (
+    DB_ENGINE,
+    DB_PATH,
+    DB_POOL_MAX,
+    DB_POOL_TIMEOUT,
+    DATABASE_URL,
+    QUERY_FANOUT_WORKERS,
+    SQL_TRACE_REQUESTS,
+    UPLOAD_DIR,
+)
+from backend.sql_trace import SLOW_SQL_SECONDS, collect_statement, log_slow_query, statement_collectors
 
 try:
     import psycopg2
@@ -11,6 +26,33 @@ except Exception:  # pragma: no cover
     psycopg2 = None
 
 
+# Queries run by the current request and the seconds they took (see backend/metrics.py),
+# with each statement when tracing is on (see backend/sql_trace.py).
+_sql_usage: ContextVar[dict | None] = ContextVar("sql_usage", default=None)
+
+_connections_lock = threading.Lock()
+_open_connections = 0
+
+
+def track_sql_usage(request_id: str | None = None) -> dict:
+    """Start counting this context's queries; returns the dict execute() adds to."""
+    usage = {
+        "request_id": request_id,
+        "queries": 0,
+        "seconds": 0.0,
+        # (sql, parameter types, seconds) per statement
+        "statements": [] if SQL_TRACE_REQUESTS > 0 else None,
+    }
+    _sql_usage.set(usage)
+    return usage
+
+
+def _count_connection(delta: int) -> None:
+    global _open_connections
+    with _connections_lock:
+        _open_connections += delta
+
+
 class RowCompat(dict):
     """Dict-like row with both key and numeric index access."""
 
@@ -61,6 +103,9 @@ class DBCompat:
     def __init__(self, conn, engine: str):
         self._conn = conn
         self._engine = engine
+        self._on_commit: list = []
+        self._closed = False
+        _count_connection(1)
 
     def execute(self, query: str, params: Iterable[Any] | Any = ()):  # noqa: ANN401
         sql = _normalize_sql(query, self._engine)
@@ -80,7 +125,19 @@ class DBCompat:
             )
 
         cur = self._conn.cursor()
+        started = time.perf_counter()
         cur.execute(sql, args)
+        elapsed = time.perf_counter() - started
+        usage = _sql_usage.get()
+        if usage is not None:
+            usage["queries"] += 1
+            usage["seconds"] += elapsed
+            if usage["statements"] is not None:
+                usage["statements"].append((sql, tuple(map(type, args)), elapsed))
+        if elapsed >= SLOW_SQL_SECONDS:
+            log_slow_query(self._conn, self._engine, sql, args, elapsed, usage)
+        if statement_collectors:
+            collect_statement(sql, args)
 
         lastrowid = getattr(cur, "lastrowid", None)
         if self._engine == "postgres" and sql.lstrip().upper().startswith("INSERT"):
@@ -94,14 +151,31 @@ class DBCompat:
 
         return CursorCompat(cur, self._engine, lastrowid=lastrowid)
 
+    def on_commit(self, callback) -> None:
+        """Run callback after the current transaction commits; dropped on rollback/close."""
+        self._on_commit.append(callback)
+
     def commit(self):
         self._conn.commit()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
 
     def rollback(self):
         self._conn.rollback()
+        self._on_commit = []
+
+    def _release(self) -> bool:
+        self._on_commit = []
+        if self._closed:
+            return False
+        self._closed = True
+        _count_connection(-1)
+        return True
 
     def close(self):
-        self._conn.close()
+        if self._release():
+            self._conn.close()
 
 
 def _qmark_to_pyformat(sql: str) -> str:
@@ -139,38 +213,62 @@ def _normalize_sql(sql: str, engine: str) -> str:
 
 
 _pg_pool = None
+_pg_pool_lock = threading.Lock()
+# psycopg2's pool raises PoolError when it is empty instead of waiting. Fan-out
+# threads own QUERY_FANOUT_WORKERS connections (there are no more of them), all
+# other connections wait for one of the remaining slots (see DB_POOL_MAX in config.py).
+_FANOUT_CONNECTIONS = QUERY_FANOUT_WORKERS if QUERY_FANOUT_WORKERS > 1 else 0
+_pg_slots = threading.BoundedSemaphore(max(1, DB_POOL_MAX - _FANOUT_CONNECTIONS))
 
 
 def _get_pg_pool():
     global _pg_pool
-    if _pg_pool is None:
-        from psycopg2.pool import SimpleConnectionPool
-        _pg_pool = SimpleConnectionPool(2, 10, DATABASE_URL)
+    with _pg_pool_lock:
+        if _pg_pool is None:
+            # Threaded: sync routes and fan_out_reads take connections from many threads.
+            from psycopg2.pool import ThreadedConnectionPool
+            _pg_pool = ThreadedConnectionPool(2, DB_POOL_MAX, DATABASE_URL)
     return _pg_pool
 
 
 class PooledDBCompat(DBCompat):
     """DBCompat that returns connection to pool on close()."""
 
-    def __init__(self, conn, engine, pool):
+    def __init__(self, conn, engine, pool, slot: bool = False):
         super().__init__(conn, engine)
         self._pool = pool
+        self._slot = slot
 
     def close(self):
-        self._pool.putconn(self._conn)
+        if self._release():
+            self._pool.putconn(self._conn)
+            if self._slot:
+                _pg_slots.release()
+
+
+def _pg_connection(fanout: bool = False) -> PooledDBCompat:
+    if not DATABASE_URL:
+        raise RuntimeError("POLYCONTROL_DATABASE_URL is not configured")
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 is not installed. Add psycopg2-binary to requirements")
+
+    pool = _get_pg_pool()
+    if not fanout and not _pg_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        from psycopg2.pool import PoolError
+        raise PoolError(f"no free database connection in {DB_POOL_TIMEOUT:g}s")
+    try:
+        conn = pool.getconn()
+        conn.autocommit = False
+    except Exception:
+        if not fanout:
+            _pg_slots.release()
+        raise
+    return PooledDBCompat(conn, "postgres", pool, slot=not fanout)
 
 
 def get_db():
     if DB_ENGINE == "postgres":
-        if not DATABASE_URL:
-            raise RuntimeError("POLYCONTROL_DATABASE_URL is not configured")
-        if psycopg2 is None:
-            raise RuntimeError("psycopg2 is not installed. Add psycopg2-binary to requirements")
-
-        pool = _get_pg_pool()
-        conn = pool.getconn()
-        conn.autocommit = False
-        return PooledDBCompat(conn, "postgres", pool)
+        return _pg_connection()
 
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -179,6 +277,105 @@ def get_db():
     return DBCompat(conn, "sqlite")
 
 
+def db_pool_stats() -> dict:
+    """Connections of this worker: open ones, and on PostgreSQL the pool's idle and max."""
+    stats = {"engine": DB_ENGINE, "open": _open_connections}
+    if _pg_pool is not None:
+        stats.update(
+            in_use=len(_pg_pool._used),
+            idle=len(_pg_pool._pool),
+            max=_pg_pool.maxconn,
+            fanout_reserved=_FANOUT_CONNECTIONS,
+            free_slots=_pg_slots._value,
+        )
+    return stats
+
+
+def stream_rows(query: str, params: Iterable[Any] = (), chunk_size: int = 2000):
+    """Yield the result of a large read as lists of up to chunk_size tuples.
+
+    Postgres uses a named (server-side) cursor, SQLite steps its cursor, so
+    memory stays flat however many rows match. The first chunk is the column
+    name list. Meant for StreamingResponse, which may resume the generator on
+    a different threadpool thread, hence check_same_thread=False on SQLite.
+    """
+    sql = _normalize_sql(query, DB_ENGINE)
+    args = tuple(params)
+    if DB_ENGINE == "postgres":
+        db = get_db()
+        cur = db._conn.cursor(name="stream_rows")
+        cur.itersize = chunk_size
+    else:
+        db = DBCompat(sqlite3.connect(DB_PATH, check_same_thread=False), "sqlite")
+        cur = db._conn.cursor()
+    try:
+        cur.execute(sql, args)
+        first = cur.fetchmany(chunk_size)
+        yield [d[0] for d in cur.description]
+        chunk = first
+        while chunk:
+            yield chunk
+            chunk = cur.fetchmany(chunk_size)
+    finally:
+        cur.close()
+        if DB_ENGINE == "postgres":
+            db.rollback()
+        db.close()
+
+
+_fanout_executor: ThreadPoolExecutor | None = None
+# Set while a fan_out_reads job runs (see fan_out_reads).
+_in_fanout_job: ContextVar[bool] = ContextVar("in_fanout_job", default=False)
+
+
+def _run_jobs(db, jobs: dict[str, Callable]) -> dict[str, Any]:
+    token = _in_fanout_job.set(True)
+    try:
+        return {name: job(db) for name, job in jobs.items()}
+    finally:
+        _in_fanout_job.reset(token)
+
+
+def _run_read(job: Callable, fanout: bool = False):
+    db = _pg_connection(fanout=True) if fanout and DB_ENGINE == "postgres" else get_db()
+    try:
+        return _run_jobs(db, {"job": job})["job"]
+    finally:
+        db.close()
+
+
+def fan_out_reads(jobs: dict[str, Callable]) -> dict[str, Any]:
+    """Run independent read jobs `job(db) -> rows` concurrently, each on its own connection.
+
+    The first job runs in the calling thread, the rest in a shared pool of
+    POLYCONTROL_QUERY_FANOUT_WORKERS threads, so latency is the slowest query
+    rather than the sum. Jobs see separate snapshots: only group reads that
+    do not have to agree row for row. Rows must be fetched inside the job.
+    A job must not call fan_out_reads again (it would wait for pool threads
+    its siblings may hold, and for connections on top of its own): that
+    raises RuntimeError, run the queries on the job's db instead.
+    """
+    global _fanout_executor
+    if _in_fanout_job.get():
+        raise RuntimeError("fan_out_reads called from a fan_out_reads job: use the job's db")
+    names = list(jobs)
+    if QUERY_FANOUT_WORKERS <= 1 or len(names) <= 1:
+        db = get_db()
+        try:
+            return _run_jobs(db, jobs)
+        finally:
+            db.close()
+
+    if _fanout_executor is None:
+        _fanout_executor = ThreadPoolExecutor(max_workers=QUERY_FANOUT_WORKERS, thread_name_prefix="db-fanout")
+    # Each job gets a copy of the caller's context, so its queries count for the request.
+    futures = {name: _fanout_executor.submit(copy_context().run, _run_read, jobs[name], True) for name in names[1:]}
+    results = {names[0]: _run_read(jobs[names[0]])}
+    for name, future in futures.items():
+        results[name] = future.result()
+    return {name: results[name] for name in names}
+
+
 SQLITE_SCHEMA = """
 CREATE TABLE IF NOT EXISTS users (
     id            INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -428,6 +625,70 @@ CREATE TABLE IF NOT EXISTS client_notifications (
     sent_at       TEXT
 );
 
+CREATE TABLE IF NOT EXISTS realtime_outbox (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind            TEXT    NOT NULL,
+    channels        TEXT    NOT NULL DEFAULT '[]',
+    cache_prefixes  TEXT    NOT NULL DEFAULT '[]',
+    payload         TEXT    NOT NULL DEFAULT '{}',
+    user_ids        TEXT    NOT NULL DEFAULT '[]',
+    roles           TEXT    NOT NULL DEFAULT '[]',
+    created_at      TEXT    NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id               TEXT    PRIMARY KEY,
+    kind             TEXT    NOT NULL,
+    params           TEXT    NOT NULL DEFAULT '{}',
+    dedupe_key       TEXT    NOT NULL,
+    status           TEXT    NOT NULL DEFAULT 'queued' CHECK(status IN ('queued','running','done','failed')),
+    requested_by     INTEGER NOT NULL REFERENCES users(id),
+    data_version     TEXT,
+    result           TEXT,
+    error            TEXT,
+    created_at       TEXT    NOT NULL DEFAULT (datetime('now')),
+    started_at       TEXT,
+    finished_at      TEXT
+);
+
+-- Daily rollups for finance reports, maintained by backend/rollups.py
+CREATE TABLE IF NOT EXISTS report_daily_orders (
+    day             TEXT    NOT NULL,
+    status          TEXT    NOT NULL,
+    orders_count    INTEGER NOT NULL DEFAULT 0,
+    revenue         REAL    NOT NULL DEFAULT 0,
+    material_cost   REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+);
+
+CREATE TABLE IF NOT EXISTS report_daily_services (
+    day             TEXT    NOT NULL,
+    service_id      INTEGER NOT NULL,
+    items_count     INTEGER NOT NULL DEFAULT 0,
+    revenue         REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, service_id)
+);
+
+CREATE TABLE IF NOT EXISTS report_daily_penalties (
+    day             TEXT    PRIMARY KEY,
+    incidents_count INTEGER NOT NULL DEFAULT 0,
+    penalties_total REAL    NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS report_daily_employees (
+    day             TEXT    NOT NULL,
+    user_id         INTEGER NOT NULL,
+    days_worked     INTEGER NOT NULL DEFAULT 0,
+    transitions     INTEGER NOT NULL DEFAULT 0,
+    design_done     INTEGER NOT NULL DEFAULT 0,
+    printed         INTEGER NOT NULL DEFAULT 0,
+    ready           INTEGER NOT NULL DEFAULT 0,
+    incidents_count INTEGER NOT NULL DEFAULT 0,
+    fines_count     INTEGER NOT NULL DEFAULT 0,
+    fines_total     REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
 CREATE INDEX IF NOT EXISTS idx_orders_assigned_designer ON orders(assigned_designer);
@@ -445,6 +706,7 @@ CREATE INDEX IF NOT EXISTS idx_leave_requests_user_dates ON leave_requests(user_
 CREATE INDEX IF NOT EXISTS idx_leave_requests_status_dates ON leave_requests(status, date_start, date_end);
 CREATE INDEX IF NOT EXISTS idx_leave_requests_created_at ON leave_requests(created_at);
 CREATE INDEX IF NOT EXISTS idx_tasks_done_at_assigned ON tasks(done_at, assigned_to);
+CREATE INDEX IF NOT EXISTS idx_report_jobs_dedupe ON report_jobs(dedupe_key, created_at);
 """
 
 SHIFT_TASK_SEED = [
@@ -460,6 +722,52 @@ SHIFT_TASK_SEED = [
     ("manager", "Закрыл смену", 1),
 ]
 
+# Integer YYYYMMDD copies of the TEXT timestamps that reports filter and
+# group on, as generated columns: every writer keeps them right, and integer
+# ranges use the indexes below instead of comparing/parsing text per row.
+DAY_COLUMNS = (
+    ("orders", "created_day", "created_at"),
+    ("order_history", "created_day", "created_at"),
+    ("incidents", "created_day", "created_at"),
+    ("material_ledger", "created_day", "created_at"),
+    ("tasks", "done_day", "done_at"),
+)
+
+DAY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_orders_created_day ON orders(created_day);
+CREATE INDEX IF NOT EXISTS idx_order_history_status_day ON order_history(new_status, created_day, changed_by);
+CREATE INDEX IF NOT EXISTS idx_order_history_day_user ON order_history(created_day, changed_by);
+CREATE INDEX IF NOT EXISTS idx_incidents_day_user ON incidents(created_day, user_id, deduction_amount);
+CREATE INDEX IF NOT EXISTS idx_material_ledger_action_day ON material_ledger(action, created_day, material_id, quantity);
+CREATE INDEX IF NOT EXISTS idx_tasks_done_day ON tasks(done_day, assigned_to, is_done)
+"""
+
+
+def _day_expression(column: str) -> str:
+    # Plain text -> integer functions: immutable, as Postgres requires for generated columns.
+    return f"CAST(substr({column}, 1, 4) || substr({column}, 6, 2) || substr({column}, 9, 2) AS INTEGER)"
+
+
+def day_key(value) -> int:
+    """YYYYMMDD of a date or 'YYYY-MM-DD...' string, as stored in the *_day columns.
+
+    Raises ValueError for anything that is not a valid date.
+    """
+    return int(date.fromisoformat(str(value)[:10]).strftime("%Y%m%d"))
+
+
+def day_range(column: str, date_from="", date_to="") -> tuple[list[str], list[int]]:
+    """Conditions on an integer *_day column, both ends inclusive."""
+    conditions = []
+    params = []
+    if date_from:
+        conditions.append(f"{column} >= ?")
+        params.append(day_key(date_from))
+    if date_to:
+        conditions.append(f"{column} <= ?")
+        params.append(day_key(date_to))
+    return conditions, params
+
 
 def _image_mime_or_default(photo_file: str, existing_mime: str | None) -> str:
     mime = (existing_mime or "").strip().lower()
@@ -637,6 +945,17 @@ def _init_sqlite(conn):
                 (role, title, required),
             )
 
+    for table, day_column, source in DAY_COLUMNS:
+        # table_xinfo: table_info does not list generated columns.
+        columns = {r[1] for r in cur.execute(f"PRAGMA table_xinfo({table})").fetchall()}
+        if day_column not in columns:
+            # ALTER TABLE can only add VIRTUAL generated columns; the index stores the values.
+            cur.execute(
+                f"ALTER TABLE {table} ADD COLUMN {day_column} INTEGER "
+                f"GENERATED ALWAYS AS ({_day_expression(source)}) VIRTUAL"
+            )
+    _run_script(cur, DAY_INDEXES)
+
     _backfill_photo_blobs_sqlite(cur)
 
     conn.commit()
@@ -705,6 +1024,19 @@ def _init_postgres(conn):
                 (role, title, required),
             )
 
+    for table, day_column, source in DAY_COLUMNS:
+        cur.execute(
+            """SELECT column_name FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name = %s""",
+            (table,),
+        )
+        if day_column not in {r[0] for r in cur.fetchall()}:
+            cur.execute(
+                f"ALTER TABLE {table} ADD COLUMN {day_column} INTEGER "
+                f"GENERATED ALWAYS AS ({_day_expression(source)}) STORED"
+            )
+    _run_script(cur, DAY_INDEXES)
+
     _backfill_photo_blobs_postgres(cur)
 
     conn.commit()
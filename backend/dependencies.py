@@ -7,7 +7,17 @@ def get_current_user(request: Request) -> dict:
     auth = request.headers.get("Authorization", "")
     if not auth.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
-    token = auth[7:]
+    return get_user_by_token(auth[7:])
+
+
+def token_user_id(request: Request) -> int | None:
+    """User id of a valid bearer token, without a database lookup."""
+    auth = request.headers.get("Authorization", "")
+    payload = decode_token(auth[7:]) if auth.startswith("Bearer ") else None
+    return payload.get("sub") if payload else None
+
+
+def get_user_by_token(token: str) -> dict:
     payload = decode_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
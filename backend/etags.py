@@ -0,0 +1,128 @@
+"""ETag / If-None-Match validation for JSON GET endpoints, driven by data versions.
+
+Every cache prefix has a data version: the highest outbox id of an event
+that listed it in cache_prefixes. An endpoint declares the prefixes its
+data depends on (@versioned, or the depends_on of @cached_response); its
+ETag combines their versions with the path, the normalized query, the
+caller's user id and role and today's date. That is all known before the
+handler runs, so the conditional_get middleware in backend/main.py answers
+a matching If-None-Match with 304 without touching the database.
+
+Outbox ids are global, so a version means the same on every worker, and the
+relay publishes them in id order, so relayed versions only grow. An id that
+commits late on PostgreSQL is published below the relay's position, where
+the highest id would not change: its prefixes count it separately, so the
+version still changes (workers that saw it in order and workers that saw it
+late then differ, which only costs a full response). A commit in this
+worker also marks its prefixes right away (pending until the relay gets
+there): the writer never revalidates its own change into a 304.
+"""
+import hashlib
+import threading
+from datetime import date
+
+from starlette.routing import Match
+
+from backend.auth import decode_token
+
+# Role changes and deactivation go through /api/users: every ETag depends on it.
+ALWAYS_DEPENDS_ON = ("/api/users",)
+
+_lock = threading.Lock()
+_relayed: dict[str, int] = {}
+_pending: dict[str, int] = {}
+# Events published below the relay position (committed late), per prefix.
+_late: dict[str, int] = {}
+_relay_position = 0
+_baseline = 0
+
+
+def _overlaps(dependency: str, prefix: str) -> bool:
+    return dependency.startswith(prefix) or prefix.startswith(dependency)
+
+
+def set_version_baseline(event_id: int) -> None:
+    """Versions start at the outbox end seen at startup, never below older ETags' versions."""
+    global _baseline
+    _baseline = max(_baseline, event_id)
+
+
+def mark_committed(prefixes: list[str] | None, event_id: int) -> None:
+    """An event was committed in this worker; the relay has not published it yet."""
+    with _lock:
+        for prefix in prefixes or ():
+            _pending[prefix] = max(_pending.get(prefix, 0), event_id)
+
+
+def mark_relayed(prefixes: list[str] | None, event_id: int) -> None:
+    """The relay published an event (called from publish_event)."""
+    global _relay_position
+    with _lock:
+        late = event_id < _relay_position
+        _relay_position = max(_relay_position, event_id)
+        for prefix in prefixes or ():
+            _relayed[prefix] = max(_relayed.get(prefix, 0), event_id)
+            if late:
+                _late[prefix] = _late.get(prefix, 0) + 1
+            if _pending.get(prefix, 0) <= event_id:
+                _pending.pop(prefix, None)
+
+
+def data_version(depends_on) -> str:
+    depends_on = (*ALWAYS_DEPENDS_ON, *depends_on)
+    with _lock:
+        relayed = max(
+            [_baseline] + [v for p, v in _relayed.items() if any(_overlaps(d, p) for d in depends_on)]
+        )
+        pending = max(
+            [0] + [v for p, v in _pending.items() if any(_overlaps(d, p) for d in depends_on)]
+        )
+        late = sum(v for p, v in _late.items() if any(_overlaps(d, p) for d in depends_on))
+    return f"{relayed}.{pending}.{late}" if late else f"{relayed}.{pending}"
+
+
+def versioned(*depends_on: str):
+    """Give a JSON GET endpoint an ETag from the versions of the given cache prefixes."""
+    def decorator(func):
+        func.etag_depends_on = depends_on
+        return func
+
+    return decorator
+
+
+def _endpoint_depends_on(router, scope) -> tuple[str, ...] | None:
+    for route in router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(child_scope.get("endpoint"), "etag_depends_on", None)
+    return None
+
+
+def request_etag(router, request) -> str | None:
+    """ETag for a GET of a versioned endpoint by an authenticated user, else None."""
+    if not request.url.path.startswith("/api/"):
+        return None
+    depends_on = _endpoint_depends_on(router, request.scope)
+    if depends_on is None:
+        return None
+    auth = request.headers.get("Authorization", "")
+    payload = decode_token(auth[7:]) if auth.startswith("Bearer ") else None
+    if not payload:
+        return None
+    query = sorted(request.query_params.multi_items())
+    scope = repr((request.url.path, query, payload.get("sub"), payload.get("role"), date.today().isoformat()))
+    digest = hashlib.blake2b(scope.encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{data_version(depends_on)}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    # Weak comparison: W/"x" and "x" are the same validator.
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+def validator_headers(etag: str) -> dict:
+    # private: per-user data; no-cache: the browser revalidates every time.
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
@@ -0,0 +1,93 @@
+"""Fast JSON encoding for API responses.
+
+FastAPI runs every returned dict/list through jsonable_encoder (a deep copy
+that visits each value) and then stdlib json. The API routers use
+FastJSONRoute instead: a dict or list returned by an endpoint is encoded by
+orjson directly into the response body. Anything orjson does not know
+(Decimal from PostgreSQL, pydantic models) falls back to jsonable_encoder
+for that value only. Endpoints returning a Response are left alone.
+
+orjson is optional: without it dumps() is the stdlib encoding FastAPI uses.
+"""
+import functools
+import inspect
+import json
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+from backend.config import PROFILING_ENABLED
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Compact UTF-8 JSON, the same document FastAPI's JSONResponse would produce."""
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _as_response(result):
+    if isinstance(result, (dict, list)):
+        return Response(dumps(result), media_type="application/json")
+    return result
+
+
+def _encode_results(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            return _as_response(await endpoint(*args, **kwargs))
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        return _as_response(endpoint(*args, **kwargs))
+
+    return wrapper
+
+
+def _has_response_model(endpoint, response_model) -> bool:
+    if isinstance(response_model, DefaultPlaceholder):
+        # FastAPI infers the model from the return annotation.
+        return inspect.signature(endpoint).return_annotation is not inspect.Signature.empty
+    return response_model is not None
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute that encodes plain dict/list results with dumps(), skipping jsonable_encoder.
+
+    Routes with a response_model (declared or from the return annotation)
+    keep FastAPI's validation path. With POLYCONTROL_PROFILING on, every
+    endpoint can also be profiled on request (backend/profiling.py).
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        # include_router builds the route again from route.endpoint: wrap once.
+        if not getattr(endpoint, "_fast_json_route", False):
+            if not _has_response_model(endpoint, kwargs.get("response_model")):
+                endpoint = _encode_results(endpoint)
+            if PROFILING_ENABLED:
+                from backend.profiling import profiled
+
+                endpoint = profiled(endpoint)
+            endpoint._fast_json_route = True
+        super().__init__(path, endpoint, **kwargs)
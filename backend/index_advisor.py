@@ -0,0 +1,457 @@
+"""Index advisor: what the planner does with the queries the app really runs.
+
+collect_queries() records every distinct statement (by fingerprint, see
+backend/sql_trace.py) executed while it is active: a test run,
+perf_diagnostics.py or the workload of benchmarks/index_advisor.py.
+analyze() then plans each SELECT, UPDATE and DELETE on the database the
+app is configured for:
+
+- SQLite: EXPLAIN QUERY PLAN; `SCAN <table>` without an index and
+  `USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT` are findings;
+- PostgreSQL: EXPLAIN (FORMAT JSON); Seq Scan and Sort nodes.
+
+For a finding the index is derived from the query text: the equality
+columns of the scanned table (WHERE, JOIN ... ON, IN, IS NULL), then one
+range column; for a sort, the equality columns and the ORDER BY / GROUP BY
+columns. The index is created inside a savepoint, the queries that asked
+for it are planned (and on SQLite timed) again, and the savepoint is rolled
+back, so nothing changes in the database. A proposal `improves` when the
+scan or sort is gone from the new plan and the queries got faster overall
+(SQLite), or PostgreSQL's cost estimate dropped; its benefit is the time (SQLite, ms) or cost (PostgreSQL) saved per
+execution times the executions seen. Tables under min_rows rows get no
+proposal: scanning a small table is cheaper than an index.
+"""
+import json
+import re
+import time
+from contextlib import contextmanager
+
+from backend.database import get_db
+from backend.sql_trace import statement_collectors
+
+MIN_ROWS = 1000
+MAX_EQUALITY_COLUMNS = 3
+TIMING_REPEAT = 5
+# SQLite: a smaller gain per workload run is timer noise, and would make the CI gate flaky.
+MIN_GAIN_MS = 0.25
+# A query counts as cheaper below this share of its old cost (or time).
+CHEAPER_SHARE = 0.9
+PLANNABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+TIMED = ("SELECT", "WITH")
+SAVEPOINT = "index_advisor"
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_NOT_ALIAS = {
+    "on", "where", "join", "left", "right", "inner", "outer", "cross", "full", "natural", "group", "order",
+    "limit", "offset", "union", "set", "using", "having", "window", "returning", "values", "as",
+}
+_PREDICATES = re.compile(r"\b(?:WHERE|ON)\b", re.I)
+# column <op> [other.column]: a qualified column on the right makes it a join condition.
+_COMPARISON = re.compile(
+    r"(?<![\w.])(?:(\w+)\.)?(\w+)\s*(>=|<=|<>|!=|=|>|<|IN\s*\(|IS\s+NULL\b|BETWEEN\b)(?:\s*(\w+)\.(\w+)\b(?!\s*\())?",
+    re.I,
+)
+_SORT_CLAUSE = re.compile(r"\b(ORDER|GROUP)\s+BY\s+(.+?)(?=\bLIMIT\b|\bOFFSET\b|\bHAVING\b|\)|;|$)", re.I | re.S)
+_SORT_ITEM = re.compile(r"^(?:(\w+)\.)?(\w+)(?:\s+(ASC|DESC))?(?:\s+NULLS\s+(?:FIRST|LAST))?$", re.I)
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+_SQLITE_TEMP_BTREE = re.compile(r"USE TEMP B-TREE FOR (?:(?:RIGHT PART|LAST TERM) OF )?(ORDER BY|GROUP BY|DISTINCT)")
+
+
+@contextmanager
+def collect_queries():
+    """Collect the distinct statements run (in any thread) inside the block: fingerprint -> {"sql", "args", "count"}."""
+    collected: dict[str, dict] = {}
+    statement_collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        statement_collectors.remove(collected)
+
+
+def _schema(conn, engine: str) -> dict[str, set[str]]:
+    cur = conn.cursor()
+    try:
+        if engine == "postgres":
+            cur.execute(
+                "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+            )
+            schema: dict[str, set[str]] = {}
+            for table, column in cur.fetchall():
+                schema.setdefault(table.lower(), set()).add(column.lower())
+            return schema
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        tables = [row[0] for row in cur.fetchall()]
+        schema = {}
+        for table in tables:
+            cur.execute(f'PRAGMA table_info("{table}")')
+            schema[table.lower()] = {row[1].lower() for row in cur.fetchall()}
+        return schema
+    finally:
+        cur.close()
+
+
+def _row_count(conn, engine: str, table: str) -> int:
+    cur = conn.cursor()
+    try:
+        if engine == "postgres":
+            # The planner's estimate: exact counts of big tables are a scan each.
+            cur.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        else:
+            cur.execute(f'SELECT COUNT(*) FROM "{table}"')
+        row = cur.fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+    finally:
+        cur.close()
+
+
+def _aliases(shape: str, schema: dict[str, set[str]]) -> dict[str, str]:
+    """Alias (or table name) -> table, for the schema tables the query reads."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(shape):
+        table = table.lower()
+        if table not in schema:
+            continue
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIAS:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def _owner(qualifier: str, column: str, aliases: dict[str, str], schema: dict[str, set[str]]) -> str | None:
+    """Alias the column belongs to: its qualifier, or the only table of the query that has it."""
+    if qualifier:
+        table = aliases.get(qualifier)
+        return qualifier if table and column in schema[table] else None
+    tables = {table for table in aliases.values() if column in schema[table]}
+    if len(tables) != 1:
+        return None
+    table = tables.pop()
+    # The plan names a table by its alias when it has one.
+    named = [alias for alias, aliased in aliases.items() if aliased == table and alias != table]
+    if len(named) > 1:
+        return None
+    return named[0] if named else table
+
+
+def _predicates(shape: str, aliases: dict[str, str], schema: dict[str, set[str]]) -> list[tuple[str, str, str]]:
+    """(alias, column, "eq" | "range" | "join") for each indexable comparison, in query order."""
+    start = _PREDICATES.search(shape)
+    if start is None:
+        return []
+    found = []
+    for qualifier, column, operator, other_qualifier, other_column in _COMPARISON.findall(shape[start.start():]):
+        operator = operator.upper()
+        if operator in ("<>", "!="):
+            continue
+        if other_column:
+            if operator == "=":
+                for side_qualifier, side_column in ((qualifier, column), (other_qualifier, other_column)):
+                    alias = _owner(side_qualifier.lower(), side_column.lower(), aliases, schema)
+                    if alias is not None:
+                        found.append((alias, side_column.lower(), "join"))
+            continue
+        kind = "range" if operator in (">", "<", ">=", "<=") or operator.startswith("BETWEEN") else "eq"
+        alias = _owner(qualifier.lower(), column.lower(), aliases, schema)
+        if alias is not None:
+            found.append((alias, column.lower(), kind))
+    return found
+
+
+def _unique(columns) -> list[str]:
+    seen = []
+    for column in columns:
+        if column not in seen:
+            seen.append(column)
+    return seen
+
+
+def _scan_columns(alias: str, predicates) -> list[str]:
+    """Filters of the scanned table; without any, its join column (the table is the inner side of a join)."""
+    equal = _unique(column for owner, column, kind in predicates if owner == alias and kind == "eq")
+    equal = equal[:MAX_EQUALITY_COLUMNS]
+    ranged = [column for owner, column, kind in predicates if owner == alias and kind == "range" and column not in equal]
+    columns = equal + ranged[:1]
+    if not columns:
+        columns = _unique(column for owner, column, kind in predicates if owner == alias and kind == "join")[:1]
+    return columns
+
+
+def _sort_columns(clause: str, shape: str, aliases, schema, predicates) -> tuple[str, list[str]] | None:
+    """(alias, index columns) for the first ORDER BY / GROUP BY of that kind that lists plain columns of one table."""
+    if clause == "DISTINCT":
+        return None
+    keyword = "GROUP" if clause == "GROUP BY" else "ORDER"
+    for kind, items in _SORT_CLAUSE.findall(shape):
+        if kind.upper() != keyword:
+            continue
+        owners, columns, directions = set(), [], set()
+        for item in items.split(","):
+            match = _SORT_ITEM.match(item.strip())
+            if match is None:
+                break
+            qualifier, column, direction = match.groups()
+            alias = _owner((qualifier or "").lower(), column.lower(), aliases, schema)
+            if alias is None:
+                break
+            owners.add(alias)
+            directions.add((direction or "ASC").upper())
+            columns.append((column.lower(), (direction or "ASC").upper()))
+        else:
+            if len(owners) != 1:
+                continue
+            alias = owners.pop()
+            # One direction: the index can be walked backwards; mixed ones need DESC in the index.
+            mixed = len(directions) > 1
+            equal = _unique(column for owner, column, kind in predicates if owner == alias and kind == "eq")
+            sort = [column + (" DESC" if mixed and direction == "DESC" else "") for column, direction in columns if column not in equal]
+            return alias, _unique(equal[:MAX_EQUALITY_COLUMNS] + sort)
+    return None
+
+
+def _plan(cur, engine: str, sql: str, args: tuple):
+    if engine == "postgres":
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, args)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+    cur.execute("EXPLAIN QUERY PLAN " + sql, args)
+    return [row[3] for row in cur.fetchall()]
+
+
+def _plan_findings(plan, engine: str, shape: str) -> list[tuple[str, str, str]]:
+    """(kind, target, detail): ("scan", alias, ...) or ("sort", "ORDER BY" | "GROUP BY" | "DISTINCT", ...)."""
+    findings = []
+    if engine == "postgres":
+        sort_clause = "ORDER BY" if re.search(r"\bORDER\s+BY\b", shape, re.I) else "GROUP BY"
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                findings.append(("scan", node.get("Alias", node.get("Relation Name", "")).lower(), f"Seq Scan on {node.get('Relation Name')}"))
+            elif node["Node Type"] in ("Sort", "Incremental Sort"):
+                findings.append(("sort", sort_clause, f"{node['Node Type']} by {', '.join(node.get('Sort Key', []))}"))
+            nodes.extend(node.get("Plans", []))
+        return findings
+    for detail in plan:
+        match = _SQLITE_SCAN.match(detail)
+        if match:
+            findings.append(("scan", match.group(1).lower(), detail))
+            continue
+        match = _SQLITE_TEMP_BTREE.search(detail)
+        if match:
+            findings.append(("sort", match.group(1), detail))
+    return findings
+
+
+def _cost(plan, engine: str) -> float | None:
+    return float(plan["Total Cost"]) if engine == "postgres" else None
+
+
+def _time_query(cur, sql: str, args: tuple) -> float:
+    best = float("inf")
+    for _ in range(TIMING_REPEAT):
+        started = time.perf_counter()
+        cur.execute(sql, args)
+        cur.fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def _measure(cur, engine: str, entry: dict) -> dict:
+    sql, args = entry["sql"], entry["args"]
+    plan = _plan(cur, engine, sql, args)
+    measured = {"findings": _plan_findings(plan, engine, entry["shape"]), "cost": _cost(plan, engine), "ms": None}
+    if engine == "sqlite" and sql.lstrip().upper().startswith(TIMED):
+        measured["ms"] = _time_query(cur, sql, args)
+    return measured
+
+
+def _index_sql(table: str, columns: list[str]) -> str:
+    name = "idx_" + "_".join([table] + [column.split()[0] for column in columns])
+    return f"CREATE INDEX IF NOT EXISTS {name[:63]} ON {table}({', '.join(columns)})"
+
+
+def _merge_prefixes(proposals: dict[str, dict], findings: list[dict]) -> None:
+    """A query that asked for an index and for a longer one starting with it gets only the longer one."""
+    def names(proposal):
+        return [column.split()[0] for column in proposal["columns"]]
+
+    for shorter in sorted(proposals.values(), key=lambda proposal: -len(proposal["columns"])):
+        for longer in proposals.values():
+            if longer is shorter or longer["table"] != shorter["table"]:
+                continue
+            if names(longer)[: len(shorter["columns"])] != names(shorter):
+                continue
+            for shape in [shape for shape in shorter["targets"] if shape in longer["targets"]]:
+                longer["targets"][shape] |= shorter["targets"].pop(shape)
+                for finding in findings:
+                    if finding["query"] == shape and finding["index"] == shorter["index"]:
+                        finding["index"] = longer["index"]
+    for key in [key for key, proposal in proposals.items() if not proposal["targets"]]:
+        del proposals[key]
+
+
+def _verify(conn, engine: str, proposal: dict, entries: dict, before: dict) -> None:
+    """Create the index in a savepoint, re-plan its queries, roll back; sets improves, benefit and checks."""
+    cur = conn.cursor()
+    cur.execute(f"SAVEPOINT {SAVEPOINT}")
+    try:
+        cur.execute(proposal["sql"])
+        gone_any = cheaper_any = timed = False
+        benefit = 0.0
+        for shape, targets in proposal["targets"].items():
+            entry = entries[shape]
+            old = before[shape]
+            after = _measure(cur, engine, entry)
+            gone_any = gone_any or not targets & {(kind, target) for kind, target, _ in after["findings"]}
+            metric = "cost" if engine == "postgres" else "ms"
+            if old[metric] is not None:
+                timed = True
+                benefit += (old[metric] - after[metric]) * entry["count"]
+                cheaper_any = cheaper_any or after[metric] < old[metric] * CHEAPER_SHARE
+            proposal["checks"].append({
+                "query": shape,
+                "executions": entry["count"],
+                "before": old[metric],
+                "after": after[metric],
+                "plan_after": [detail for _, _, detail in after["findings"]],
+            })
+        # A plan without the scan is not enough: the planner can pick the new index and get slower.
+        if engine == "postgres":
+            proposal["improves"] = benefit > 0 and cheaper_any
+        elif timed:
+            proposal["improves"] = gone_any and benefit >= MIN_GAIN_MS
+        else:
+            proposal["improves"] = gone_any
+        proposal["benefit"] = round(benefit, 3)
+    finally:
+        cur.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT}")
+        cur.execute(f"RELEASE SAVEPOINT {SAVEPOINT}")
+        cur.close()
+
+
+def analyze(queries: dict[str, dict], db=None, min_rows: int = MIN_ROWS) -> dict:
+    """Plan the collected queries; returns {"engine", "planned", "errors", "findings", "proposals"}."""
+    own_db = db is None
+    if own_db:
+        db = get_db()
+    conn, engine = db._conn, db._engine
+    cur = conn.cursor()
+    try:
+        schema = _schema(conn, engine)
+        rows: dict[str, int] = {}
+        entries: dict[str, dict] = {}
+        before: dict[str, dict] = {}
+        findings: list[dict] = []
+        proposals: dict[str, dict] = {}
+        errors = []
+
+        for shape, entry in sorted(queries.items(), key=lambda item: -item[1]["count"]):
+            if not shape.upper().startswith(PLANNABLE):
+                continue
+            entry = entries[shape] = {**entry, "shape": shape}
+            try:
+                measured = before[shape] = _measure(cur, engine, entry)
+            except Exception as exc:
+                if engine == "postgres":
+                    conn.rollback()
+                errors.append({"query": shape, "error": str(exc)})
+                continue
+
+            aliases = _aliases(shape, schema)
+            predicates = _predicates(shape, aliases, schema)
+            for kind, target, detail in measured["findings"]:
+                finding = {"query": shape, "executions": entry["count"], "kind": kind, "detail": detail,
+                           "table": None, "rows": None, "index": None, "note": None}
+                findings.append(finding)
+                if kind == "scan":
+                    alias = target
+                    columns = _scan_columns(alias, predicates) if alias in aliases else []
+                else:
+                    sort = _sort_columns(target, shape, aliases, schema, predicates)
+                    alias, columns = sort if sort else (None, [])
+                table = aliases.get(alias) if alias else None
+                if table is None:
+                    finding["note"] = (
+                        "подзапрос или CTE" if kind == "scan" else "сортировка по выражению или нескольким таблицам"
+                    )
+                    continue
+                if table not in rows:
+                    rows[table] = _row_count(conn, engine, table)
+                finding.update(table=table, rows=rows[table])
+                if rows[table] < min_rows:
+                    finding["note"] = f"меньше {min_rows} строк"
+                    continue
+                if not columns or columns == ["id"]:
+                    finding["note"] = "нет условий, по которым поможет индекс"
+                    continue
+                key = f"{table}({', '.join(columns)})"
+                finding["index"] = key
+                proposal = proposals.get(key)
+                if proposal is None:
+                    proposal = proposals[key] = {
+                        "index": key, "table": table, "columns": columns, "rows": rows[table],
+                        "sql": _index_sql(table, columns), "targets": {},
+                        "improves": False, "benefit": 0.0, "checks": [],
+                    }
+                proposal["targets"].setdefault(shape, set()).add((kind, target))
+
+        _merge_prefixes(proposals, findings)
+        for proposal in proposals.values():
+            try:
+                _verify(conn, engine, proposal, entries, before)
+            except Exception as exc:
+                if engine == "postgres":
+                    conn.rollback()
+                proposal["error"] = str(exc)
+            proposal["executions"] = sum(entries[shape]["count"] for shape in proposal["targets"])
+            del proposal["targets"]
+
+        return {
+            "engine": engine,
+            "benefit_unit": "cost" if engine == "postgres" else "ms",
+            "planned": len(before),
+            "errors": errors,
+            "findings": findings,
+            "proposals": sorted(proposals.values(), key=lambda proposal: (not proposal["improves"], -proposal["benefit"])),
+        }
+    finally:
+        cur.close()
+        if engine == "postgres":
+            conn.rollback()
+        if own_db:
+            db.close()
+
+
+def new_proposals(report: dict, baseline: list[str]) -> list[dict]:
+    """Improving proposals not in the baseline (a list of `table(columns)` keys): what a CI gate fails on."""
+    accepted = set(baseline)
+    return [proposal for proposal in report["proposals"] if proposal["improves"] and proposal["index"] not in accepted]
+
+
+def format_report(report: dict) -> str:
+    unit = report["benefit_unit"]
+    lines = [f"Запросов разобрано: {report['planned']} ({report['engine']}), ошибок планирования: {len(report['errors'])}"]
+    lines.append("")
+    lines.append("Находки:")
+    for finding in report["findings"]:
+        where = finding["table"] or "?"
+        if finding["rows"] is not None:
+            where += f" ({finding['rows']} строк)"
+        tail = f" -> {finding['index']}" if finding["index"] else f" [{finding['note']}]"
+        lines.append(f"  {finding['kind']:<5} {where:<36} x{finding['executions']:<5} {finding['detail']}{tail}")
+        lines.append(f"        {finding['query'][:160]}")
+    lines.append("")
+    lines.append(f"Предлагаемые индексы (выигрыш в {unit} за прогон):")
+    for proposal in report["proposals"]:
+        verdict = "помогает" if proposal["improves"] else "не помогает"
+        if "error" in proposal:
+            verdict = f"ошибка: {proposal['error']}"
+        lines.append(f"  {proposal['sql']};")
+        lines.append(f"      {verdict}, выигрыш {proposal['benefit']} {unit}, запросов {len(proposal['checks'])}, выполнений {proposal['executions']}")
+        for check in proposal["checks"]:
+            before = "-" if check["before"] is None else round(check["before"], 3)
+            after = "-" if check["after"] is None else round(check["after"], 3)
+            lines.append(f"      {before} -> {after} {unit} x{check['executions']}: {check['query'][:120]}")
+    return "\n".join(lines)
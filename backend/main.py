@@ -4,20 +4,33 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from backend.config import UPLOAD_DIR
-from backend.database import init_db
+from backend.compression import CompressionMiddleware
+from backend.config import COMPRESSION_MIN_BYTES, PROFILING_ENABLED, UPLOAD_DIR
+from backend.database import init_db, track_sql_usage
+from backend.dependencies import token_user_id
+from backend.etags import etag_matches, request_etag, validator_headers
+from backend.fast_json import FastJSONResponse
+from backend.metrics import observe_request, request_started, route_template
+from backend.outbox import start_outbox_relay, stop_outbox_relay
+from backend.response_cache import track_writer
+from backend.rollups import ensure_rollups
 from backend.routers import (
     announcements,
     auth_router,
+    cache,
+    dashboard,
+    debug,
     hr,
     inventory,
+    metrics,
     orders,
     payroll,
     pricelist,
     realtime,
+    report_jobs,
     reports,
     tasks,
     training,
@@ -25,18 +38,27 @@ from backend.routers import (
     work_journal,
 )
 from backend.seed import seed_db
+from backend.spa import init_spa, spa_response
+from backend.sql_trace import client_request_id, new_request_id, store_request_trace
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
     seed_db()
+    ensure_rollups()
     os.makedirs(UPLOAD_DIR, exist_ok=True)
+    init_spa(REACT_FRONTEND_DIR)
+    await start_outbox_relay()
     yield
+    await stop_outbox_relay()
 
 
-app = FastAPI(title="Тамга Сервис", version="1.0.0", lifespan=lifespan)
+app = FastAPI(title="Тамга Сервис", version="1.0.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
+# Added first, so it is the innermost middleware: it sees the handler's body
+# in one message, before the http middlewares below re-stream it.
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -47,15 +69,56 @@ app.add_middleware(
 
 
 @app.middleware("http")
-async def log_request_time(request: Request, call_next):
-    if not request.url.path.startswith("/api/"):
+async def conditional_get(request: Request, call_next):
+    # ETag from data versions, checked before the handler runs (backend/etags.py).
+    etag = request_etag(app.router, request) if request.method == "GET" else None
+    if etag is None:
         return await call_next(request)
-    start = time.time()
+    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+        return Response(status_code=304, headers=validator_headers(etag))
     response = await call_next(request)
-    duration = time.time() - start
+    # Stale-while-revalidate bodies are about to change: no validator for them.
+    if response.status_code == 200 and response.headers.get("X-Cache") != "STALE":
+        response.headers.update(validator_headers(etag))
+    return response
+
+
+if PROFILING_ENABLED:
+    from backend.profiling import profile_request
+
+    app.middleware("http")(profile_request)
+
+
+@app.middleware("http")
+async def log_request_time(request: Request, call_next):
+    # Outermost: times the whole request and counts its SQL for /metrics (backend/metrics.py)
+    # and /api/debug/sql (backend/sql_trace.py).
+    request_id = new_request_id()
+    sql_usage = track_sql_usage(request_id)
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        # Its committed writes are this user's own (see backend/response_cache.py).
+        track_writer(token_user_id(request))
+    request_started()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        duration = time.perf_counter() - start
+        observe_request(request.method, route_template(app.router, request.scope), status, duration, sql_usage)
+    if not request.url.path.startswith("/api/"):
+        return response
+    client_id = client_request_id(request)
+    store_request_trace(request_id, request.method, request.url.path, status, duration, sql_usage, client_id)
     if duration > 0.5:
-        print(f"SLOW {request.method} {request.url.path} {duration:.3f}s")
+        print(f"SLOW {request.method} {request.url.path} {duration:.3f}s request_id={request_id}")
     response.headers["X-Response-Time"] = f"{duration:.3f}"
+    response.headers["X-Request-ID"] = request_id
+    if client_id:
+        response.headers["X-Client-Request-ID"] = client_id
+    response.headers["X-SQL-Queries"] = str(sql_usage["queries"])
+    response.headers["X-SQL-Time"] = f"{sql_usage['seconds']:.3f}"
     return response
 
 
@@ -66,12 +129,17 @@ app.include_router(inventory.router)
 app.include_router(hr.router)
 app.include_router(payroll.router)
 app.include_router(users.router)
+app.include_router(report_jobs.router)
 app.include_router(reports.router)
+app.include_router(dashboard.router)
 app.include_router(tasks.router)
 app.include_router(training.router)
 app.include_router(announcements.router)
 app.include_router(work_journal.router)
 app.include_router(realtime.router)
+app.include_router(cache.router)
+app.include_router(debug.router)
+app.include_router(metrics.router)
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/api/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
@@ -80,14 +148,6 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 REACT_FRONTEND_DIR = os.path.join(PROJECT_ROOT, "frontend-react", "dist")
 
 
-def get_react_index_path() -> str:
-    return os.path.join(REACT_FRONTEND_DIR, "index.html")
-
-
-def react_build_exists() -> bool:
-    return os.path.isfile(get_react_index_path())
-
-
 def missing_frontend_response() -> HTMLResponse:
     return HTMLResponse(
         """
@@ -104,20 +164,10 @@ def missing_frontend_response() -> HTMLResponse:
 
 
 @app.get("/")
-async def serve_index():
-    if not react_build_exists():
-        return missing_frontend_response()
-    return FileResponse(get_react_index_path())
+async def serve_index(request: Request):
+    return spa_response(REACT_FRONTEND_DIR, "", request) or missing_frontend_response()
 
 
 @app.get("/{path:path}")
-async def serve_spa(path: str):
-    if not react_build_exists():
-        return missing_frontend_response()
-
-    normalized_path = path.replace("/", os.sep)
-    file_path = os.path.join(REACT_FRONTEND_DIR, normalized_path)
-    if os.path.isfile(file_path):
-        return FileResponse(file_path)
-
-    return FileResponse(get_react_index_path())
+async def serve_spa(path: str, request: Request):
+    return spa_response(REACT_FRONTEND_DIR, path, request) or missing_frontend_response()
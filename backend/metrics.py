@@ -0,0 +1,147 @@
+"""Request metrics in the Prometheus text format (GET /metrics).
+
+The request middleware in backend/main.py calls observe_request() once per
+request with its route template (`/api/orders/{order_id}`, not the raw path,
+so label sets stay bounded), status, duration and the SQL it ran (counted by
+DBCompat.execute, see track_sql_usage). Gauges (in-flight requests, DB
+connections, realtime clients) are read at scrape time. Counters live in
+this process: with several workers each one is scraped on its own.
+
+For a streamed response (SSE, CSV export) the duration ends when the
+headers are sent.
+"""
+import threading
+
+from starlette.routing import Match
+
+from backend.database import db_pool_stats
+from backend.realtime import connection_counts, realtime_stats
+
+PREFIX = "polycontrol"
+# Seconds; p95 of a fast JSON endpoint sits in the first buckets, reports further up.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+_lock = threading.Lock()
+_in_flight = 0
+_requests: dict[tuple[str, str, str], int] = {}
+# (method, route) -> [count per bucket (not cumulative) + overflow, sum of seconds]
+_latency: dict[tuple[str, str], list] = {}
+# (method, route) -> [queries, seconds]
+_sql: dict[tuple[str, str], list] = {}
+
+
+def route_template(router, scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        # Answered before routing (a 304 from conditional_get) or by a mount,
+        # which moved its prefix into root_path: match with the app's own root_path.
+        scope = {**scope, "root_path": scope.get("app_root_path", scope.get("root_path", ""))}
+        for candidate in router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def request_started() -> None:
+    global _in_flight
+    with _lock:
+        _in_flight += 1
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, sql_usage: dict) -> None:
+    global _in_flight
+    key = (method, route)
+    with _lock:
+        _in_flight -= 1
+        status_key = (method, route, str(status))
+        _requests[status_key] = _requests.get(status_key, 0) + 1
+        latency = _latency.get(key)
+        if latency is None:
+            latency = _latency[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        latency[0][bucket] += 1
+        latency[1] += seconds
+        sql = _sql.get(key)
+        if sql is None:
+            sql = _sql[key] = [0, 0.0]
+        sql[0] += sql_usage["queries"]
+        sql[1] += sql_usage["seconds"]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _family(lines: list, name: str, kind: str, help_text: str, samples) -> None:
+    lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+    lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+    for suffix, labels, value in samples:
+        lines.append(f"{PREFIX}_{name}{suffix}{_labels(**labels)} {_number(value)}")
+
+
+def render_metrics() -> str:
+    with _lock:
+        in_flight = _in_flight
+        requests = dict(_requests)
+        latency = {key: ([*counts], total) for key, (counts, total) in _latency.items()}
+        sql = {key: tuple(values) for key, values in _sql.items()}
+
+    lines: list[str] = []
+    _family(lines, "http_requests_total", "counter", "HTTP requests by route template and status.", [
+        ("", {"method": method, "route": route, "status": status}, count)
+        for (method, route, status), count in sorted(requests.items())
+    ])
+
+    histogram = []
+    for (method, route), (counts, total) in sorted(latency.items()):
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+            cumulative += count
+            histogram.append(("_bucket", {"method": method, "route": route, "le": bound}, cumulative))
+        histogram.append(("_sum", {"method": method, "route": route}, total))
+        histogram.append(("_count", {"method": method, "route": route}, cumulative))
+    _family(lines, "http_request_duration_seconds", "histogram", "Request latency by route template.", histogram)
+
+    _family(lines, "http_requests_in_flight", "gauge", "Requests being handled now.", [("", {}, in_flight)])
+
+    _family(lines, "db_queries_total", "counter", "SQL statements run while handling requests, by route.", [
+        ("", {"method": method, "route": route}, queries) for (method, route), (queries, _) in sorted(sql.items())
+    ])
+    _family(lines, "db_query_seconds_total", "counter", "Time spent in SQL statements, by route.", [
+        ("", {"method": method, "route": route}, seconds) for (method, route), (_, seconds) in sorted(sql.items())
+    ])
+
+    pool = db_pool_stats()
+    pool_samples = [("", {"engine": pool["engine"], "state": "open"}, pool["open"])]
+    for state in ("in_use", "idle", "max"):
+        if state in pool:
+            pool_samples.append(("", {"engine": pool["engine"], "state": state}, pool[state]))
+    _family(lines, "db_connections", "gauge", "Database connections of this worker.", pool_samples)
+
+    _family(lines, "realtime_connections", "gauge", "Connected realtime clients by transport.", [
+        ("", {"transport": transport}, count) for transport, count in sorted(connection_counts().items())
+    ])
+    stats = realtime_stats()
+    for name, help_text in (
+        ("connections", "Realtime clients connected since start."),
+        ("events_published", "Events published to the realtime broker."),
+        ("dropped_events", "Events dropped for slow realtime clients."),
+        ("disconnects", "Realtime clients disconnected by the overflow policy."),
+    ):
+        key = "connections_total" if name == "connections" else name
+        _family(lines, f"realtime_{name}_total", "counter", help_text, [("", {}, stats[key])])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,208 @@
+"""Transactional outbox for realtime events.
+
+Routers call enqueue_event(db, ...) before db.commit(): the event row is
+written in the same transaction as the business change, so it exists if and
+only if the change was committed. A relay task tails realtime_outbox in id
+order and hands rows to publish_event; rows whose ids committed after a
+higher id are published when they show up (see GAP_HORIZON_SECONDS). Every
+worker runs its own relay, so subscribers connected to any worker see events
+committed by all of them.
+"""
+import asyncio
+import functools
+import json
+import time
+
+from backend.config import OUTBOX_POLL_SECONDS, OUTBOX_RETENTION_ROWS
+from backend.database import get_db
+from backend.etags import mark_committed, set_version_baseline
+from backend.realtime import publish_event
+from backend.response_cache import add_refresh_listener, invalidate_prefixes, note_write
+
+BATCH_SIZE = 500
+# Ids can commit out of order on Postgres (sequence values are taken before
+# commit), and a rolled-back transaction leaves its id unused for good. The
+# relay does not wait at a missing id: it publishes what is committed and
+# looks the missing ids up again on every poll, for GAP_HORIZON_SECONDS (a
+# write transaction open longer than that is not expected), then forgets
+# them. Only the newest MAX_TRACKED_GAPS missing ids are tracked.
+GAP_HORIZON_SECONDS = 300.0
+MAX_TRACKED_GAPS = 1000
+PRUNE_EVERY = 100
+REFRESHED_KIND = "cache.refreshed"
+
+_loop: asyncio.AbstractEventLoop | None = None
+_wakeup: asyncio.Event | None = None
+_task: asyncio.Task | None = None
+_last_id = 0
+# Missing id -> monotonic time after which it is given up on.
+_gaps: dict[int, float] = {}
+_relayed_batches = 0
+
+
+def enqueue_event(
+    db,
+    kind: str,
+    *,
+    channels: list[str] | None = None,
+    cache_prefixes: list[str] | None = None,
+    payload: dict | None = None,
+    user_ids: list[int] | None = None,
+    roles: list[str] | None = None,
+) -> None:
+    cur = db.execute(
+        """INSERT INTO realtime_outbox (kind, channels, cache_prefixes, payload, user_ids, roles)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (
+            kind,
+            json.dumps(channels or []),
+            json.dumps(cache_prefixes or []),
+            json.dumps(payload or {}, ensure_ascii=False),
+            json.dumps(user_ids or []),
+            json.dumps(roles or []),
+        ),
+    )
+    if cache_prefixes:
+        # Drop this worker's cached responses right away so the writer reads
+        # its own change (no stale body either, see note_write); other
+        # workers follow when the relay publishes.
+        db.on_commit(note_write)
+        db.on_commit(functools.partial(invalidate_prefixes, cache_prefixes))
+        db.on_commit(functools.partial(mark_committed, cache_prefixes, cur.lastrowid))
+    db.on_commit(wake_relay)
+
+
+def wake_relay() -> None:
+    """Relay the outbox now instead of at the next poll. Safe from any thread."""
+    if _loop is None or _wakeup is None or _loop.is_closed():
+        return
+    _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _announce_refresh(prefix: str, channels: list[str], roles: list[str]) -> None:
+    """Tell clients that a stale cached response was recomputed, so they refetch it.
+
+    Not an outbox row: the notice changes no data, so it must not move data
+    versions (ETags, report jobs). It reaches this worker's subscribers, the
+    ones whose stale bodies this worker served when their streams are here too.
+    """
+    publish_event(REFRESHED_KIND, channels=channels, payload={"prefix": prefix}, roles=roles)
+
+
+add_refresh_listener(_announce_refresh)
+
+
+def _max_outbox_id() -> int:
+    db = get_db()
+    row = db.execute("SELECT COALESCE(MAX(id), 0) FROM realtime_outbox").fetchone()
+    db.close()
+    return int(row[0])
+
+
+def _fetch(after_id: int, gap_ids: list[int]) -> tuple[list[dict], list[dict]]:
+    """(rows after after_id in id order, rows for previously missing ids that have committed since)."""
+    db = get_db()
+    rows = db.execute(
+        "SELECT * FROM realtime_outbox WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, BATCH_SIZE),
+    ).fetchall()
+    late = []
+    if gap_ids:
+        placeholders = ", ".join("?" for _ in gap_ids)
+        late = db.execute(
+            f"SELECT * FROM realtime_outbox WHERE id IN ({placeholders}) ORDER BY id", tuple(gap_ids)
+        ).fetchall()
+    db.close()
+    return [dict(r) for r in rows], [dict(r) for r in late]
+
+
+def _prune(before_id: int) -> None:
+    db = get_db()
+    db.execute("DELETE FROM realtime_outbox WHERE id <= ?", (before_id,))
+    db.commit()
+    db.close()
+
+
+def _publish_row(row: dict) -> None:
+    publish_event(
+        row["kind"],
+        channels=json.loads(row["channels"]),
+        cache_prefixes=json.loads(row["cache_prefixes"]),
+        payload=json.loads(row["payload"]),
+        user_ids=json.loads(row["user_ids"]),
+        roles=json.loads(row["roles"]),
+        event_id=row["id"],
+        created_at=str(row["created_at"]),
+    )
+
+
+def _relay_batch(rows: list[dict], late: list[dict] = ()) -> bool:
+    """Publish late rows of earlier gaps, then rows in id order, remembering the ids they skip.
+
+    Returns True if more rows may be waiting.
+    """
+    global _last_id
+    now = time.monotonic()
+    for row in late:
+        if _gaps.pop(row["id"], None) is not None:
+            _publish_row(row)
+    for gap_id, deadline in list(_gaps.items()):
+        if deadline < now:
+            del _gaps[gap_id]
+    for row in rows:
+        for gap_id in range(max(_last_id + 1, row["id"] - MAX_TRACKED_GAPS), row["id"]):
+            _gaps[gap_id] = now + GAP_HORIZON_SECONDS
+        _publish_row(row)
+        _last_id = row["id"]
+    while len(_gaps) > MAX_TRACKED_GAPS:
+        del _gaps[min(_gaps)]
+    return len(rows) == BATCH_SIZE
+
+
+async def relay_once() -> bool:
+    """One poll of the outbox. Returns True if more rows may be waiting."""
+    rows, late = await asyncio.to_thread(_fetch, _last_id, sorted(_gaps))
+    return _relay_batch(rows, late)
+
+
+async def _relay() -> None:
+    global _relayed_batches
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+        try:
+            if await relay_once():
+                _wakeup.set()
+
+            _relayed_batches += 1
+            if _relayed_batches % PRUNE_EVERY == 0 and _last_id > OUTBOX_RETENTION_ROWS:
+                await asyncio.to_thread(_prune, _last_id - OUTBOX_RETENTION_ROWS)
+        except Exception as err:  # keep relaying after a transient DB error
+            print(f"[OUTBOX] relay error: {err}")
+
+
+async def start_outbox_relay() -> None:
+    """Start tailing the outbox from its current end (older rows were relayed before restart)."""
+    global _loop, _wakeup, _task, _last_id
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _last_id = await asyncio.to_thread(_max_outbox_id)
+    set_version_baseline(_last_id)
+    _gaps.clear()
+    _task = _loop.create_task(_relay())
+
+
+async def stop_outbox_relay() -> None:
+    global _task, _loop
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+    _loop = None
@@ -0,0 +1,274 @@
+"""On-demand profiling of single requests, for the director.
+
+Off unless POLYCONTROL_PROFILING is set: then FastJSONRoute wraps every
+endpoint with profiled() and main.py installs profile_request(); when it is
+off neither exists, so normal requests pay nothing.
+
+A director asks for a profile with the `X-Profile` header or the `_profile`
+query parameter on any API request:
+
+- `sample` (or `1`): a thread samples the handler's stack every
+  SAMPLE_INTERVAL seconds; stored as collapsed stacks (`a;b;c 12` per line),
+  the input of flamegraph.pl and speedscope;
+- `cprofile`: deterministic cProfile of the handler, stored as a .pstats file
+  (python -m pstats, snakeviz). Slows the handler down several times.
+
+Only the endpoint function is profiled (dependencies and encoding are not).
+Async endpoints run on the event loop, so their profile also catches
+whatever else the loop did meanwhile. Profiles are files in PROFILE_DIR,
+so any worker can serve them; the newest PROFILE_KEEP are kept. The
+response carries X-Profile-ID; /api/debug/profiles lists them.
+"""
+import cProfile
+import functools
+import inspect
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import BASE_DIR, PROFILE_DIR
+from backend.dependencies import get_current_user
+
+MODES = ("sample", "cprofile")
+SAMPLE_INTERVAL = 0.002
+PROFILE_KEEP = 50
+SUMMARY_ROWS = 30
+
+# Set by profile_request for a director's profiled request; the wrapped endpoint puts its result here.
+_active: ContextVar[dict | None] = ContextVar("profile_request", default=None)
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(BASE_DIR):
+        filename = os.path.relpath(filename, BASE_DIR)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class _Sampler:
+    """Counts the collapsed stacks of the calling thread, below root_frame, until stopped."""
+
+    def __init__(self, root_frame):
+        self.thread_id = threading.get_ident()
+        self.root_frame = root_frame
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None and frame is not self.root_frame:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                stack = ";".join(reversed(labels))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _run_profiled(holder: dict, call):
+    if holder["mode"] == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(call)
+        finally:
+            holder["profile"] = profiler
+    with _Sampler(sys._getframe()) as sampler:
+        try:
+            return call()
+        finally:
+            holder["profile"] = sampler
+
+
+def profiled(endpoint):
+    """Wrap an endpoint so a profiled request runs it under the requested profiler."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            holder = _active.get()
+            if holder is None or "profile" in holder:
+                return await endpoint(*args, **kwargs)
+            if holder["mode"] == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    holder["profile"] = profiler
+            with _Sampler(sys._getframe()) as sampler:
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    holder["profile"] = sampler
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        holder = _active.get()
+        if holder is None or "profile" in holder:
+            return endpoint(*args, **kwargs)
+        return _run_profiled(holder, lambda: endpoint(*args, **kwargs))
+
+    return wrapper
+
+
+def _requested_mode(request) -> str | None:
+    flag = (request.headers.get("X-Profile") or request.query_params.get("_profile") or "").strip().lower()
+    if not flag or flag in ("0", "false", "no", "off"):
+        return None
+    return flag if flag in MODES else "sample"
+
+
+def _is_director(request) -> bool:
+    try:
+        return get_current_user(request)["role"] == "director"
+    except HTTPException:
+        return False
+
+
+def _top_functions(stats: pstats.Stats) -> list[dict]:
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        if filename.startswith(BASE_DIR):
+            filename = os.path.relpath(filename, BASE_DIR)
+        rows.append({
+            "function": f"{name} ({filename}:{line})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:SUMMARY_ROWS]
+
+
+def _flame_summary(sampler: _Sampler) -> dict:
+    """Hottest frames by own and total samples, and the hottest stacks."""
+    own: dict[str, int] = {}
+    total: dict[str, int] = {}
+    for stack, count in sampler.stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] = own.get(frames[-1], 0) + count
+        for frame in set(frames):
+            total[frame] = total.get(frame, 0) + count
+
+    def top(counts):
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:SUMMARY_ROWS]
+        return [{"frame": frame, "samples": count, "share": round(count / sampler.samples, 3)} for frame, count in ranked]
+
+    stacks = sorted(sampler.stacks.items(), key=lambda item: item[1], reverse=True)[:SUMMARY_ROWS]
+    return {
+        "samples": sampler.samples,
+        "interval_ms": SAMPLE_INTERVAL * 1000,
+        "self": top(own) if sampler.samples else [],
+        "total": top(total) if sampler.samples else [],
+        "stacks": [{"stack": stack, "samples": count} for stack, count in stacks],
+    }
+
+
+def _prune() -> None:
+    metas = sorted(
+        (name for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+        key=lambda name: os.path.getmtime(os.path.join(PROFILE_DIR, name)),
+    )
+    for name in metas[:-PROFILE_KEEP]:
+        profile_id = name[: -len(".json")]
+        for suffix in (".json", ".pstats", ".collapsed.txt"):
+            path = os.path.join(PROFILE_DIR, profile_id + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _save(profile_id: str, meta: dict, profile) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if isinstance(profile, cProfile.Profile):
+        stats = pstats.Stats(profile)
+        stats.dump_stats(os.path.join(PROFILE_DIR, profile_id + ".pstats"))
+        meta["file"] = profile_id + ".pstats"
+        meta["summary"] = {"total_ms": round(stats.total_tt * 1000, 3), "functions": _top_functions(stats)}
+    else:
+        with open(os.path.join(PROFILE_DIR, profile_id + ".collapsed.txt"), "w", encoding="utf-8") as f:
+            for stack, count in sorted(profile.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        meta["file"] = profile_id + ".collapsed.txt"
+        meta["summary"] = _flame_summary(profile)
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    _prune()
+
+
+async def profile_request(request, call_next):
+    """HTTP middleware: profile the request when a director asks for it."""
+    mode = _requested_mode(request)
+    if mode is None or not request.url.path.startswith("/api/") or not _is_director(request):
+        return await call_next(request)
+
+    holder = {"mode": mode}
+    _active.set(holder)
+    started = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - started
+    profile = holder.get("profile")
+    if profile is None:
+        return response
+
+    profile_id = uuid.uuid4().hex[:16]
+    meta = {
+        "id": profile_id,
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "mode": mode,
+        "method": request.method,
+        "path": request.url.path,
+        "query": str(request.url.query),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+    }
+    await run_in_threadpool(_save, profile_id, meta, profile)
+    response.headers["X-Profile-ID"] = profile_id
+    return response
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            meta = load_profile(name[: -len(".json")])
+            if meta is not None:
+                profiles.append({key: value for key, value in meta.items() if key != "summary"})
+    return sorted(profiles, key=lambda meta: meta["at"], reverse=True)
+
+
+def load_profile(profile_id: str) -> dict | None:
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ".json")
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def profile_file_path(meta: dict) -> str:
+    return os.path.join(PROFILE_DIR, meta["file"])
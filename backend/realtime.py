@@ -1,10 +1,79 @@
 import asyncio
 import json
+import time
+import uuid
 from datetime import datetime, timezone
 
+from backend.config import REALTIME_HEARTBEAT_SECONDS, REALTIME_OVERFLOW_POLICY, REALTIME_QUEUE_SIZE
+from backend.etags import mark_relayed
+from backend.response_cache import invalidate_prefixes
 
-_subscribers: set[asyncio.Queue] = set()
+OVERFLOW_POLICIES = ("drop_oldest", "resync", "disconnect")
+RESYNC_KIND = "realtime.resync"
+PING_KIND = "realtime.ping"
+_PING = {"kind": PING_KIND}
+
+# Stable id tables for the compact WebSocket frames. Append only: clients
+# receive the tables in the hello frame, names missing here are sent as strings.
+CHANNEL_TABLE = (
+    "orders", "dashboard", "inventory", "reports", "announcements", "payroll", "hr",
+    "work-journal", "tasks", "leave-requests", "users", "profile", "training", "pricelist",
+)
+PREFIX_TABLE = (
+    "/api/orders", "/api/reports", "/api/inventory", "/api/announcements", "/api/payroll",
+    "/api/hr", "/api/work-journal", "/api/tasks", "/api/leave-requests", "/api/users",
+    "/api/training", "/api/pricelist",
+)
+_CHANNEL_IDS = {name: i for i, name in enumerate(CHANNEL_TABLE)}
+_PREFIX_IDS = {prefix: i for i, prefix in enumerate(PREFIX_TABLE)}
+
+
+class Subscription:
+    """One realtime client: its queue, owner and the channels it listens to."""
+
+    def __init__(self, user: dict, channels: set[str] | None = None, transport: str = "sse"):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.transport = transport
+        # None means "all channels" (clients that did not declare a set).
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=REALTIME_QUEUE_SIZE)
+        self.connected_at = time.time()
+        self.last_sent = time.monotonic()
+        self.dropped = 0
+
+    def wants(self, event: dict) -> bool:
+        event_channels = event.get("channels") or []
+        if self.channels is not None and event_channels and self.channels.isdisjoint(event_channels):
+            return False
+        return event_matches_user(event, self.user)
+
+    async def get(self) -> dict | None:
+        item = await self.queue.get()
+        self.last_sent = time.monotonic()
+        return item
+
+
+_subscribers: dict[str, Subscription] = {}
+# In-process consumers of every published event (e.g. analytics snapshots).
+_listeners: list = []
 _event_seq = 0
+# Loop that owns the subscriber queues; sync routes publish from worker threads.
+_loop: asyncio.AbstractEventLoop | None = None
+_heartbeat_task: asyncio.Task | None = None
+_stats = {
+    "connections_total": 0,
+    "events_published": 0,
+    "deliveries": 0,
+    "dropped_events": 0,
+    "resyncs": 0,
+    "disconnects": 0,
+    "heartbeats": 0,
+    "fanout_count": 0,
+    "fanout_total_ms": 0.0,
+    "fanout_max_ms": 0.0,
+    "fanout_last_ms": 0.0,
+}
 
 
 def _next_event_id() -> int:
@@ -21,40 +90,205 @@ def publish_event(
     payload: dict | None = None,
     user_ids: list[int] | None = None,
     roles: list[str] | None = None,
+    event_id: int | None = None,
+    created_at: str | None = None,
 ) -> None:
+    """Fan an event out to subscribers of this process.
+
+    Routers should not call this directly: use backend.outbox.enqueue_event
+    inside the transaction, the outbox relay then publishes after commit.
+    """
+    _stats["events_published"] += 1
+    # Server-side cached responses go stale on every worker, not only where
+    # the change was made.
+    invalidate_prefixes(cache_prefixes)
+    if event_id is not None:
+        mark_relayed(cache_prefixes, event_id)
+    for listener in _listeners:
+        listener(kind, payload or {})
     if not _subscribers:
         return
 
     event = {
-        "id": _next_event_id(),
+        "id": event_id if event_id is not None else _next_event_id(),
         "kind": kind,
         "channels": channels or [],
         "cache_prefixes": cache_prefixes or [],
         "payload": payload or {},
         "user_ids": user_ids or [],
         "roles": roles or [],
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": created_at or datetime.now(timezone.utc).isoformat(),
     }
 
-    stale_queues: list[asyncio.Queue] = []
-    for queue in list(_subscribers):
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    if _loop is not None and running is not _loop:
+        # asyncio.Queue is not thread-safe: hand the fan-out to the loop so
+        # waiting streams are woken immediately.
+        _loop.call_soon_threadsafe(_fan_out, event)
+    else:
+        _fan_out(event)
+
+
+def add_publish_listener(callback) -> None:
+    """Call callback(kind, payload) for every event this process publishes. Must be cheap."""
+    _listeners.append(callback)
+
+
+def _fan_out(event: dict) -> None:
+    started = time.perf_counter()
+    for sub in list(_subscribers.values()):
+        if not sub.wants(event):
+            continue
         try:
-            queue.put_nowait(event)
+            sub.queue.put_nowait(event)
+            _stats["deliveries"] += 1
         except asyncio.QueueFull:
-            stale_queues.append(queue)
+            _handle_overflow(sub, event)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _stats["fanout_count"] += 1
+    _stats["fanout_total_ms"] += elapsed_ms
+    _stats["fanout_last_ms"] = elapsed_ms
+    _stats["fanout_max_ms"] = max(_stats["fanout_max_ms"], elapsed_ms)
+
+
+def _drain(queue: asyncio.Queue) -> int:
+    drained = 0
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return drained
+        drained += 1
+
+
+def _handle_overflow(sub: Subscription, event: dict) -> None:
+    """Apply REALTIME_OVERFLOW_POLICY to a subscriber whose queue is full.
+
+    - drop_oldest: discard the oldest queued event and enqueue the new one;
+    - resync: replace the backlog with a single resync marker, the client
+      then drops its caches and refetches the current screen;
+    - disconnect: close the stream so the client reconnects from scratch.
+    """
+    policy = REALTIME_OVERFLOW_POLICY if REALTIME_OVERFLOW_POLICY in OVERFLOW_POLICIES else "resync"
+
+    if policy == "drop_oldest":
+        sub.queue.get_nowait()
+        sub.queue.put_nowait(event)
+        sub.dropped += 1
+        _stats["dropped_events"] += 1
+        _stats["deliveries"] += 1
+        return
+
+    dropped = _drain(sub.queue) + 1
+    sub.dropped += dropped
+    _stats["dropped_events"] += dropped
 
-    for queue in stale_queues:
-        _subscribers.discard(queue)
+    if policy == "resync":
+        _stats["resyncs"] += 1
+        sub.queue.put_nowait({
+            "id": event["id"],
+            "kind": RESYNC_KIND,
+            "dropped": dropped,
+            "created_at": event["created_at"],
+        })
+        return
+
+    _stats["disconnects"] += 1
+    _subscribers.pop(sub.id, None)
+    # None tells the stream loop to finish the response.
+    sub.queue.put_nowait(None)
+
+
+def parse_channels(raw: str | list[str] | None) -> set[str] | None:
+    """Parse `orders,inventory` (or a list of names) into a channel set.
+
+    An empty value means the client did not declare channels and gets everything.
+    """
+    if raw is None:
+        return None
+    items = raw.split(",") if isinstance(raw, str) else raw
+    channels = {item.strip() for item in items if item and item.strip()}
+    return channels or None
+
+
+async def _heartbeat() -> None:
+    """Single timer for all connections: ping only those idle for a full interval.
+
+    Dead clients are detected when the ping write fails, which ends their
+    stream and unsubscribes them.
+    """
+    while True:
+        await asyncio.sleep(REALTIME_HEARTBEAT_SECONDS)
+        idle_before = time.monotonic() - REALTIME_HEARTBEAT_SECONDS
+        for sub in list(_subscribers.values()):
+            if sub.last_sent <= idle_before and sub.queue.empty():
+                sub.queue.put_nowait(_PING)
+                _stats["heartbeats"] += 1
+
+
+def _ensure_heartbeat() -> None:
+    global _loop, _heartbeat_task
+    loop = asyncio.get_running_loop()
+    if _loop is not loop or _heartbeat_task is None or _heartbeat_task.done():
+        _loop = loop
+        _heartbeat_task = loop.create_task(_heartbeat())
+
+
+def subscribe(user: dict, channels: set[str] | None = None, transport: str = "sse") -> Subscription:
+    """Register a client (transport: "sse" or "ws"). Must be called from the event loop serving the stream."""
+    _ensure_heartbeat()
+    sub = Subscription(user, channels, transport)
+    _subscribers[sub.id] = sub
+    _stats["connections_total"] += 1
+    return sub
 
 
-def subscribe() -> asyncio.Queue:
-    queue: asyncio.Queue = asyncio.Queue(maxsize=128)
-    _subscribers.add(queue)
-    return queue
+def unsubscribe(sub: Subscription) -> None:
+    _subscribers.pop(sub.id, None)
 
 
-def unsubscribe(queue: asyncio.Queue) -> None:
-    _subscribers.discard(queue)
+def get_subscription(subscription_id: str) -> Subscription | None:
+    return _subscribers.get(subscription_id)
+
+
+def connection_counts() -> dict[str, int]:
+    counts = {"sse": 0, "ws": 0}
+    for sub in list(_subscribers.values()):
+        counts[sub.transport] = counts.get(sub.transport, 0) + 1
+    return counts
+
+
+def realtime_stats() -> dict:
+    depths = [sub.queue.qsize() for sub in _subscribers.values()]
+    fanout_count = _stats["fanout_count"]
+    return {
+        "policy": REALTIME_OVERFLOW_POLICY,
+        "queue_size": REALTIME_QUEUE_SIZE,
+        "heartbeat_seconds": REALTIME_HEARTBEAT_SECONDS,
+        "connections": len(_subscribers),
+        **_stats,
+        "fanout_avg_ms": _stats["fanout_total_ms"] / fanout_count if fanout_count else 0.0,
+        "queue_depth_max": max(depths, default=0),
+        "queue_depth_avg": sum(depths) / len(depths) if depths else 0.0,
+        "subscribers": [
+            {
+                "id": sub.id,
+                "transport": sub.transport,
+                "user_id": sub.user["id"],
+                "role": sub.user["role"],
+                "channels": sorted(sub.channels) if sub.channels is not None else None,
+                "queue_depth": sub.queue.qsize(),
+                "dropped": sub.dropped,
+                "connected_for_s": round(time.time() - sub.connected_at, 1),
+            }
+            for sub in _subscribers.values()
+        ],
+    }
 
 
 def event_matches_user(event: dict, user: dict) -> bool:
@@ -71,3 +305,38 @@ def event_matches_user(event: dict, user: dict) -> bool:
 
 def encode_sse(event_name: str, payload: dict) -> str:
     return f"event: {event_name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_compact_hello(sub: Subscription) -> str:
+    return _compact_json({
+        "t": "hello",
+        "user_id": sub.user["id"],
+        "role": sub.user["role"],
+        "subscription_id": sub.id,
+        "channels": list(CHANNEL_TABLE),
+        "prefixes": list(PREFIX_TABLE),
+    })
+
+
+def encode_compact(event: dict) -> str:
+    """WebSocket frame: `0` for ping, `[id, kind]` for resync and
+    `[id, kind, channel_ids, prefix_ids, payload]` for updates.
+
+    Routing fields (user_ids, roles) and created_at stay on the server.
+    """
+    kind = event["kind"]
+    if kind == PING_KIND:
+        return "0"
+    if kind == RESYNC_KIND:
+        return _compact_json([event["id"], kind])
+    return _compact_json([
+        event["id"],
+        kind,
+        [_CHANNEL_IDS.get(name, name) for name in event["channels"]],
+        [_PREFIX_IDS.get(prefix, prefix) for prefix in event["cache_prefixes"]],
+        event["payload"],
+    ])
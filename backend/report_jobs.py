@@ -0,0 +1,161 @@
+"""Background report jobs.
+
+A job is a row in report_jobs: submitted by a request, computed by a small
+thread pool in the worker that accepted it, and readable from any worker.
+When it finishes, a `reports.ready` event goes out through the outbox, so
+clients can wait on SSE instead of polling.
+
+Identical requests (same kind and parameters) share one job while it is in
+flight, and reuse its stored result while the data versions of the report's
+cache prefixes (backend/etags.py) and today's date are the ones the job
+started with. Versions also change for events that commit late with a lower
+outbox id, which a "no event after id N" check would miss.
+"""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+
+from backend.config import REPORT_JOB_RETENTION_HOURS, REPORT_JOB_WORKERS
+from backend.database import get_db
+from backend.etags import data_version
+from backend.outbox import enqueue_event
+from backend.response_cache import encode_json
+
+READY_KIND = "reports.ready"
+# In-flight jobs older than this are treated as lost (worker restarted).
+STALE_RUNNING_MINUTES = 30
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _utc(delta: timedelta = timedelta()) -> str:
+    return (datetime.now(timezone.utc) + delta).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _dedupe_key(kind: str, params: dict) -> str:
+    return kind + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+def _job_version(depends_on: tuple[str, ...]) -> str:
+    # Empty dates mean a period ending today.
+    return f"{date.today().isoformat()}/{data_version(depends_on)}"
+
+
+def _is_fresh(row, depends_on: tuple[str, ...]) -> bool:
+    """True if nothing the report reads changed since the job started.
+
+    Versions of another worker or process lifetime may differ for the same
+    data: the job is then recomputed, never reused stale.
+    """
+    return row["data_version"] is not None and row["data_version"] == _job_version(depends_on)
+
+
+def job_dict(row) -> dict:
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "params": json.loads(row["params"]),
+        "status": row["status"],
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+
+
+def submit_job(
+    kind: str,
+    params: dict,
+    user: dict,
+    build: Callable[..., object],
+    *,
+    depends_on: tuple[str, ...],
+    roles: tuple[str, ...],
+) -> dict:
+    """Return an existing equivalent job or queue a new one running build(**params)."""
+    global _executor
+    key = _dedupe_key(kind, params)
+    db = get_db()
+    db.execute(
+        "DELETE FROM report_jobs WHERE created_at < ?",
+        (_utc(-timedelta(hours=REPORT_JOB_RETENTION_HOURS)),),
+    )
+    db.commit()
+
+    existing = db.execute(
+        """SELECT * FROM report_jobs
+           WHERE dedupe_key = ? AND (
+               (status IN ('queued', 'running') AND created_at >= ?)
+               OR status = 'done'
+           )
+           ORDER BY created_at DESC LIMIT 1""",
+        (key, _utc(-timedelta(minutes=STALE_RUNNING_MINUTES))),
+    ).fetchone()
+    if existing and (existing["status"] != "done" or _is_fresh(existing, depends_on)):
+        db.close()
+        return job_dict(existing)
+
+    job_id = uuid.uuid4().hex
+    db.execute(
+        """INSERT INTO report_jobs (id, kind, params, dedupe_key, requested_by, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (job_id, kind, json.dumps(params, ensure_ascii=False), key, user["id"], _utc()),
+    )
+    db.commit()
+    row = db.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+    db.close()
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+    _executor.submit(_run_job, job_id, kind, params, build, depends_on, roles)
+    return job_dict(row)
+
+
+def _run_job(
+    job_id: str,
+    kind: str,
+    params: dict,
+    build: Callable[..., object],
+    depends_on: tuple[str, ...],
+    roles: tuple[str, ...],
+) -> None:
+    # Taken before the build reads anything: a change it may miss changes the version.
+    version = _job_version(depends_on)
+    db = get_db()
+    db.execute(
+        "UPDATE report_jobs SET status = 'running', started_at = ?, data_version = ? WHERE id = ?",
+        (_utc(), version, job_id),
+    )
+    db.commit()
+    db.close()
+
+    try:
+        result = encode_json(build(**params)).decode("utf-8")
+        status, error = "done", None
+    except Exception as err:  # report errors are stored on the job
+        print(f"[REPORT JOBS] {kind} {job_id} failed: {err}")
+        result, status, error = None, "failed", str(err)
+
+    db = get_db()
+    db.execute(
+        "UPDATE report_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+        (status, result, error, _utc(), job_id),
+    )
+    enqueue_event(
+        db,
+        READY_KIND,
+        channels=["reports"],
+        payload={"job_id": job_id, "kind": kind, "status": status},
+        roles=list(roles),
+    )
+    db.commit()
+    db.close()
+
+
+def get_job(job_id: str):
+    db = get_db()
+    row = db.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+    db.close()
+    return row
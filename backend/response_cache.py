@@ -0,0 +1,313 @@
+"""In-process cache for expensive JSON GET endpoints.
+
+    @router.get("/finance")
+    @cached_response("/api/reports", depends_on=REPORT_SOURCES)
+    def finance_report(...):
+
+Entries are keyed by endpoint, its path/query parameters, the caller's
+role and today's date (reports default to periods ending today, so a body
+computed yesterday is not served after midnight, like ETags in
+backend/etags.py), and hold the encoded JSON body so the size bound is exact. An entry is
+dropped when an event lists one of its `depends_on` prefixes in
+cache_prefixes: locally right after commit (enqueue_event) and on every
+worker when the outbox relay publishes the event.
+
+Endpoints cached with `max_stale` (stale-while-revalidate) keep invalidated
+entries instead: for up to max_stale seconds the old body is served with an
+`Age` header while one background thread recomputes it, and refresh
+listeners (the outbox, see backend/outbox.py) announce the fresh data. A user
+whose own write in this worker is newer than the body is not served it: the
+response is recomputed for them (see note_write).
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import date
+
+from fastapi.responses import Response
+
+from backend.config import RESPONSE_CACHE_MAX_BYTES
+from backend.fast_json import dumps
+
+_lock = threading.Lock()
+_entries: OrderedDict[tuple, dict] = OrderedDict()
+_total_bytes = 0
+# Bumped on every invalidation; a result computed across a bump is not stored.
+_generation = 0
+_stats: dict[str, dict[str, int]] = {}
+# Keys with a background refresh in flight, so each is recomputed once.
+_refreshing: set[tuple] = set()
+_refresh_executor: ThreadPoolExecutor | None = None
+_refresh_listeners: list = []
+REFRESH_WORKERS = 2
+# User of the current write request (set in backend/main.py), and when each
+# user's last write committed in this worker.
+_writer: ContextVar[int | None] = ContextVar("cache_writer", default=None)
+_last_write: dict[int, float] = {}
+
+
+def _prefix_stats(prefix: str) -> dict[str, int]:
+    if prefix not in _stats:
+        _stats[prefix] = {
+            "hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0, "stale_hits": 0, "refreshes": 0,
+        }
+    return _stats[prefix]
+
+
+def _overlaps(dependency: str, prefix: str) -> bool:
+    return dependency.startswith(prefix) or prefix.startswith(dependency)
+
+
+def _drop(key: tuple) -> dict:
+    global _total_bytes
+    entry = _entries.pop(key)
+    _total_bytes -= entry["size"]
+    return entry
+
+
+def invalidate_prefixes(prefixes: list[str] | None) -> None:
+    """Drop cached responses that depend on any of the given URL prefixes. Thread-safe."""
+    global _generation
+    if not prefixes:
+        return
+    now = time.time()
+    with _lock:
+        _generation += 1
+        stale = [
+            key for key, entry in _entries.items()
+            if any(_overlaps(dep, prefix) for dep in entry["depends_on"] for prefix in prefixes)
+        ]
+        for key in stale:
+            entry = _entries[key]
+            _prefix_stats(entry["prefix"])["invalidations"] += 1
+            if entry["max_stale"] > 0:
+                # Kept for stale-while-revalidate; entries are replaced, never mutated.
+                _entries[key] = {
+                    **entry,
+                    "stale_since": entry["stale_since"] or now,
+                    "invalidated_generation": _generation,
+                }
+            else:
+                _drop(key)
+
+
+def track_writer(user_id: int | None) -> None:
+    """Attribute writes committed in this context to user_id."""
+    _writer.set(user_id)
+
+
+def note_write() -> None:
+    """A write of the current request committed (called by enqueue_event)."""
+    user_id = _writer.get()
+    if user_id is not None:
+        _last_write[user_id] = time.time()
+
+
+def serves_stale(entry: dict, user: dict) -> bool:
+    """True for an invalidated entry that may still be served to user.
+
+    Not when the body was stored before the user's own last write: they
+    would not see their change. Writes made through other workers are not
+    known here.
+    """
+    return bool(entry["stale_since"]) and _last_write.get(user.get("id"), 0.0) <= entry["stored_at"]
+
+
+def invalidation_generation() -> int:
+    """Counter bumped by every invalidation; results computed across a bump may be stale."""
+    return _generation
+
+
+def clear_response_cache() -> None:
+    global _total_bytes, _generation
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+        _generation += 1
+
+
+def body_version(body: bytes) -> str:
+    """Short content hash of an encoded body: equal on every worker for equal data."""
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+def cache_lookup(prefix: str, key: tuple) -> tuple[dict | None, int]:
+    """(entry or None; generation to pass to cache_store).
+
+    The entry has "body", "version", "stored_at" and "stale_since": None when
+    fresh, else the time it was invalidated (still within its max_stale).
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry["stale_since"] and time.time() - entry["stale_since"] > entry["max_stale"]:
+            _drop(key)
+            entry = None
+        if entry is not None:
+            _entries.move_to_end(key)
+            _prefix_stats(prefix)["stale_hits" if entry["stale_since"] else "hits"] += 1
+            return entry, _generation
+        _prefix_stats(prefix)["misses"] += 1
+        return None, _generation
+
+
+def _new_entry(prefix: str, depends_on, body: bytes, max_stale: float) -> dict:
+    return {
+        "body": body,
+        "version": body_version(body),
+        "size": len(body),
+        "prefix": prefix,
+        "depends_on": frozenset((prefix, *depends_on)),
+        "max_stale": max_stale,
+        "stored_at": time.time(),
+        "stale_since": None,
+        "invalidated_generation": 0,
+    }
+
+
+def _put(key: tuple, entry: dict) -> None:
+    """Insert under _lock and evict least recently used entries over the limit."""
+    global _total_bytes
+    if key in _entries:
+        _drop(key)
+    _entries[key] = entry
+    _total_bytes += entry["size"]
+    _prefix_stats(entry["prefix"])["stores"] += 1
+    while _total_bytes > RESPONSE_CACHE_MAX_BYTES:
+        _, evicted = _entries.popitem(last=False)
+        _total_bytes -= evicted["size"]
+        _prefix_stats(evicted["prefix"])["evictions"] += 1
+
+
+def cache_store(prefix: str, key: tuple, depends_on, body: bytes, generation: int, max_stale: float = 0) -> dict:
+    """Store body unless an invalidation happened since `generation` was read. Returns the entry."""
+    entry = _new_entry(prefix, depends_on, body, max_stale)
+    if entry["size"] > RESPONSE_CACHE_MAX_BYTES:
+        return entry
+    with _lock:
+        if generation == _generation:
+            _put(key, entry)
+    return entry
+
+
+def add_refresh_listener(callback) -> None:
+    """Call callback(prefix, channels, roles) after a stale entry was recomputed in the background."""
+    _refresh_listeners.append(callback)
+
+
+def refresh_in_background(prefix: str, key: tuple, compute, *, channels: list[str], roles: list[str]) -> None:
+    """Recompute a stale entry with compute() -> bytes | None, unless a refresh of it is already running."""
+    global _refresh_executor
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+        generation = _generation
+    if _refresh_executor is None:
+        _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+    _refresh_executor.submit(_refresh, prefix, key, compute, generation, channels, roles)
+
+
+def _refresh(prefix: str, key: tuple, compute, generation: int, channels: list[str], roles: list[str]) -> None:
+    try:
+        body = compute()
+    except Exception as err:  # the stale body stays until it expires
+        print(f"[RESPONSE CACHE] refresh of {prefix} failed: {err}")
+        body = None
+    with _lock:
+        _refreshing.discard(key)
+        current = _entries.get(key)
+        # Invalidated again while computing: the result may already be stale, keep waiting.
+        if body is None or current is None or current["invalidated_generation"] > generation:
+            return
+        _put(key, _new_entry(prefix, current["depends_on"], body, current["max_stale"]))
+        _prefix_stats(prefix)["refreshes"] += 1
+    for listener in _refresh_listeners:
+        try:
+            listener(prefix, channels, roles)
+        except Exception as err:
+            print(f"[RESPONSE CACHE] refresh listener failed: {err}")
+
+
+def stale_headers(entry: dict) -> dict:
+    return {"X-Cache": "STALE", "Age": str(int(time.time() - entry["stored_at"]))}
+
+
+def encode_json(result) -> bytes:
+    # Same encoding as the API routers' responses (backend/fast_json.py).
+    return dumps(result)
+
+
+def cached_response(
+    prefix: str,
+    depends_on: tuple[str, ...] = (),
+    *,
+    max_stale: float = 0,
+    channels: tuple[str, ...] = ("reports",),
+):
+    """Cache a sync JSON endpoint that takes the current user as `user`.
+
+    prefix groups the stats; depends_on lists every cache prefix whose events
+    change the result (prefix itself is always included). With max_stale > 0
+    an invalidated response is served for up to that many seconds while it is
+    recomputed in the background; the refresh is announced on `channels` to
+    the caller's role.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user = kwargs.get("user") or {}
+            params = tuple(sorted((k, repr(v)) for k, v in kwargs.items() if k != "user"))
+            key = (func.__module__, func.__qualname__, user.get("role"), date.today().isoformat(), params)
+
+            entry, generation = cache_lookup(prefix, key)
+            if entry is not None and entry["stale_since"] and not serves_stale(entry, user):
+                entry = None  # recomputed below, with the caller's write
+            if entry is not None and entry["stale_since"]:
+                def compute():
+                    result = func(*args, **kwargs)
+                    return None if isinstance(result, Response) else encode_json(result)
+
+                refresh_in_background(prefix, key, compute, channels=list(channels), roles=[user.get("role")])
+                return Response(entry["body"], media_type="application/json", headers=stale_headers(entry))
+            if entry is not None:
+                return Response(entry["body"], media_type="application/json", headers={"X-Cache": "HIT"})
+
+            result = func(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            body = encode_json(result)
+            cache_store(prefix, key, depends_on, body, generation, max_stale)
+            return Response(body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+        # Same dependencies drive the endpoint's ETag (backend/etags.py).
+        wrapper.etag_depends_on = (prefix, *depends_on)
+        return wrapper
+
+    return decorator
+
+
+def response_cache_stats() -> dict:
+    with _lock:
+        per_prefix = {}
+        for prefix, counters in _stats.items():
+            lookups = counters["hits"] + counters["misses"]
+            per_prefix[prefix] = {
+                **counters,
+                "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": 0,
+                "bytes": 0,
+            }
+        for entry in _entries.values():
+            item = per_prefix.setdefault(entry["prefix"], {"entries": 0, "bytes": 0})
+            item["entries"] += 1
+            item["bytes"] += entry["size"]
+        return {
+            "max_bytes": RESPONSE_CACHE_MAX_BYTES,
+            "bytes": _total_bytes,
+            "entries": len(_entries),
+            "prefixes": per_prefix,
+        }
@@ -0,0 +1,222 @@
+"""Daily rollups behind the finance, orders-summary, employee-stats and payroll reports.
+
+report_daily_orders/services/penalties aggregate orders and fines per day;
+report_daily_employees holds per-employee daily KPIs: attendance, order
+status transitions by target status, incidents and fines.
+
+The order, attendance and incident write paths call the record_* helpers
+inside their transaction, so the rollups always match the source tables. Rows that were
+written some other way (imports, manual SQL) are picked up by a rebuild:
+
+    python -m backend.rollups
+"""
+from backend.database import get_db
+
+
+def _day(value) -> str:
+    # created_at is 'YYYY-MM-DD HH:MM:SS' text on both engines.
+    return str(value)[:10]
+
+
+def _add_orders(db, day: str, status: str, count: int, revenue: float, material_cost: float) -> None:
+    db.execute(
+        """INSERT INTO report_daily_orders (day, status, orders_count, revenue, material_cost)
+           VALUES (?, ?, ?, ?, ?)
+           ON CONFLICT(day, status) DO UPDATE SET
+               orders_count = report_daily_orders.orders_count + excluded.orders_count,
+               revenue = report_daily_orders.revenue + excluded.revenue,
+               material_cost = report_daily_orders.material_cost + excluded.material_cost""",
+        (day, status, count, revenue, material_cost),
+    )
+
+
+def _add_services(db, order_id: int, day: str, sign: int) -> None:
+    items = db.execute(
+        "SELECT service_id, COUNT(*) as cnt, COALESCE(SUM(total), 0) as revenue FROM order_items WHERE order_id = ? GROUP BY service_id",
+        (order_id,),
+    ).fetchall()
+    for item in items:
+        db.execute(
+            """INSERT INTO report_daily_services (day, service_id, items_count, revenue)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(day, service_id) DO UPDATE SET
+                   items_count = report_daily_services.items_count + excluded.items_count,
+                   revenue = report_daily_services.revenue + excluded.revenue""",
+            (day, item["service_id"], sign * item["cnt"], sign * item["revenue"]),
+        )
+
+
+def record_order_created(db, order_id: int) -> None:
+    """Call after the order and its items are inserted, before commit."""
+    order = db.execute(
+        "SELECT status, total_price, material_cost, created_at FROM orders WHERE id = ?",
+        (order_id,),
+    ).fetchone()
+    day = _day(order["created_at"])
+    _add_orders(db, day, order["status"], 1, order["total_price"], order["material_cost"])
+    if order["status"] != "cancelled":
+        _add_services(db, order_id, day, 1)
+
+
+def record_order_status_change(db, order_id: int, old_status: str, new_status: str) -> None:
+    if old_status == new_status:
+        return
+    order = db.execute(
+        "SELECT total_price, material_cost, created_at FROM orders WHERE id = ?",
+        (order_id,),
+    ).fetchone()
+    day = _day(order["created_at"])
+    _add_orders(db, day, old_status, -1, -order["total_price"], -order["material_cost"])
+    _add_orders(db, day, new_status, 1, order["total_price"], order["material_cost"])
+
+    # Service rollups only hold non-cancelled orders.
+    if new_status == "cancelled":
+        _add_services(db, order_id, day, -1)
+    elif old_status == "cancelled":
+        _add_services(db, order_id, day, 1)
+
+
+def _add_employee(db, day: str, user_id: int, **counters) -> None:
+    columns = ", ".join(counters)
+    placeholders = ", ".join("?" * len(counters))
+    updates = ", ".join(f"{c} = report_daily_employees.{c} + excluded.{c}" for c in counters)
+    db.execute(
+        f"""INSERT INTO report_daily_employees (day, user_id, {columns})
+            VALUES (?, ?, {placeholders})
+            ON CONFLICT(day, user_id) DO UPDATE SET {updates}""",
+        (day, user_id, *counters.values()),
+    )
+
+
+def record_checkin(db, attendance_id: int) -> None:
+    """Call after the attendance row is inserted, before commit."""
+    row = db.execute("SELECT user_id, date FROM attendance WHERE id = ?", (attendance_id,)).fetchone()
+    _add_employee(db, _day(row["date"]), row["user_id"], days_worked=1)
+
+
+def record_order_transition(db, history_id: int) -> None:
+    """Call after an order_history row is inserted, before commit."""
+    row = db.execute(
+        "SELECT changed_by, new_status, created_at FROM order_history WHERE id = ?",
+        (history_id,),
+    ).fetchone()
+    status = row["new_status"]
+    _add_employee(
+        db, _day(row["created_at"]), row["changed_by"],
+        transitions=1,
+        design_done=int(status == "design_done"),
+        printed=int(status == "printed"),
+        ready=int(status == "ready"),
+    )
+
+
+def record_incident(db, incident_id: int) -> None:
+    """Call after the incident is inserted, before commit."""
+    incident = db.execute(
+        "SELECT user_id, deduction_amount, created_at FROM incidents WHERE id = ?",
+        (incident_id,),
+    ).fetchone()
+    amount = incident["deduction_amount"]
+    is_fine = bool(amount and amount > 0)
+    _add_employee(
+        db, _day(incident["created_at"]), incident["user_id"],
+        incidents_count=1,
+        fines_count=int(is_fine),
+        fines_total=amount if is_fine else 0,
+    )
+    if not is_fine:
+        return
+    db.execute(
+        """INSERT INTO report_daily_penalties (day, incidents_count, penalties_total)
+           VALUES (?, 1, ?)
+           ON CONFLICT(day) DO UPDATE SET
+               incidents_count = report_daily_penalties.incidents_count + 1,
+               penalties_total = report_daily_penalties.penalties_total + excluded.penalties_total""",
+        (_day(incident["created_at"]), amount),
+    )
+
+
+def rebuild_rollups(db) -> None:
+    db.execute("DELETE FROM report_daily_orders")
+    db.execute("DELETE FROM report_daily_services")
+    db.execute("DELETE FROM report_daily_penalties")
+    db.execute(
+        """INSERT INTO report_daily_orders (day, status, orders_count, revenue, material_cost)
+           SELECT substr(created_at, 1, 10), status, COUNT(*),
+                  COALESCE(SUM(total_price), 0), COALESCE(SUM(material_cost), 0)
+           FROM orders
+           GROUP BY substr(created_at, 1, 10), status"""
+    )
+    db.execute(
+        """INSERT INTO report_daily_services (day, service_id, items_count, revenue)
+           SELECT substr(o.created_at, 1, 10), oi.service_id, COUNT(oi.id), COALESCE(SUM(oi.total), 0)
+           FROM order_items oi
+           JOIN orders o ON o.id = oi.order_id
+           WHERE o.status != 'cancelled'
+           GROUP BY substr(o.created_at, 1, 10), oi.service_id"""
+    )
+    db.execute(
+        """INSERT INTO report_daily_penalties (day, incidents_count, penalties_total)
+           SELECT substr(created_at, 1, 10), COUNT(*), COALESCE(SUM(deduction_amount), 0)
+           FROM incidents
+           WHERE deduction_amount > 0
+           GROUP BY substr(created_at, 1, 10)"""
+    )
+    db.execute("DELETE FROM report_daily_employees")
+    db.execute(
+        """INSERT INTO report_daily_employees
+               (day, user_id, days_worked, transitions, design_done, printed, ready,
+                incidents_count, fines_count, fines_total)
+           SELECT day, user_id, SUM(days_worked), SUM(transitions), SUM(design_done), SUM(printed), SUM(ready),
+                  SUM(incidents_count), SUM(fines_count), SUM(fines_total)
+           FROM (
+               SELECT substr(date, 1, 10) AS day, user_id, 1 AS days_worked, 0 AS transitions,
+                      0 AS design_done, 0 AS printed, 0 AS ready,
+                      0 AS incidents_count, 0 AS fines_count, 0.0 AS fines_total
+               FROM attendance
+               UNION ALL
+               SELECT substr(created_at, 1, 10), changed_by, 0, 1,
+                      CASE WHEN new_status = 'design_done' THEN 1 ELSE 0 END,
+                      CASE WHEN new_status = 'printed' THEN 1 ELSE 0 END,
+                      CASE WHEN new_status = 'ready' THEN 1 ELSE 0 END,
+                      0, 0, 0.0
+               FROM order_history
+               UNION ALL
+               SELECT substr(created_at, 1, 10), user_id, 0, 0, 0, 0, 0, 1,
+                      CASE WHEN deduction_amount > 0 THEN 1 ELSE 0 END,
+                      CASE WHEN deduction_amount > 0 THEN deduction_amount ELSE 0 END
+               FROM incidents
+           ) kpi
+           GROUP BY day, user_id"""
+    )
+
+
+def ensure_rollups() -> None:
+    """Build rollups once for databases that predate them."""
+    db = get_db()
+    has_rollups = db.execute("SELECT 1 FROM report_daily_orders LIMIT 1").fetchone()
+    has_orders = db.execute("SELECT 1 FROM orders LIMIT 1").fetchone()
+    has_penalty_rollups = db.execute("SELECT 1 FROM report_daily_penalties LIMIT 1").fetchone()
+    has_penalties = db.execute("SELECT 1 FROM incidents WHERE deduction_amount > 0 LIMIT 1").fetchone()
+    has_employee_rollups = db.execute("SELECT 1 FROM report_daily_employees LIMIT 1").fetchone()
+    has_employee_rows = (
+        db.execute("SELECT 1 FROM attendance LIMIT 1").fetchone()
+        or db.execute("SELECT 1 FROM order_history LIMIT 1").fetchone()
+        or db.execute("SELECT 1 FROM incidents LIMIT 1").fetchone()
+    )
+    if (
+        (has_orders and not has_rollups)
+        or (has_penalties and not has_penalty_rollups)
+        or (has_employee_rows and not has_employee_rollups)
+    ):
+        rebuild_rollups(db)
+        db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    _db = get_db()
+    rebuild_rollups(_db)
+    _db.commit()
+    _db.close()
+    print("[ROLLUPS] Rebuilt report_daily_* tables")
@@ -2,9 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.config import ALLOWED_ROLES
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/announcements", tags=["announcements"])
+router = APIRouter(prefix="/api/announcements", tags=["announcements"], route_class=FastJSONRoute)
 
 
 class AnnouncementCreate(BaseModel):
@@ -12,9 +16,7 @@ class AnnouncementCreate(BaseModel):
     target_user_id: int | None = None
 
 
-@router.get("")
-def list_announcements(unread: int = 0, user=Depends(get_current_user)):
-    db = get_db()
+def _announcement_rows(db, user, unread: int = 0) -> list[dict]:
     conditions = ["(a.target_user_id IS NULL OR a.target_user_id = ?)"]
     params = [user["id"]]
     if unread:
@@ -33,10 +35,19 @@ def list_announcements(unread: int = 0, user=Depends(get_current_user)):
             LIMIT 100""",
         [user["id"]] + params,
     ).fetchall()
-    db.close()
     return [dict(r) for r in rows]
 
 
+@router.get("")
+@versioned("/api/announcements")
+@single_flight("/api/announcements", per_user_roles=ALLOWED_ROLES)
+def list_announcements(unread: int = 0, user=Depends(get_current_user)):
+    db = get_db()
+    rows = _announcement_rows(db, user, unread)
+    db.close()
+    return rows
+
+
 @router.post("")
 def create_announcement(data: AnnouncementCreate, user=Depends(role_required("director"))):
     if not data.message.strip():
@@ -49,14 +60,15 @@ def create_announcement(data: AnnouncementCreate, user=Depends(role_required("di
     )
     ann_id = cur.lastrowid
     row = db.execute("SELECT * FROM announcements WHERE id = ?", (ann_id,)).fetchone()
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "announcements.created",
         channels=["announcements", "dashboard"],
         cache_prefixes=["/api/announcements"],
         payload={"announcement_id": ann_id, "message": row["message"]},
         user_ids=[data.target_user_id] if data.target_user_id else None,
     )
+    db.commit()
     db.close()
     return dict(row)
 
@@ -70,13 +82,14 @@ def mark_read(announcement_id: int, user=Depends(get_current_user)):
            ON CONFLICT(announcement_id, user_id) DO NOTHING""",
         (announcement_id, user["id"]),
     )
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "announcements.read",
         channels=["announcements"],
         cache_prefixes=["/api/announcements"],
         payload={"announcement_id": announcement_id, "user_id": user["id"]},
         user_ids=[user["id"]],
     )
+    db.commit()
     db.close()
     return {"ok": True}
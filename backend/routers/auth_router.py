@@ -3,8 +3,9 @@ from pydantic import BaseModel
 from backend.database import get_db
 from backend.auth import verify_password, create_token, hash_password
 from backend.dependencies import get_current_user
+from backend.fast_json import FastJSONRoute
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], route_class=FastJSONRoute)
 
 
 class LoginRequest(BaseModel):
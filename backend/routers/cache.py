@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+from backend.dependencies import role_required
+from backend.fast_json import FastJSONRoute
+from backend.response_cache import response_cache_stats
+from backend.single_flight import single_flight_stats
+
+router = APIRouter(prefix="/api/cache", tags=["cache"], route_class=FastJSONRoute)
+
+
+@router.get("/stats")
+def get_cache_stats(user=Depends(role_required("director"))):
+    return {**response_cache_stats(), "single_flight": single_flight_stats()}
@@ -0,0 +1,149 @@
+"""Composite dashboard endpoint: every widget of the start page in one request.
+
+Each widget is cached separately in the response cache, under its own
+dependency prefixes, so an order event recomputes the summary but keeps
+announcements and attendance. A widget's version is a hash of its encoded
+data (the same on every worker); the client sends the versions it holds in
+`versions=tasks:<hash>,summary:<hash>` and unchanged widgets come back
+without data. Widgets missing from the cache are computed together with
+fan_out_reads. The summary is served stale while it is recomputed, like the
+reports it mirrors (see backend/response_cache.py).
+"""
+import json
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+
+from backend.config import REPORT_MAX_STALE_SECONDS
+from backend.database import fan_out_reads
+from backend.dependencies import get_current_user
+from backend.etags import versioned
+from backend.fast_json import FastJSONRoute
+from backend.response_cache import cache_lookup, cache_store, encode_json, refresh_in_background, serves_stale
+from backend.routers.announcements import _announcement_rows
+from backend.routers.hr import _attendance_on, _today_iso
+from backend.routers.inventory import _low_stock
+from backend.routers.reports import REPORT_SOURCES, _finance_data_on, _orders_summary_on
+from backend.routers.tasks import _task_rows
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"], route_class=FastJSONRoute)
+
+CACHE_PREFIX = "/api/dashboard"
+STAFF_ROLES = ("director", "manager")
+
+
+def _summary(db, user, date_from, date_to):
+    # A fan_out_reads job itself: its queries run on the job's connection.
+    if user["role"] == "director":
+        return _finance_data_on(db, date_from, date_to)
+    return _orders_summary_on(db, date_from, date_to)
+
+
+# name -> (roles or None for everyone, depends_on, max_stale, cache scope, compute(db, user, date_from, date_to))
+WIDGETS = {
+    "summary": (
+        STAFF_ROLES,
+        REPORT_SOURCES,
+        REPORT_MAX_STALE_SECONDS,
+        # Empty dates mean a period ending today.
+        lambda user, date_from, date_to: (user["role"], date_from, date_to, _today_iso()),
+        _summary,
+    ),
+    "tasks": (
+        None,
+        ("/api/tasks", "/api/users"),
+        0,
+        lambda user, date_from, date_to: user["id"] if user["role"] not in STAFF_ROLES else "all",
+        lambda db, user, date_from, date_to: _task_rows(db, user, done="0"),
+    ),
+    "inventory_alerts": (
+        STAFF_ROLES,
+        ("/api/inventory",),
+        0,
+        lambda user, date_from, date_to: None,
+        lambda db, user, date_from, date_to: _low_stock(db),
+    ),
+    "attendance_today": (
+        STAFF_ROLES,
+        ("/api/hr", "/api/users"),
+        0,
+        lambda user, date_from, date_to: _today_iso(),
+        lambda db, user, date_from, date_to: _attendance_on(db, _today_iso()),
+    ),
+    "announcements": (
+        None,
+        ("/api/announcements", "/api/users"),
+        0,
+        lambda user, date_from, date_to: user["id"],
+        lambda db, user, date_from, date_to: _announcement_rows(db, user, unread=1),
+    ),
+}
+
+
+# Everything any widget reads, for the response's ETag.
+DEPENDS_ON = tuple(sorted({prefix for widget in WIDGETS.values() for prefix in widget[1]}))
+
+
+def _parse_versions(versions: str) -> dict[str, str]:
+    known = {}
+    for item in versions.split(","):
+        name, _, version = item.partition(":")
+        if name and version:
+            known[name] = version
+    return known
+
+
+@router.get("")
+@versioned(*DEPENDS_ON)
+def get_dashboard(
+    date_from: str = "",
+    date_to: str = "",
+    versions: str = "",
+    user=Depends(get_current_user),
+):
+    """Data of every widget available to the user's role, with per-widget versions."""
+    known = _parse_versions(versions)
+    entries = {}
+    missing = {}
+    for name, (roles, depends_on, max_stale, scope, compute) in WIDGETS.items():
+        if roles and user["role"] not in roles:
+            continue
+        key = ("dashboard", name, scope(user, date_from, date_to))
+        job = (lambda compute: lambda db: compute(db, user, date_from, date_to))(compute)
+        entry, generation = cache_lookup(CACHE_PREFIX, key)
+        if entry is not None and entry["stale_since"] and not serves_stale(entry, user):
+            entry = None  # older than the user's own write: computed below
+        if entry is not None and entry["stale_since"]:
+            refresh_in_background(
+                CACHE_PREFIX,
+                key,
+                (lambda name, job: lambda: encode_json(fan_out_reads({name: job})[name]))(name, job),
+                channels=["reports"],
+                roles=[user["role"]],
+            )
+        if entry is not None:
+            entries[name] = entry
+        else:
+            missing[name] = (key, generation, depends_on, max_stale, job)
+
+    if missing:
+        results = fan_out_reads({name: job for name, (_, _, _, _, job) in missing.items()})
+        for name, (key, generation, depends_on, max_stale, _) in missing.items():
+            body = encode_json(results[name])
+            entries[name] = cache_store(CACHE_PREFIX, key, depends_on, body, generation, max_stale)
+
+    # Assembled from the cached bodies: widget data is never decoded again.
+    parts = []
+    for name in WIDGETS:
+        if name not in entries:
+            continue
+        entry = entries[name]
+        head = f'{json.dumps(name)}:{{"version":"{entry["version"]}"'
+        if known.get(name) == entry["version"]:
+            parts.append(f'{head},"unchanged":true}}'.encode("utf-8"))
+        else:
+            parts.append(head.encode("utf-8") + b',"data":' + entry["body"] + b"}")
+    body = b'{"widgets":{' + b",".join(parts) + b"}}"
+    # A stale widget will change soon: no ETag for this response (see backend/etags.py).
+    stale = any(entry.get("stale_since") for entry in entries.values())
+    return Response(body, media_type="application/json", headers={"X-Cache": "STALE"} if stale else None)
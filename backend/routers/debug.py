@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from backend.config import PROFILING_ENABLED, SQL_SLOW_MS
+from backend.dependencies import role_required
+from backend.fast_json import FastJSONRoute
+from backend.profiling import list_profiles, load_profile, profile_file_path
+from backend.sql_trace import recent_requests, request_breakdown, slow_queries
+
+router = APIRouter(prefix="/api/debug", tags=["debug"], route_class=FastJSONRoute)
+
+
+@router.get("/sql")
+def list_traced_requests(limit: int = 50, user=Depends(role_required("director"))):
+    """Latest traced requests of this worker with their query count and SQL time."""
+    return {"requests": recent_requests(max(1, min(limit, 500)))}
+
+
+@router.get("/sql/slow")
+def get_slow_queries(user=Depends(role_required("director"))):
+    return {"threshold_ms": SQL_SLOW_MS, "queries": slow_queries()}
+
+
+@router.get("/sql/{request_id}")
+def get_request_sql(request_id: str, user=Depends(role_required("director"))):
+    """Statements of one request (X-Request-ID) grouped by fingerprint."""
+    breakdown = request_breakdown(request_id)
+    if breakdown is None:
+        raise HTTPException(status_code=404, detail="Запрос не найден: трассировка не велась или уже удалена")
+    return breakdown
+
+
+@router.get("/profiles")
+def get_profiles(user=Depends(role_required("director"))):
+    """Stored request profiles (see backend/profiling.py), newest first."""
+    return {"enabled": PROFILING_ENABLED, "profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile_summary(profile_id: str, user=Depends(role_required("director"))):
+    meta = load_profile(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return meta
+
+
+@router.get("/profiles/{profile_id}/download")
+def download_profile(profile_id: str, user=Depends(role_required("director"))):
+    """The raw profile: .pstats (cprofile) or collapsed stacks (sample)."""
+    meta = load_profile(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return FileResponse(profile_file_path(meta), filename=meta["file"], media_type="application/octet-stream")
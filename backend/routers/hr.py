@@ -1,14 +1,18 @@
 ﻿from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pydantic import BaseModel
-from backend.database import get_db
+from backend.database import day_range, get_db
 from backend.dependencies import get_current_user, role_required
 from backend.config import UPLOAD_DIR
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.rollups import record_checkin, record_incident
+from backend.etags import versioned
+from backend.single_flight import single_flight
 import os
 import uuid
 from datetime import date
 
-router = APIRouter(prefix="/api/hr", tags=["hr"])
+router = APIRouter(prefix="/api/hr", tags=["hr"], route_class=FastJSONRoute)
 
 
 class IncidentCreate(BaseModel):
@@ -40,6 +44,15 @@ def _today_iso() -> str:
     return date.today().isoformat()
 
 
+def _incident_columns(alias: str = "") -> str:
+    # Listed, not *: the generated created_day index column is not part of the API.
+    p = f"{alias}." if alias else ""
+    return (
+        f"{p}id, {p}user_id, {p}type, {p}description, {p}photo, {p}order_id, {p}material_waste, "
+        f"{p}deduction_amount, {p}status, {p}created_by, {p}created_at"
+    )
+
+
 @router.post("/checkin")
 def checkin(user=Depends(get_current_user)):
     db = get_db()
@@ -51,18 +64,20 @@ def checkin(user=Depends(get_current_user)):
     if existing:
         db.close()
         raise HTTPException(status_code=400, detail="Р’С‹ СѓР¶Рµ РѕС‚РјРµС‚РёР»РёСЃСЊ СЃРµРіРѕРґРЅСЏ")
-    db.execute("INSERT INTO attendance (user_id) VALUES (?)", (user["id"],))
-    db.commit()
-    row = db.execute(
-        "SELECT * FROM attendance WHERE user_id = ? AND date = ?",
-        (user["id"], today),
-    ).fetchone()
-    publish_event(
+    cur = db.execute("INSERT INTO attendance (user_id) VALUES (?)", (user["id"],))
+    record_checkin(db, cur.lastrowid)
+    enqueue_event(
+        db,
         "hr.attendance.updated",
         channels=["hr", "work-journal", "reports"],
         cache_prefixes=["/api/hr", "/api/work-journal", "/api/reports"],
         payload={"user_id": user["id"], "date": today, "action": "checkin"},
     )
+    db.commit()
+    row = db.execute(
+        "SELECT * FROM attendance WHERE user_id = ? AND date = ?",
+        (user["id"], today),
+    ).fetchone()
     db.close()
     return dict(row)
 
@@ -105,14 +120,15 @@ def checkout(user=Depends(get_current_user)):
     db.execute(
         "UPDATE attendance SET check_out = datetime('now') WHERE id = ?", (existing["id"],)
     )
-    db.commit()
-    row = db.execute("SELECT * FROM attendance WHERE id = ?", (existing["id"],)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.attendance.updated",
         channels=["hr", "work-journal", "reports"],
         cache_prefixes=["/api/hr", "/api/work-journal", "/api/reports"],
         payload={"user_id": user["id"], "date": today, "action": "checkout"},
     )
+    db.commit()
+    row = db.execute("SELECT * FROM attendance WHERE id = ?", (existing["id"],)).fetchone()
     db.close()
     result = dict(row)
     result["shift_tasks_summary"] = {
@@ -123,21 +139,27 @@ def checkout(user=Depends(get_current_user)):
     return result
 
 
-@router.get("/attendance/today")
-def today_attendance(user=Depends(role_required("director", "manager"))):
-    db = get_db()
-    today = _today_iso()
+def _attendance_on(db, day: str) -> list[dict]:
     rows = db.execute(
         """SELECT a.*, u.full_name, u.role FROM attendance a
            JOIN users u ON u.id = a.user_id
            WHERE a.date = ?
            ORDER BY a.check_in""",
-        (today,),
+        (day,),
     ).fetchall()
-    db.close()
     return [dict(r) for r in rows]
 
 
+@router.get("/attendance/today")
+@versioned("/api/hr")
+@single_flight("/api/hr")
+def today_attendance(user=Depends(role_required("director", "manager"))):
+    db = get_db()
+    rows = _attendance_on(db, _today_iso())
+    db.close()
+    return rows
+
+
 @router.get("/attendance")
 def list_attendance(
     date_from: str = "",
@@ -220,13 +242,14 @@ def complete_shift_task(task_id: int, data: ShiftTaskUpdate, user=Depends(get_cu
             (user["id"], task_id, today),
         )
 
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.shift_tasks.updated",
         channels=["hr"],
         cache_prefixes=["/api/hr"],
         payload={"user_id": user["id"], "task_id": task_id, "completed": data.completed},
     )
+    db.commit()
     db.close()
     return {"ok": True}
 
@@ -258,14 +281,15 @@ def create_shift_task(data: ShiftTaskCreate, user=Depends(role_required("directo
         "INSERT INTO shift_tasks (role, title, is_required) VALUES (?, ?, ?)",
         (data.role, data.title.strip(), 1 if data.is_required else 0),
     )
-    db.commit()
-    row = db.execute("SELECT * FROM shift_tasks WHERE id = ?", (cur.lastrowid,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.shift_tasks.created",
         channels=["hr"],
         cache_prefixes=["/api/hr"],
         payload={"task_id": cur.lastrowid, "role": data.role},
     )
+    db.commit()
+    row = db.execute("SELECT * FROM shift_tasks WHERE id = ?", (cur.lastrowid,)).fetchone()
     db.close()
     return dict(row)
 
@@ -290,15 +314,16 @@ def update_shift_task(task_id: int, data: ShiftTaskDefUpdate, user=Depends(role_
         set_clause = ", ".join(f"{k} = ?" for k in updates)
         values = list(updates.values()) + [task_id]
         db.execute(f"UPDATE shift_tasks SET {set_clause} WHERE id = ?", values)
+        enqueue_event(
+            db,
+            "hr.shift_tasks.updated",
+            channels=["hr"],
+            cache_prefixes=["/api/hr"],
+            payload={"task_id": task_id},
+        )
         db.commit()
 
     updated = db.execute("SELECT * FROM shift_tasks WHERE id = ?", (task_id,)).fetchone()
-    publish_event(
-        "hr.shift_tasks.updated",
-        channels=["hr"],
-        cache_prefixes=["/api/hr"],
-        payload={"task_id": task_id},
-    )
     db.close()
     return dict(updated)
 
@@ -307,13 +332,14 @@ def update_shift_task(task_id: int, data: ShiftTaskDefUpdate, user=Depends(role_
 def delete_shift_task(task_id: int, user=Depends(role_required("director"))):
     db = get_db()
     db.execute("DELETE FROM shift_tasks WHERE id = ?", (task_id,))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.shift_tasks.deleted",
         channels=["hr"],
         cache_prefixes=["/api/hr"],
         payload={"task_id": task_id},
     )
+    db.commit()
     db.close()
     return {"ok": True}
 
@@ -384,10 +410,11 @@ def create_incident(data: IncidentCreate, user=Depends(role_required("director",
         (data.user_id, data.type, data.description, data.order_id, data.material_waste, data.deduction_amount, user["id"]),
     )
     incident_id = cur.lastrowid
+    record_incident(db, incident_id)
 
     # If defect with material waste, record additional write-off
     if data.type == "defect" and data.material_waste and data.order_id:
-        order = db.execute("SELECT * FROM orders WHERE id = ?", (data.order_id,)).fetchone()
+        order = db.execute("SELECT id FROM orders WHERE id = ?", (data.order_id,)).fetchone()
         if order:
             items = db.execute("SELECT * FROM order_items WHERE order_id = ? AND material_id IS NOT NULL LIMIT 1", (data.order_id,)).fetchall()
             for item in items:
@@ -400,14 +427,15 @@ def create_incident(data: IncidentCreate, user=Depends(role_required("director",
                     (item["material_id"], data.order_id, -data.material_waste, f"Р‘СЂР°Рє: {data.description}", user["id"]),
                 )
 
-    db.commit()
-    row = db.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.incidents.created",
         channels=["hr", "reports", "inventory"],
         cache_prefixes=["/api/hr", "/api/reports", "/api/inventory"],
         payload={"incident_id": incident_id, "user_id": data.user_id, "order_id": data.order_id},
     )
+    db.commit()
+    row = db.execute(f"SELECT {_incident_columns()} FROM incidents WHERE id = ?", (incident_id,)).fetchone()
     db.close()
     return dict(row)
 
@@ -430,17 +458,18 @@ def list_incidents(
     if user_id:
         conditions.append("i.user_id = ?")
         params.append(user_id)
-    if date_from:
-        conditions.append("i.created_at >= ?")
-        params.append(date_from)
-    if date_to:
-        conditions.append("i.created_at <= ?")
-        params.append(date_to + " 23:59:59")
+    try:
+        day_conditions, day_params = day_range("i.created_day", date_from, date_to)
+    except ValueError:
+        db.close()
+        raise HTTPException(status_code=400, detail="Некорректная дата")
+    conditions += day_conditions
+    params += day_params
     if penalties_only:
         conditions.append("COALESCE(i.deduction_amount, 0) > 0")
     where = " AND ".join(conditions)
     rows = db.execute(
-        f"""SELECT i.*, u.full_name as employee_name, c.full_name as created_by_name
+        f"""SELECT {_incident_columns('i')}, u.full_name as employee_name, c.full_name as created_by_name
             FROM incidents i
             JOIN users u ON u.id = i.user_id
             JOIN users c ON c.id = i.created_by
@@ -456,25 +485,28 @@ def list_incidents(
 @router.patch("/incidents/{incident_id}/review")
 def review_incident(incident_id: int, user=Depends(role_required("director"))):
     db = get_db()
-    db.execute("UPDATE incidents SET status = 'reviewed' WHERE id = ?", (incident_id,))
-    db.commit()
-    row = db.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
-    db.close()
-    if not row:
+    incident = db.execute("SELECT id FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+    if not incident:
+        db.close()
         raise HTTPException(status_code=404, detail="РРЅС†РёРґРµРЅС‚ РЅРµ РЅР°Р№РґРµРЅ")
-    publish_event(
+    db.execute("UPDATE incidents SET status = 'reviewed' WHERE id = ?", (incident_id,))
+    enqueue_event(
+        db,
         "hr.incidents.updated",
         channels=["hr", "reports"],
         cache_prefixes=["/api/hr", "/api/reports"],
         payload={"incident_id": incident_id, "status": "reviewed"},
     )
+    db.commit()
+    row = db.execute(f"SELECT {_incident_columns()} FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+    db.close()
     return dict(row)
 
 
 @router.post("/incidents/{incident_id}/photo")
 async def upload_incident_photo(incident_id: int, file: UploadFile = File(...), user=Depends(role_required("director", "manager"))):
     db = get_db()
-    incident = db.execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+    incident = db.execute("SELECT id FROM incidents WHERE id = ?", (incident_id,)).fetchone()
     if not incident:
         db.close()
         raise HTTPException(status_code=404, detail="РРЅС†РёРґРµРЅС‚ РЅРµ РЅР°Р№РґРµРЅ")
@@ -487,13 +519,14 @@ async def upload_incident_photo(incident_id: int, file: UploadFile = File(...),
         f.write(content)
 
     db.execute("UPDATE incidents SET photo = ? WHERE id = ?", (filename, incident_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "hr.incidents.updated",
         channels=["hr"],
         cache_prefixes=["/api/hr"],
         payload={"incident_id": incident_id, "photo": filename},
     )
+    db.commit()
     db.close()
     return {"filename": filename}
 
@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/inventory", tags=["inventory"])
+router = APIRouter(prefix="/api/inventory", tags=["inventory"], route_class=FastJSONRoute)
 
 
 class MaterialAdjust(BaseModel):
@@ -13,6 +16,8 @@ class MaterialAdjust(BaseModel):
 
 
 @router.get("")
+@versioned("/api/inventory")
+@single_flight("/api/inventory")
 def get_inventory(user=Depends(get_current_user)):
     if user["role"] not in ("director", "manager", "master"):
         raise HTTPException(status_code=403, detail="Нет доступа")
@@ -28,21 +33,29 @@ def get_inventory(user=Depends(get_current_user)):
     return result
 
 
+def _low_stock(db) -> list[dict]:
+    rows = db.execute("SELECT * FROM materials WHERE (quantity - reserved) < low_threshold ORDER BY id").fetchall()
+    return [dict(r) for r in rows]
+
+
 @router.get("/alerts")
+@versioned("/api/inventory")
+@single_flight("/api/inventory")
 def get_alerts(user=Depends(get_current_user)):
     if user["role"] not in ("director", "manager"):
         raise HTTPException(status_code=403, detail="Нет доступа")
     db = get_db()
-    rows = db.execute("SELECT * FROM materials WHERE (quantity - reserved) < low_threshold ORDER BY id").fetchall()
+    rows = _low_stock(db)
     db.close()
-    return [dict(r) for r in rows]
+    return rows
 
 
 @router.get("/{material_id}/ledger")
 def get_ledger(material_id: int, limit: int = 50, offset: int = 0, user=Depends(role_required("director", "manager"))):
     db = get_db()
     rows = db.execute(
-        """SELECT ml.*, u.full_name, o.order_number
+        """SELECT ml.id, ml.material_id, ml.order_id, ml.action, ml.quantity, ml.note, ml.performed_by,
+                  ml.created_at, u.full_name, o.order_number
            FROM material_ledger ml
            JOIN users u ON u.id = ml.performed_by
            LEFT JOIN orders o ON o.id = ml.order_id
@@ -69,14 +82,15 @@ def receive_material(material_id: int, data: MaterialAdjust, user=Depends(role_r
         "INSERT INTO material_ledger (material_id, action, quantity, note, performed_by) VALUES (?, 'receive', ?, ?, ?)",
         (material_id, data.quantity, data.note or "Приход материала", user["id"]),
     )
-    db.commit()
-    updated = db.execute("SELECT * FROM materials WHERE id = ?", (material_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "inventory.updated",
         channels=["inventory", "dashboard", "reports"],
         cache_prefixes=["/api/inventory", "/api/reports"],
         payload={"material_id": material_id},
     )
+    db.commit()
+    updated = db.execute("SELECT * FROM materials WHERE id = ?", (material_id,)).fetchone()
     db.close()
     result = dict(updated)
     result["available"] = result["quantity"] - result["reserved"]
@@ -96,14 +110,15 @@ def correct_material(material_id: int, data: MaterialAdjust, user=Depends(role_r
         "INSERT INTO material_ledger (material_id, action, quantity, note, performed_by) VALUES (?, 'correction', ?, ?, ?)",
         (material_id, data.quantity, data.note or "Корректировка", user["id"]),
     )
-    db.commit()
-    updated = db.execute("SELECT * FROM materials WHERE id = ?", (material_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "inventory.updated",
         channels=["inventory", "dashboard", "reports"],
         cache_prefixes=["/api/inventory", "/api/reports"],
         payload={"material_id": material_id},
     )
+    db.commit()
+    updated = db.execute("SELECT * FROM materials WHERE id = ?", (material_id,)).fetchone()
     db.close()
     result = dict(updated)
     result["available"] = result["quantity"] - result["reserved"]
@@ -0,0 +1,30 @@
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from backend.config import METRICS_ALLOW_LOCAL, METRICS_TOKEN
+from backend.metrics import render_metrics
+
+# Outside /api: scraped by Prometheus, not called by the frontend.
+router = APIRouter(tags=["metrics"])
+
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def _check_access(request: Request) -> None:
+    if not METRICS_TOKEN and not METRICS_ALLOW_LOCAL:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_TOKEN:
+        auth = request.headers.get("Authorization", "")
+        if hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}"):
+            return
+    if METRICS_ALLOW_LOCAL and request.client is not None and request.client.host in LOOPBACK_HOSTS:
+        return
+    raise HTTPException(status_code=403, detail="Доступ к метрикам запрещён")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    _check_access(request)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -4,14 +4,18 @@ from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
 from backend.config import UPLOAD_DIR
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.rollups import record_order_created, record_order_status_change, record_order_transition
+from backend.etags import versioned
+from backend.single_flight import single_flight
 import os
 import uuid
 import mimetypes
 from datetime import datetime
 from urllib.parse import quote
 
-router = APIRouter(prefix="/api/orders", tags=["orders"])
+router = APIRouter(prefix="/api/orders", tags=["orders"], route_class=FastJSONRoute)
 
 # Allowed status transitions: {from_status: [(to_status, allowed_roles), ...]}
 TRANSITIONS = {
@@ -134,6 +138,8 @@ def _serialize_order_row(row) -> dict:
 
 
 @router.get("")
+@versioned("/api/orders", "/api/pricelist")
+@single_flight("/api/orders", per_user_roles=("designer", "master", "assistant"))
 def list_orders(
     status: str = "",
     search: str = "",
@@ -197,6 +203,8 @@ def list_orders(
 
 
 @router.get("/{order_id}")
+@versioned("/api/orders", "/api/pricelist")
+@single_flight("/api/orders")
 def get_order(order_id: int, user=Depends(get_current_user)):
     db = get_db()
     order = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
@@ -212,7 +220,9 @@ def get_order(order_id: int, user=Depends(get_current_user)):
     order["items"] = [dict(i) for i in items]
 
     history = db.execute(
-        "SELECT oh.*, u.full_name FROM order_history oh JOIN users u ON u.id = oh.changed_by WHERE oh.order_id = ? ORDER BY oh.created_at",
+        """SELECT oh.id, oh.order_id, oh.old_status, oh.new_status, oh.changed_by, oh.note, oh.created_at, u.full_name
+           FROM order_history oh JOIN users u ON u.id = oh.changed_by
+           WHERE oh.order_id = ? ORDER BY oh.created_at""",
         (order_id,),
     ).fetchall()
     order["history"] = [dict(h) for h in history]
@@ -346,19 +356,22 @@ def create_order(data: OrderCreate, user=Depends(role_required("manager", "direc
             )
 
     # Order history
-    db.execute(
+    history = db.execute(
         "INSERT INTO order_history (order_id, old_status, new_status, changed_by, note) VALUES (?, NULL, 'created', ?, 'Заказ создан')",
         (order_id, user["id"]),
     )
+    record_order_transition(db, history.lastrowid)
+    record_order_created(db, order_id)
 
-    db.commit()
-    result = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "orders.created",
         channels=["orders", "dashboard", "inventory", "reports"],
         cache_prefixes=["/api/orders", "/api/reports", "/api/inventory"],
         payload={"order_id": order_id, "status": "created"},
     )
+    db.commit()
+    result = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
     db.close()
     return _serialize_order_row(result)
 
@@ -422,10 +435,12 @@ def update_status(order_id: int, data: StatusUpdate, user=Depends(get_current_us
                     )
 
     db.execute("UPDATE orders SET status = ?, updated_at = datetime('now') WHERE id = ?", (new_status, order_id))
-    db.execute(
+    history = db.execute(
         "INSERT INTO order_history (order_id, old_status, new_status, changed_by, note) VALUES (?, ?, ?, ?, ?)",
         (order_id, current, new_status, user["id"], data.note or f"{current} -> {new_status}"),
     )
+    record_order_transition(db, history.lastrowid)
+    record_order_status_change(db, order_id, current, new_status)
 
     if new_status == "ready":
         db.execute(
@@ -433,14 +448,15 @@ def update_status(order_id: int, data: StatusUpdate, user=Depends(get_current_us
             (order_id,),
         )
 
-    db.commit()
-    updated = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "orders.status_changed",
         channels=["orders", "dashboard", "inventory", "reports"],
         cache_prefixes=["/api/orders", "/api/reports", "/api/inventory"],
         payload={"order_id": order_id, "status": new_status, "previous_status": current},
     )
+    db.commit()
+    updated = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
     db.close()
     return _serialize_order_row(updated)
 
@@ -489,13 +505,14 @@ async def upload_design(order_id: int, file: UploadFile = File(...), user=Depend
         f.write(content)
 
     db.execute("UPDATE orders SET design_file = ?, updated_at = datetime('now') WHERE id = ?", (filename, order_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "orders.design_uploaded",
         channels=["orders"],
         cache_prefixes=["/api/orders"],
         payload={"order_id": order_id},
     )
+    db.commit()
     db.close()
     return {"filename": filename}
 
@@ -533,13 +550,14 @@ async def upload_photo(order_id: int, file: UploadFile = File(...), user=Depends
         "UPDATE orders SET photo_file = ?, photo_mime = ?, photo_blob = ?, updated_at = datetime('now') WHERE id = ?",
         (stored_filename, photo_mime, content, order_id),
     )
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "orders.photo_uploaded",
         channels=["orders"],
         cache_prefixes=["/api/orders"],
         payload={"order_id": order_id},
     )
+    db.commit()
     db.close()
     return {
         "filename": stored_filename,
@@ -566,14 +584,15 @@ def update_order(order_id: int, data: dict, user=Depends(role_required("manager"
     set_clause = ", ".join(f"{k} = ?" for k in updates)
     values = list(updates.values()) + [order_id]
     db.execute(f"UPDATE orders SET {set_clause}, updated_at = datetime('now') WHERE id = ?", values)
-    db.commit()
-
-    updated = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "orders.updated",
         channels=["orders", "dashboard"],
         cache_prefixes=["/api/orders", "/api/reports"],
         payload={"order_id": order_id},
     )
+    db.commit()
+
+    updated = db.execute(f"SELECT {_order_select_columns()} FROM orders WHERE id = ?", (order_id,)).fetchone()
     db.close()
     return _serialize_order_row(updated)
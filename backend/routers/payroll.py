@@ -1,10 +1,17 @@
 ﻿from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from backend.database import get_db
+from backend.database import day_key, fan_out_reads, get_db
 from backend.dependencies import role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.routers.hr import _incident_columns
+from backend.response_cache import cached_response
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/payroll", tags=["payroll"])
+router = APIRouter(prefix="/api/payroll", tags=["payroll"], route_class=FastJSONRoute)
+
+# Period reports read staff, attendance, incidents and order history.
+PERIOD_REPORT_SOURCES = ("/api/users", "/api/hr", "/api/orders")
 
 
 class PayrollEntry(BaseModel):
@@ -52,64 +59,52 @@ def list_payroll(month_start: str = "", week_start: str = "", user=Depends(role_
 
 
 def _period_report(period_start: str, period_end: str):
-    db = get_db()
-    employees = db.execute("SELECT * FROM users WHERE is_active = 1 AND role != 'director' ORDER BY full_name").fetchall()
-
-    period_end_ts = period_end + " 23:59:59"
-
-    # Batch: attendance days
-    att_rows = db.execute(
-        "SELECT user_id, COUNT(*) as cnt FROM attendance WHERE date BETWEEN ? AND ? GROUP BY user_id",
-        (period_start, period_end),
-    ).fetchall()
-    att_map = {r["user_id"]: r["cnt"] for r in att_rows}
-
-    # Batch: order_history tasks (design_done for designers)
-    design_rows = db.execute(
-        "SELECT changed_by, COUNT(*) as cnt FROM order_history WHERE new_status = 'design_done' AND created_at BETWEEN ? AND ? GROUP BY changed_by",
-        (period_start, period_end_ts),
-    ).fetchall()
-    design_map = {r["changed_by"]: r["cnt"] for r in design_rows}
-
-    # Batch: order_history tasks (printed/ready for master/assistant)
-    prod_rows = db.execute(
-        "SELECT changed_by, COUNT(*) as cnt FROM order_history WHERE new_status IN ('printed', 'ready') AND created_at BETWEEN ? AND ? GROUP BY changed_by",
-        (period_start, period_end_ts),
-    ).fetchall()
-    prod_map = {r["changed_by"]: r["cnt"] for r in prod_rows}
-
-    # Batch: all order_history tasks (for manager)
-    all_hist_rows = db.execute(
-        "SELECT changed_by, COUNT(*) as cnt FROM order_history WHERE created_at BETWEEN ? AND ? GROUP BY changed_by",
-        (period_start, period_end_ts),
-    ).fetchall()
-    all_hist_map = {r["changed_by"]: r["cnt"] for r in all_hist_rows}
-
-    # Batch: incidents
-    all_incidents = db.execute(
-        "SELECT * FROM incidents WHERE created_at BETWEEN ? AND ?",
-        (period_start, period_end_ts),
-    ).fetchall()
+    try:
+        day_from, day_to = day_key(period_start), day_key(period_end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректная дата")
+
+    # Independent batches, run side by side on separate connections.
+    rows = fan_out_reads({
+        "employees": lambda db: db.execute(
+            "SELECT * FROM users WHERE is_active = 1 AND role != 'director' ORDER BY full_name"
+        ).fetchall(),
+        # Days worked and order transitions from the per-employee daily KPIs.
+        "kpi": lambda db: db.execute(
+            """SELECT user_id, SUM(days_worked) as days_worked, SUM(design_done) as design_done,
+                      SUM(printed + ready) as production, SUM(transitions) as transitions
+               FROM report_daily_employees WHERE day BETWEEN ? AND ? GROUP BY user_id""",
+            (period_start[:10], period_end[:10]),
+        ).fetchall(),
+        "incidents": lambda db: db.execute(
+            f"SELECT {_incident_columns()} FROM incidents WHERE created_day BETWEEN ? AND ? ORDER BY id",
+            (day_from, day_to),
+        ).fetchall(),
+        "payroll": lambda db: db.execute(
+            "SELECT * FROM payroll WHERE week_start = ?",
+            (period_start,),
+        ).fetchall(),
+    })
+
+    employees = rows["employees"]
+    kpi_map = {r["user_id"]: r for r in rows["kpi"]}
     incidents_by_user = {}
-    for i in all_incidents:
+    for i in rows["incidents"]:
         incidents_by_user.setdefault(i["user_id"], []).append(i)
-
-    # Batch: payroll
-    payroll_rows = db.execute(
-        "SELECT * FROM payroll WHERE week_start = ?",
-        (period_start,),
-    ).fetchall()
-    payroll_map = {r["user_id"]: r for r in payroll_rows}
+    payroll_map = {r["user_id"]: r for r in rows["payroll"]}
 
     report = []
     for emp in employees:
         uid = emp["id"]
-        if emp["role"] == "designer":
-            tasks = design_map.get(uid, 0)
+        kpi = kpi_map.get(uid)
+        if not kpi:
+            tasks = 0
+        elif emp["role"] == "designer":
+            tasks = int(kpi["design_done"])
         elif emp["role"] in ("master", "assistant"):
-            tasks = prod_map.get(uid, 0)
+            tasks = int(kpi["production"])
         else:
-            tasks = all_hist_map.get(uid, 0)
+            tasks = int(kpi["transitions"])
 
         user_incidents = incidents_by_user.get(uid, [])
         penalties_total = sum((i["deduction_amount"] or 0) for i in user_incidents)
@@ -117,23 +112,26 @@ def _period_report(period_start: str, period_end: str):
 
         report.append({
             "employee": dict(emp),
-            "days_worked": att_map.get(uid, 0),
+            "days_worked": int(kpi["days_worked"]) if kpi else 0,
             "tasks_done": tasks,
             "incidents": [dict(i) for i in user_incidents],
             "penalties_total": penalties_total,
             "payroll": dict(payroll) if payroll else None,
         })
 
-    db.close()
     return report
 
 
 @router.get("/month-report")
+@cached_response("/api/payroll", depends_on=PERIOD_REPORT_SOURCES)
+@single_flight("/api/payroll")
 def month_report(month_start: str, month_end: str, user=Depends(role_required("director"))):
     return _period_report(month_start, month_end)
 
 
 @router.get("/week-report")
+@cached_response("/api/payroll", depends_on=PERIOD_REPORT_SOURCES)
+@single_flight("/api/payroll")
 def week_report(week_start: str, week_end: str, user=Depends(role_required("director"))):
     # Backward compatibility route.
     return _period_report(week_start, week_end)
@@ -169,14 +167,15 @@ def save_payroll(data: PayrollEntry, user=Depends(role_required("director"))):
         )
         payroll_id = cur.lastrowid
 
-    db.commit()
-    row = db.execute("SELECT * FROM payroll WHERE id = ?", (payroll_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "payroll.updated",
         channels=["payroll", "reports"],
         cache_prefixes=["/api/payroll", "/api/reports"],
         payload={"payroll_id": payroll_id, "user_id": data.user_id},
     )
+    db.commit()
+    row = db.execute("SELECT * FROM payroll WHERE id = ?", (payroll_id,)).fetchone()
     db.close()
     return dict(row)
 
@@ -189,13 +188,14 @@ def mark_paid(payroll_id: int, user=Depends(role_required("director"))):
         db.close()
         raise HTTPException(status_code=404, detail="Запись не найдена")
     db.execute("UPDATE payroll SET is_paid = 1, paid_at = datetime('now') WHERE id = ?", (payroll_id,))
-    db.commit()
-    updated = db.execute("SELECT * FROM payroll WHERE id = ?", (payroll_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "payroll.updated",
         channels=["payroll", "reports"],
         cache_prefixes=["/api/payroll", "/api/reports"],
-        payload={"payroll_id": payroll_id, "user_id": updated["user_id"], "is_paid": True},
+        payload={"payroll_id": payroll_id, "user_id": row["user_id"], "is_paid": True},
     )
+    db.commit()
+    updated = db.execute("SELECT * FROM payroll WHERE id = ?", (payroll_id,)).fetchone()
     db.close()
     return dict(updated)
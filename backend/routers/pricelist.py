@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
 
-router = APIRouter(prefix="/api/pricelist", tags=["pricelist"])
+router = APIRouter(prefix="/api/pricelist", tags=["pricelist"], route_class=FastJSONRoute)
 
 
 class PriceUpdate(BaseModel):
@@ -49,14 +50,15 @@ def update_price(service_id: int, data: PriceUpdate, user=Depends(role_required(
     set_clause = ", ".join(f"{k} = ?" for k in update_fields)
     values = list(update_fields.values()) + [service_id]
     db.execute(f"UPDATE services SET {set_clause}, updated_at = datetime('now') WHERE id = ?", values)
-    db.commit()
-
-    updated = db.execute("SELECT * FROM services WHERE id = ?", (service_id,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "pricelist.updated",
         channels=["pricelist"],
         cache_prefixes=["/api/pricelist"],
         payload={"service_id": service_id},
     )
+    db.commit()
+
+    updated = db.execute("SELECT * FROM services WHERE id = ?", (service_id,)).fetchone()
     db.close()
     return dict(updated)
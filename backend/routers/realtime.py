@@ -1,42 +1,62 @@
 import asyncio
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
-from backend.dependencies import get_current_user
-from backend.realtime import encode_sse, event_matches_user, subscribe, unsubscribe
+from backend.dependencies import get_current_user, get_user_by_token, role_required
+from backend.fast_json import FastJSONRoute
+from backend.realtime import (
+    PING_KIND,
+    RESYNC_KIND,
+    encode_compact,
+    encode_compact_hello,
+    encode_sse,
+    get_subscription,
+    parse_channels,
+    realtime_stats,
+    subscribe,
+    unsubscribe,
+)
 
-router = APIRouter(prefix="/api/realtime", tags=["realtime"])
+router = APIRouter(prefix="/api/realtime", tags=["realtime"], route_class=FastJSONRoute)
+
+
+class ChannelsUpdate(BaseModel):
+    channels: list[str] = []
 
 
 @router.get("/stream")
-async def stream_realtime(request: Request):
+async def stream_realtime(request: Request, channels: str = ""):
     user = get_current_user(request)
-    queue = subscribe()
+    sub = subscribe(user, parse_channels(channels))
 
     async def event_stream():
         try:
             yield encode_sse("hello", {
                 "user_id": user["id"],
                 "role": user["role"],
+                "subscription_id": sub.id,
+                "channels": sorted(sub.channels) if sub.channels is not None else None,
             })
 
+            # Disconnects surface as a cancelled or failed send (pings come from
+            # the shared heartbeat), so the loop only waits on the queue.
             while True:
-                if await request.is_disconnected():
+                event = await sub.get()
+                if event is None:
+                    # Dropped by the overflow policy: end the response so the client reconnects.
                     break
-
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=15)
-                except TimeoutError:
+                if event["kind"] == PING_KIND:
                     yield ": ping\n\n"
                     continue
-
-                if not event_matches_user(event, user):
+                if event["kind"] == RESYNC_KIND:
+                    yield encode_sse("resync", event)
                     continue
 
                 yield encode_sse("update", event)
         finally:
-            unsubscribe(queue)
+            unsubscribe(sub)
 
     return StreamingResponse(
         event_stream(),
@@ -47,3 +67,70 @@ async def stream_realtime(request: Request):
             "X-Accel-Buffering": "no",
         },
     )
+
+
+@router.websocket("/ws")
+async def websocket_realtime(websocket: WebSocket):
+    """Same broker as /stream, compact frames (see encode_compact).
+
+    Browsers cannot set headers on a WebSocket, so the first client message
+    carries the token: {"token": "...", "channels": ["orders"]}. Later messages
+    {"channels": [...]} replace the subscription. permessage-deflate is
+    negotiated by uvicorn's websockets implementation.
+    """
+    await websocket.accept()
+    try:
+        auth = await asyncio.wait_for(websocket.receive_json(), timeout=10)
+        user = get_user_by_token(str(auth.get("token") or ""))
+    except (asyncio.TimeoutError, HTTPException, ValueError, AttributeError):
+        await websocket.close(code=4401)
+        return
+    except WebSocketDisconnect:
+        return
+
+    sub = subscribe(user, parse_channels(auth.get("channels")), transport="ws")
+
+    async def send_events():
+        while True:
+            event = await sub.get()
+            if event is None:
+                # Dropped by the overflow policy: close so the client reconnects.
+                await websocket.close(code=4000)
+                return
+            await websocket.send_text(encode_compact(event))
+
+    async def receive_updates():
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and "channels" in message:
+                sub.channels = parse_channels(message["channels"])
+
+    tasks = []
+    try:
+        await websocket.send_text(encode_compact_hello(sub))
+        tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_updates())]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        unsubscribe(sub)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.put("/subscriptions/{subscription_id}")
+def update_subscription(subscription_id: str, data: ChannelsUpdate, user=Depends(get_current_user)):
+    sub = get_subscription(subscription_id)
+    if not sub or sub.user["id"] != user["id"]:
+        raise HTTPException(status_code=404, detail="Подписка не найдена")
+    sub.channels = parse_channels(data.channels)
+    return {
+        "subscription_id": sub.id,
+        "channels": sorted(sub.channels) if sub.channels is not None else None,
+    }
+
+
+@router.get("/stats")
+def get_realtime_stats(user=Depends(role_required("director"))):
+    return realtime_stats()
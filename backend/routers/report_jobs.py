@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from backend.dependencies import get_current_user
+from backend.fast_json import FastJSONRoute
+from backend.report_jobs import get_job, job_dict, submit_job
+from backend.routers.payroll import PERIOD_REPORT_SOURCES, _period_report
+from backend.routers.reports import (
+    REPORT_SOURCES,
+    _build_finance_data,
+    _employee_stats_data,
+    _material_usage_data,
+    _orders_summary_data,
+)
+
+router = APIRouter(prefix="/api/reports/jobs", tags=["reports"], route_class=FastJSONRoute)
+
+# kind: (builder, roles allowed to request and read it, cache prefixes it reads)
+REPORT_KINDS = {
+    "finance": (_build_finance_data, ("director",), ("/api/reports",) + REPORT_SOURCES),
+    "orders-summary": (_orders_summary_data, ("director", "manager"), ("/api/reports",) + REPORT_SOURCES),
+    "material-usage": (_material_usage_data, ("director", "manager"), ("/api/reports",) + REPORT_SOURCES),
+    "employee-stats": (_employee_stats_data, ("director",), ("/api/reports",) + REPORT_SOURCES),
+    "payroll-period": (
+        lambda date_from, date_to: _period_report(date_from, date_to),
+        ("director",),
+        ("/api/payroll",) + PERIOD_REPORT_SOURCES,
+    ),
+}
+
+
+class ReportJobCreate(BaseModel):
+    kind: str
+    date_from: str = ""
+    date_to: str = ""
+
+
+def _kind_for_user(kind: str, user: dict):
+    spec = REPORT_KINDS.get(kind)
+    if not spec:
+        raise HTTPException(status_code=400, detail=f"Неизвестный отчёт: {kind}")
+    if user["role"] not in spec[1]:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    return spec
+
+
+def _job_for_user(job_id: str, user: dict):
+    row = get_job(job_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    _kind_for_user(row["kind"], user)
+    return row
+
+
+@router.post("")
+def create_report_job(data: ReportJobCreate, user=Depends(get_current_user)):
+    build, roles, depends_on = _kind_for_user(data.kind, user)
+    if data.kind == "payroll-period" and not (data.date_from and data.date_to):
+        raise HTTPException(status_code=400, detail="Укажите период")
+    params = {"date_from": data.date_from, "date_to": data.date_to}
+    return submit_job(data.kind, params, user, build, depends_on=depends_on, roles=roles)
+
+
+@router.get("/{job_id}")
+def get_report_job(job_id: str, user=Depends(get_current_user)):
+    return job_dict(_job_for_user(job_id, user))
+
+
+@router.get("/{job_id}/result")
+def get_report_job_result(job_id: str, user=Depends(get_current_user)):
+    row = _job_for_user(job_id, user)
+    if row["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Отчёт не построен: {row['error']}")
+    if row["status"] != "done":
+        raise HTTPException(status_code=409, detail="Отчёт ещё формируется")
+    return Response(row["result"], media_type="application/json")
@@ -1,47 +1,49 @@
 ﻿import csv
 import io
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from backend.database import get_db
+from backend import analytics
+from backend.config import REPORT_MAX_STALE_SECONDS
+from backend.database import day_range, fan_out_reads, get_db, stream_rows
 from backend.dependencies import role_required
+from backend.fast_json import FastJSONRoute
+from backend.response_cache import cached_response
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/reports", tags=["reports"])
+router = APIRouter(prefix="/api/reports", tags=["reports"], route_class=FastJSONRoute)
 
+# Everything the report queries read: orders, ledger, incidents, payroll, staff, services.
+REPORT_SOURCES = ("/api/orders", "/api/inventory", "/api/hr", "/api/payroll", "/api/users", "/api/pricelist")
 
-def _build_finance_data(db, date_from: str = "", date_to: str = ""):
-    conditions = ["status != 'cancelled'"]
+
+def _day_filter(date_from: str = "", date_to: str = "", column: str = "day"):
+    """Conditions on a rollup `day` column ('YYYY-MM-DD'), both ends inclusive."""
+    conditions = []
     params = []
     if date_from:
-        conditions.append("created_at >= ?")
-        params.append(date_from)
+        conditions.append(f"{column} >= ?")
+        params.append(date_from[:10])
     if date_to:
-        conditions.append("created_at <= ?")
-        params.append(date_to + " 23:59:59")
-    where = " AND ".join(conditions)
+        conditions.append(f"{column} <= ?")
+        params.append(date_to[:10])
+    return conditions, params
 
-    totals = db.execute(
-        f"""SELECT
-            COUNT(*) as orders_count,
-            COALESCE(SUM(total_price), 0) as revenue,
-            COALESCE(SUM(material_cost), 0) as material_cost
-            FROM orders WHERE {where}""",
-        params,
-    ).fetchone()
 
-    pen_conditions = ["1=1"]
-    pen_params = []
-    if date_from:
-        pen_conditions.append("created_at >= ?")
-        pen_params.append(date_from)
-    if date_to:
-        pen_conditions.append("created_at <= ?")
-        pen_params.append(date_to + " 23:59:59")
-    pen_where = " AND ".join(pen_conditions)
+def _day_key_filter(column: str, date_from: str = "", date_to: str = ""):
+    """Conditions on an integer created_day/done_day column (YYYYMMDD), both ends inclusive."""
+    try:
+        return day_range(column, date_from, date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректная дата")
 
-    penalties = db.execute(
-        f"SELECT COALESCE(SUM(deduction_amount), 0) as total_penalties FROM incidents WHERE {pen_where} AND deduction_amount > 0",
-        pen_params,
-    ).fetchone()
+
+def _finance_queries(date_from: str = "", date_to: str = ""):
+    # Orders, penalties and services come from the report_daily_* rollups
+    # (see backend/rollups.py): a year is ~365 rows instead of every order.
+    day_conditions, params = _day_filter(date_from, date_to)
+    where = " AND ".join(["status != 'cancelled'"] + day_conditions)
+    pen_where = " AND ".join(["1=1"] + day_conditions)
+    svc_where = " AND ".join(["1=1"] + _day_filter(date_from, date_to, "r.day")[0])
 
     pay_conditions = ["1=1"]
     pay_params = []
@@ -53,35 +55,55 @@ def _build_finance_data(db, date_from: str = "", date_to: str = ""):
         pay_params.append(date_to)
     pay_where = " AND ".join(pay_conditions)
 
-    payroll_total = db.execute(
-        f"SELECT COALESCE(SUM(total), 0) as total_payroll FROM payroll WHERE {pay_where}",
-        pay_params,
-    ).fetchone()
+    return {
+        "totals": lambda db: db.execute(
+            f"""SELECT
+                COALESCE(SUM(orders_count), 0) as orders_count,
+                COALESCE(SUM(revenue), 0) as revenue,
+                COALESCE(SUM(material_cost), 0) as material_cost
+                FROM report_daily_orders WHERE {where}""",
+            params,
+        ).fetchone(),
+        "penalties": lambda db: db.execute(
+            f"SELECT COALESCE(SUM(penalties_total), 0) as total_penalties FROM report_daily_penalties WHERE {pen_where}",
+            params,
+        ).fetchone(),
+        "payroll": lambda db: db.execute(
+            f"SELECT COALESCE(SUM(total), 0) as total_payroll FROM payroll WHERE {pay_where}",
+            pay_params,
+        ).fetchone(),
+        "daily": lambda db: db.execute(
+            f"""SELECT day,
+                SUM(orders_count) as orders_count,
+                SUM(revenue) as revenue,
+                SUM(material_cost) as cost
+                FROM report_daily_orders WHERE {where}
+                GROUP BY day
+                HAVING SUM(orders_count) > 0
+                ORDER BY day DESC
+                LIMIT 31""",
+            params,
+        ).fetchall(),
+        "top_services": lambda db: db.execute(
+            f"""SELECT s.name_ru, SUM(r.items_count) as order_count, SUM(r.revenue) as revenue
+                FROM report_daily_services r
+                JOIN services s ON s.id = r.service_id
+                WHERE {svc_where}
+                GROUP BY s.id, s.name_ru
+                HAVING SUM(r.items_count) > 0
+                ORDER BY revenue DESC
+                LIMIT 5""",
+            params,
+        ).fetchall(),
+    }
 
-    daily = db.execute(
-        f"""SELECT date(created_at) as day,
-            COUNT(*) as orders_count,
-            COALESCE(SUM(total_price), 0) as revenue,
-            COALESCE(SUM(material_cost), 0) as cost
-            FROM orders WHERE {where}
-            GROUP BY date(created_at)
-            ORDER BY day DESC
-            LIMIT 31""",
-        params,
-    ).fetchall()
 
-    top_services = db.execute(
-        f"""SELECT s.name_ru, COUNT(oi.id) as order_count, COALESCE(SUM(oi.total), 0) as revenue
-            FROM order_items oi
-            JOIN orders o ON o.id = oi.order_id
-            JOIN services s ON s.id = oi.service_id
-            WHERE o.status != 'cancelled'
-            {'AND o.created_at >= ?' if date_from else ''} {'AND o.created_at <= ?' if date_to else ''}
-            GROUP BY s.id, s.name_ru
-            ORDER BY revenue DESC
-            LIMIT 5""",
-        ([date_from] if date_from else []) + ([date_to + " 23:59:59"] if date_to else []),
-    ).fetchall()
+def _finance_result(rows: dict):
+    totals = rows["totals"]
+    penalties = rows["penalties"]
+    payroll_total = rows["payroll"]
+    daily = rows["daily"]
+    top_services = rows["top_services"]
 
     revenue = totals["revenue"]
     material_cost = totals["material_cost"]
@@ -101,30 +123,44 @@ def _build_finance_data(db, date_from: str = "", date_to: str = ""):
     }
 
 
-@router.get("/orders-summary")
-def orders_summary(date_from: str = "", date_to: str = "", user=Depends(role_required("director", "manager"))):
+def _build_finance_data(date_from: str = "", date_to: str = ""):
+    # The five queries are independent: run them side by side.
+    return _finance_result(fan_out_reads(_finance_queries(date_from, date_to)))
+
+
+def _finance_data_on(db, date_from: str = "", date_to: str = ""):
+    """Finance report on the caller's connection, one query after another (for fan_out_reads jobs)."""
+    return _finance_result({name: query(db) for name, query in _finance_queries(date_from, date_to).items()})
+
+
+def _orders_summary_data(date_from: str = "", date_to: str = ""):
     db = get_db()
-    conditions = ["1=1"]
-    params = []
-    if date_from:
-        conditions.append("created_at >= ?")
-        params.append(date_from)
-    if date_to:
-        conditions.append("created_at <= ?")
-        params.append(date_to + " 23:59:59")
-    where = " AND ".join(conditions)
+    try:
+        return _orders_summary_on(db, date_from, date_to)
+    finally:
+        db.close()
+
+
+def _orders_summary_on(db, date_from: str = "", date_to: str = ""):
+    day_conditions, params = _day_filter(date_from, date_to)
+    where = " AND ".join(["1=1"] + day_conditions)
 
     by_status = db.execute(
-        f"SELECT status, COUNT(*) as count, COALESCE(SUM(total_price), 0) as revenue FROM orders WHERE {where} GROUP BY status",
+        f"""SELECT status, SUM(orders_count) as count, SUM(revenue) as revenue
+            FROM report_daily_orders WHERE {where}
+            GROUP BY status
+            HAVING SUM(orders_count) > 0""",
         params,
     ).fetchall()
 
     totals = db.execute(
-        f"SELECT COUNT(*) as total_orders, COALESCE(SUM(total_price), 0) as total_revenue, COALESCE(SUM(material_cost), 0) as total_cost FROM orders WHERE {where} AND status != 'cancelled'",
+        f"""SELECT COALESCE(SUM(orders_count), 0) as total_orders,
+            COALESCE(SUM(revenue), 0) as total_revenue,
+            COALESCE(SUM(material_cost), 0) as total_cost
+            FROM report_daily_orders WHERE {where} AND status != 'cancelled'""",
         params,
     ).fetchone()
 
-    db.close()
     return {
         "by_status": [dict(r) for r in by_status],
         "totals": dict(totals),
@@ -132,18 +168,17 @@ def orders_summary(date_from: str = "", date_to: str = "", user=Depends(role_req
     }
 
 
-@router.get("/material-usage")
-def material_usage(date_from: str = "", date_to: str = "", user=Depends(role_required("director", "manager"))):
+@router.get("/orders-summary")
+@cached_response("/api/reports", depends_on=REPORT_SOURCES, max_stale=REPORT_MAX_STALE_SECONDS)
+@single_flight("/api/reports")
+def orders_summary(date_from: str = "", date_to: str = "", user=Depends(role_required("director", "manager"))):
+    return _orders_summary_data(date_from, date_to)
+
+
+def _material_usage_data(date_from: str = "", date_to: str = ""):
     db = get_db()
-    conditions = ["ml.action = 'consume'"]
-    params = []
-    if date_from:
-        conditions.append("ml.created_at >= ?")
-        params.append(date_from)
-    if date_to:
-        conditions.append("ml.created_at <= ?")
-        params.append(date_to + " 23:59:59")
-    where = " AND ".join(conditions)
+    day_conditions, params = _day_key_filter("ml.created_day", date_from, date_to)
+    where = " AND ".join(["ml.action = 'consume'"] + day_conditions)
 
     rows = db.execute(
         f"""SELECT m.name_ru, m.unit, COALESCE(SUM(ABS(ml.quantity)), 0) as used
@@ -157,80 +192,62 @@ def material_usage(date_from: str = "", date_to: str = "", user=Depends(role_req
     return [dict(r) for r in rows]
 
 
-@router.get("/employee-stats")
-def employee_stats(date_from: str = "", date_to: str = "", user=Depends(role_required("director"))):
-    db = get_db()
-    employees = db.execute("SELECT id, full_name, role FROM users WHERE is_active = 1 ORDER BY full_name").fetchall()
-
-    conditions_time = []
-    params_base = []
-    if date_from:
-        conditions_time.append("date >= ?")
-        params_base.append(date_from)
-    if date_to:
-        conditions_time.append("date <= ?")
-        params_base.append(date_to)
-    time_where = " AND ".join(conditions_time) if conditions_time else "1=1"
-
-    conditions_hist = []
-    params_hist = []
-    if date_from:
-        conditions_hist.append("created_at >= ?")
-        params_hist.append(date_from)
-    if date_to:
-        conditions_hist.append("created_at <= ?")
-        params_hist.append(date_to + " 23:59:59")
-    hist_where = " AND ".join(conditions_hist) if conditions_hist else "1=1"
-
-    # Batch: attendance days per user
-    att_rows = db.execute(
-        f"SELECT user_id, COUNT(*) as cnt FROM attendance WHERE {time_where} GROUP BY user_id",
-        params_base,
-    ).fetchall()
-    att_map = {r["user_id"]: r["cnt"] for r in att_rows}
-
-    # Batch: order_history tasks per user
-    hist_rows = db.execute(
-        f"SELECT changed_by, COUNT(*) as cnt FROM order_history WHERE {hist_where} GROUP BY changed_by",
-        params_hist,
-    ).fetchall()
-    hist_map = {r["changed_by"]: r["cnt"] for r in hist_rows}
-
-    # Batch: incidents per user
-    inc_rows = db.execute(
-        f"SELECT user_id, COUNT(*) as cnt FROM incidents WHERE {hist_where} GROUP BY user_id",
-        params_hist,
-    ).fetchall()
-    inc_map = {r["user_id"]: r["cnt"] for r in inc_rows}
+@router.get("/material-usage")
+@cached_response("/api/reports", depends_on=REPORT_SOURCES, max_stale=REPORT_MAX_STALE_SECONDS)
+@single_flight("/api/reports")
+def material_usage(date_from: str = "", date_to: str = "", user=Depends(role_required("director", "manager"))):
+    return _material_usage_data(date_from, date_to)
+
+
+def _employee_stats_data(date_from: str = "", date_to: str = ""):
+    # Per-employee daily KPIs (report_daily_employees, see backend/rollups.py):
+    # one range sum instead of counting attendance, history and incidents.
+    day_conditions, params = _day_filter(date_from, date_to)
+    where = " AND ".join(["1=1"] + day_conditions)
+    rows = fan_out_reads({
+        "employees": lambda db: db.execute(
+            "SELECT id, full_name, role FROM users WHERE is_active = 1 ORDER BY full_name"
+        ).fetchall(),
+        "kpi": lambda db: db.execute(
+            f"""SELECT user_id, SUM(days_worked) as days_worked, SUM(transitions) as tasks_done,
+                       SUM(incidents_count) as incidents
+                FROM report_daily_employees WHERE {where} GROUP BY user_id""",
+            params,
+        ).fetchall(),
+    })
+    kpi_map = {r["user_id"]: r for r in rows["kpi"]}
 
     result = []
-    for emp in employees:
+    for emp in rows["employees"]:
+        kpi = kpi_map.get(emp["id"])
         result.append({
             "id": emp["id"],
             "full_name": emp["full_name"],
             "role": emp["role"],
-            "days_worked": att_map.get(emp["id"], 0),
-            "tasks_done": hist_map.get(emp["id"], 0),
-            "incidents": inc_map.get(emp["id"], 0),
+            "days_worked": int(kpi["days_worked"]) if kpi else 0,
+            "tasks_done": int(kpi["tasks_done"]) if kpi else 0,
+            "incidents": int(kpi["incidents"]) if kpi else 0,
         })
-
-    db.close()
     return result
 
 
+@router.get("/employee-stats")
+@cached_response("/api/reports", depends_on=REPORT_SOURCES, max_stale=REPORT_MAX_STALE_SECONDS)
+@single_flight("/api/reports")
+def employee_stats(date_from: str = "", date_to: str = "", user=Depends(role_required("director"))):
+    return _employee_stats_data(date_from, date_to)
+
+
 @router.get("/finance")
+@cached_response("/api/reports", depends_on=REPORT_SOURCES, max_stale=REPORT_MAX_STALE_SECONDS)
+@single_flight("/api/reports")
 def finance_report(date_from: str = "", date_to: str = "", user=Depends(role_required("director"))):
-    db = get_db()
-    data = _build_finance_data(db, date_from, date_to)
-    db.close()
-    return data
+    return _build_finance_data(date_from, date_to)
 
 
 @router.get("/finance-export.csv")
 def finance_export_csv(date_from: str = "", date_to: str = "", user=Depends(role_required("director"))):
-    db = get_db()
-    data = _build_finance_data(db, date_from, date_to)
-    db.close()
+    data = _build_finance_data(date_from, date_to)
 
     output = io.StringIO()
     writer = csv.writer(output, delimiter=';')
@@ -268,3 +285,89 @@ def finance_export_csv(date_from: str = "", date_to: str = "", user=Depends(role
         media_type="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
+
+
+ORDER_LINES_HEADER = [
+    "Заказ", "Дата", "Статус", "Клиент", "Телефон", "Тип клиента", "Менеджер",
+    "Услуга", "Материал", "Кол-во", "Ширина", "Высота", "Цена", "Сумма позиции",
+    "Расход материала", "Сумма заказа", "Себестоимость заказа",
+]
+
+
+@router.get("/orders-export.csv")
+def orders_export_csv(date_from: str = "", date_to: str = "", user=Depends(role_required("director"))):
+    """Every order line (one row per item) for the period, streamed in chunks."""
+    conditions, params = _day_key_filter("o.created_day", date_from, date_to)
+    where = " AND ".join(["1=1"] + conditions)
+
+    query = f"""SELECT o.order_number, o.created_at, o.status, o.client_name, o.client_phone, o.client_type,
+               u.full_name, s.name_ru, m.name_ru, oi.quantity, oi.width, oi.height, oi.unit_price, oi.total,
+               oi.material_qty, o.total_price, o.material_cost
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        LEFT JOIN services s ON s.id = oi.service_id
+        LEFT JOIN materials m ON m.id = oi.material_id
+        LEFT JOIN users u ON u.id = o.created_by
+        WHERE {where}
+        ORDER BY o.id, oi.id"""
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        chunks = stream_rows(query, params)
+        next(chunks)  # column names, replaced by the Russian header
+        writer.writerow(ORDER_LINES_HEADER)
+        yield buffer.getvalue().encode("utf-8-sig")
+        for chunk in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode("utf-8")
+
+    filename = f"orders_{date_from or 'all'}_{date_to or 'all'}.csv"
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@router.get("/breakdown")
+@single_flight("/api/reports")
+def orders_breakdown(
+    group_by: str = "day",
+    date_from: str = "",
+    date_to: str = "",
+    status: str = "",
+    service_ids: str = "",
+    client_type: str = "",
+    user=Depends(role_required("director", "manager")),
+):
+    """Ad-hoc breakdown of orders from the in-memory columnar snapshot (backend/analytics.py)."""
+    statuses = [s for s in status.split(",") if s]
+    try:
+        services = [int(s) for s in service_ids.split(",") if s]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный список услуг")
+    if group_by not in analytics.GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"Группировка должна быть одной из: {', '.join(analytics.GROUP_BY)}")
+    if any(s not in analytics.ORDER_STATUSES for s in statuses):
+        raise HTTPException(status_code=400, detail="Неизвестный статус заказа")
+    if client_type and client_type not in analytics.CLIENT_TYPES:
+        raise HTTPException(status_code=400, detail="Неизвестный тип клиента")
+    _day_key_filter("created_day", date_from, date_to)  # 400 on a malformed date
+    if analytics.np is None:
+        raise HTTPException(status_code=503, detail="Аналитика недоступна: не установлен пакет numpy")
+
+    rows = analytics.breakdown(group_by, date_from, date_to, statuses, services, client_type)
+    if group_by in ("service", "manager") and rows:
+        table, column = ("services", "name_ru") if group_by == "service" else ("users", "full_name")
+        db = get_db()
+        names = {
+            r["id"]: r["name"]
+            for r in db.execute(f"SELECT id, {column} AS name FROM {table}").fetchall()
+        }
+        db.close()
+        for row in rows:
+            row["name"] = names.get(row["key"], "")
+    return {"group_by": group_by, "rows": rows}
@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+router = APIRouter(prefix="/api/tasks", tags=["tasks"], route_class=FastJSONRoute)
 
 
 class TaskCreate(BaseModel):
@@ -15,9 +18,16 @@ class TaskCreate(BaseModel):
     due_date: str = None
 
 
-@router.get("")
-def list_tasks(type: str = "", assigned_to: int = 0, done: str = "", user=Depends(get_current_user)):
-    db = get_db()
+def _task_columns(alias: str = "") -> str:
+    # Listed, not *: the generated done_day index column is not part of the API.
+    p = f"{alias}." if alias else ""
+    return (
+        f"{p}id, {p}title, {p}description, {p}type, {p}assigned_to, {p}assigned_by, "
+        f"{p}due_date, {p}is_done, {p}done_at, {p}created_at"
+    )
+
+
+def _task_rows(db, user, type: str = "", assigned_to: int = 0, done: str = "") -> list[dict]:
     conditions = ["1=1"]
     params = []
 
@@ -40,7 +50,7 @@ def list_tasks(type: str = "", assigned_to: int = 0, done: str = "", user=Depend
 
     where = " AND ".join(conditions)
     rows = db.execute(
-        f"""SELECT t.*, u.full_name as assigned_name, c.full_name as assigned_by_name
+        f"""SELECT {_task_columns('t')}, u.full_name as assigned_name, c.full_name as assigned_by_name
             FROM tasks t
             JOIN users u ON u.id = t.assigned_to
             JOIN users c ON c.id = t.assigned_by
@@ -49,10 +59,19 @@ def list_tasks(type: str = "", assigned_to: int = 0, done: str = "", user=Depend
             LIMIT 100""",
         params,
     ).fetchall()
-    db.close()
     return [dict(r) for r in rows]
 
 
+@router.get("")
+@versioned("/api/tasks")
+@single_flight("/api/tasks", per_user_roles=("designer", "master", "assistant"))
+def list_tasks(type: str = "", assigned_to: int = 0, done: str = "", user=Depends(get_current_user)):
+    db = get_db()
+    rows = _task_rows(db, user, type, assigned_to, done)
+    db.close()
+    return rows
+
+
 @router.post("")
 def create_task(data: TaskCreate, user=Depends(role_required("director", "manager"))):
     if data.type not in ("daily", "weekly"):
@@ -67,19 +86,20 @@ def create_task(data: TaskCreate, user=Depends(role_required("director", "manage
         "INSERT INTO tasks (title, description, type, assigned_to, assigned_by, due_date) VALUES (?, ?, ?, ?, ?, ?)",
         (data.title, data.description, data.type, data.assigned_to, user["id"], data.due_date),
     )
+    enqueue_event(
+        db,
+        "tasks.created",
+        channels=["tasks", "dashboard", "work-journal"],
+        cache_prefixes=["/api/tasks", "/api/work-journal"],
+        payload={"task_id": cur.lastrowid, "assigned_to": data.assigned_to},
+    )
     db.commit()
     row = db.execute(
-        """SELECT t.*, u.full_name as assigned_name, c.full_name as assigned_by_name
+        f"""SELECT {_task_columns('t')}, u.full_name as assigned_name, c.full_name as assigned_by_name
            FROM tasks t JOIN users u ON u.id = t.assigned_to JOIN users c ON c.id = t.assigned_by
            WHERE t.id = ?""",
         (cur.lastrowid,),
     ).fetchone()
-    publish_event(
-        "tasks.created",
-        channels=["tasks", "dashboard", "work-journal"],
-        cache_prefixes=["/api/tasks", "/api/work-journal"],
-        payload={"task_id": cur.lastrowid, "assigned_to": data.assigned_to},
-    )
     db.close()
     return dict(row)
 
@@ -87,7 +107,7 @@ def create_task(data: TaskCreate, user=Depends(role_required("director", "manage
 @router.patch("/{task_id}/done")
 def toggle_task(task_id: int, user=Depends(get_current_user)):
     db = get_db()
-    task = db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    task = db.execute("SELECT id, assigned_to, is_done FROM tasks WHERE id = ?", (task_id,)).fetchone()
     if not task:
         db.close()
         raise HTTPException(status_code=404, detail="Задача не найдена")
@@ -100,13 +120,14 @@ def toggle_task(task_id: int, user=Depends(get_current_user)):
     new_done = 0 if task["is_done"] else 1
     done_at = "datetime('now')" if new_done else "NULL"
     db.execute(f"UPDATE tasks SET is_done = ?, done_at = {done_at} WHERE id = ?", (new_done, task_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "tasks.updated",
         channels=["tasks", "dashboard", "work-journal"],
         cache_prefixes=["/api/tasks", "/api/work-journal"],
         payload={"task_id": task_id, "is_done": new_done, "assigned_to": task["assigned_to"]},
     )
+    db.commit()
     db.close()
     return {"id": task_id, "is_done": new_done}
 
@@ -116,12 +137,13 @@ def delete_task(task_id: int, user=Depends(role_required("director", "manager"))
     db = get_db()
     task = db.execute("SELECT id, assigned_to FROM tasks WHERE id = ?", (task_id,)).fetchone()
     db.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "tasks.deleted",
         channels=["tasks", "dashboard", "work-journal"],
         cache_prefixes=["/api/tasks", "/api/work-journal"],
         payload={"task_id": task_id, "assigned_to": task["assigned_to"] if task else None},
     )
+    db.commit()
     db.close()
     return {"ok": True}
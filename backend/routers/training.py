@@ -4,10 +4,14 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pydantic import BaseModel
 from backend.database import get_db
 from backend.dependencies import get_current_user, role_required
-from backend.config import UPLOAD_DIR
-from backend.realtime import publish_event
+from backend.config import ALLOWED_ROLES, UPLOAD_DIR
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.response_cache import cached_response
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/training", tags=["training"])
+router = APIRouter(prefix="/api/training", tags=["training"], route_class=FastJSONRoute)
 
 
 class TrainingCreate(BaseModel):
@@ -21,6 +25,8 @@ class TrainingCreate(BaseModel):
 
 
 @router.get("")
+@versioned("/api/training")
+@single_flight("/api/training", per_user_roles=ALLOWED_ROLES)
 def list_training(user=Depends(get_current_user)):
     db = get_db()
     rows = db.execute(
@@ -53,14 +59,15 @@ def create_training(data: TrainingCreate, user=Depends(role_required("director")
            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
         (data.title, data.description, youtube_url, photo_url, data.role_target, data.assigned_to, user["id"], int(data.is_required)),
     )
-    db.commit()
-    row = db.execute("SELECT * FROM training WHERE id = ?", (cur.lastrowid,)).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "training.created",
         channels=["training"],
         cache_prefixes=["/api/training"],
         payload={"training_id": cur.lastrowid},
     )
+    db.commit()
+    row = db.execute("SELECT * FROM training WHERE id = ?", (cur.lastrowid,)).fetchone()
     db.close()
     return dict(row)
 
@@ -85,14 +92,15 @@ def mark_watched(training_id: int, user=Depends(get_current_user)):
             (training_id, user["id"]),
         )
 
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "training.updated",
         channels=["training"],
         cache_prefixes=["/api/training"],
         payload={"training_id": training_id},
         user_ids=[user["id"]],
     )
+    db.commit()
     db.close()
     return {"ok": True}
 
@@ -102,13 +110,14 @@ def delete_training(training_id: int, user=Depends(role_required("director"))):
     db = get_db()
     db.execute("DELETE FROM training_progress WHERE training_id = ?", (training_id,))
     db.execute("DELETE FROM training WHERE id = ?", (training_id,))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "training.deleted",
         channels=["training"],
         cache_prefixes=["/api/training"],
         payload={"training_id": training_id},
     )
+    db.commit()
     db.close()
     return {"ok": True}
 
@@ -130,18 +139,21 @@ async def upload_training_photo(training_id: int, file: UploadFile = File(...),
         f.write(content)
 
     db.execute("UPDATE training SET photo_file = ? WHERE id = ?", (filename, training_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "training.updated",
         channels=["training"],
         cache_prefixes=["/api/training"],
         payload={"training_id": training_id, "photo_file": filename},
     )
+    db.commit()
     db.close()
     return {"filename": filename}
 
 
 @router.get("/progress")
+@cached_response("/api/training", depends_on=("/api/users",))
+@single_flight("/api/training")
 def training_progress(user=Depends(role_required("director", "manager"))):
     """Get training progress for all employees."""
     db = get_db()
@@ -4,9 +4,12 @@ from backend.database import get_db
 from backend.auth import hash_password
 from backend.dependencies import role_required, get_current_user
 from backend.config import ALLOWED_ROLES
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(prefix="/api/users", tags=["users"])
+router = APIRouter(prefix="/api/users", tags=["users"], route_class=FastJSONRoute)
 
 
 class UserCreate(BaseModel):
@@ -30,6 +33,8 @@ class SelfUpdate(BaseModel):
 
 
 @router.get("")
+@versioned("/api/users")
+@single_flight("/api/users")
 def list_users(user=Depends(role_required("director", "manager"))):
     db = get_db()
     rows = db.execute("SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users ORDER BY full_name").fetchall()
@@ -51,17 +56,18 @@ def create_user(data: UserCreate, user=Depends(role_required("director"))):
         "INSERT INTO users (username, password_hash, full_name, role, phone) VALUES (?, ?, ?, ?, ?)",
         (data.username, hash_password(data.password), data.full_name, data.role, data.phone),
     )
-    db.commit()
-    row = db.execute(
-        "SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users WHERE id = ?",
-        (cur.lastrowid,),
-    ).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "users.created",
         channels=["users"],
         cache_prefixes=["/api/users"],
         payload={"user_id": cur.lastrowid},
     )
+    db.commit()
+    row = db.execute(
+        "SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users WHERE id = ?",
+        (cur.lastrowid,),
+    ).fetchone()
     db.close()
     return dict(row)
 
@@ -91,18 +97,19 @@ def update_user(user_id: int, data: UserUpdate, user=Depends(role_required("dire
         set_clause = ", ".join(f"{k} = ?" for k in updates)
         values = list(updates.values()) + [user_id]
         db.execute(f"UPDATE users SET {set_clause} WHERE id = ?", values)
+        enqueue_event(
+            db,
+            "users.updated",
+            channels=["users"],
+            cache_prefixes=["/api/users"],
+            payload={"user_id": user_id},
+        )
         db.commit()
 
     row = db.execute(
         "SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users WHERE id = ?",
         (user_id,),
     ).fetchone()
-    publish_event(
-        "users.updated",
-        channels=["users"],
-        cache_prefixes=["/api/users"],
-        payload={"user_id": user_id},
-    )
     db.close()
     return dict(row)
 
@@ -116,13 +123,14 @@ def toggle_active(user_id: int, user=Depends(role_required("director"))):
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     new_status = 0 if target["is_active"] else 1
     db.execute("UPDATE users SET is_active = ? WHERE id = ?", (new_status, user_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "users.updated",
         channels=["users"],
         cache_prefixes=["/api/users"],
         payload={"user_id": user_id, "is_active": new_status},
     )
+    db.commit()
     db.close()
     return {"id": user_id, "is_active": new_status}
 
@@ -136,13 +144,14 @@ def reset_password(user_id: int, user=Depends(role_required("director"))):
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     new_pass = "12345"
     db.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hash_password(new_pass), user_id))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "users.updated",
         channels=["users"],
         cache_prefixes=["/api/users"],
         payload={"user_id": user_id},
     )
+    db.commit()
     db.close()
     return {"message": f"Пароль сброшен на: {new_pass}"}
 
@@ -153,14 +162,15 @@ def update_my_lang(lang: str, user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Язык должен быть 'ru' или 'ky'")
     db = get_db()
     db.execute("UPDATE users SET lang = ? WHERE id = ?", (lang, user["id"]))
-    db.commit()
-    publish_event(
+    enqueue_event(
+        db,
         "users.updated",
         channels=["users", "profile"],
         cache_prefixes=["/api/users"],
         payload={"user_id": user["id"], "lang": lang},
         user_ids=[user["id"]],
     )
+    db.commit()
     db.close()
     return {"lang": lang}
 
@@ -202,17 +212,18 @@ def update_me(data: SelfUpdate, user=Depends(get_current_user)):
     set_clause = ", ".join(f"{k} = ?" for k in updates)
     values = list(updates.values()) + [user["id"]]
     db.execute(f"UPDATE users SET {set_clause} WHERE id = ?", values)
-    db.commit()
-    row = db.execute(
-        "SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users WHERE id = ?",
-        (user["id"],),
-    ).fetchone()
-    publish_event(
+    enqueue_event(
+        db,
         "users.updated",
         channels=["users", "profile"],
         cache_prefixes=["/api/users"],
         payload={"user_id": user["id"]},
         user_ids=[user["id"]],
     )
+    db.commit()
+    row = db.execute(
+        "SELECT id, username, full_name, role, phone, is_active, lang, created_at FROM users WHERE id = ?",
+        (user["id"],),
+    ).fetchone()
     db.close()
     return dict(row)
@@ -1,13 +1,17 @@
-from datetime import date, datetime, timedelta
+﻿from datetime import date, datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
-from backend.database import get_db
+from backend.database import day_key, fan_out_reads, get_db
 from backend.dependencies import get_current_user, role_required
-from backend.realtime import publish_event
+from backend.fast_json import FastJSONRoute
+from backend.outbox import enqueue_event
+from backend.response_cache import cached_response
+from backend.etags import versioned
+from backend.single_flight import single_flight
 
-router = APIRouter(tags=["work_journal"])
+router = APIRouter(tags=["work_journal"], route_class=FastJSONRoute)
 
 MAX_RANGE_DAYS = 93
 
@@ -118,6 +122,8 @@ def _fetch_leave_requests(db, where: str, params: list, limit: int | None = None
 
 
 @router.get("/api/work-journal")
+@cached_response("/api/work-journal", depends_on=("/api/hr", "/api/tasks", "/api/leave-requests", "/api/users"))
+@single_flight("/api/work-journal")
 def get_work_journal(
     date_from: str = "",
     date_to: str = "",
@@ -129,7 +135,6 @@ def get_work_journal(
     from_d, to_d = _validate_period(date_from, date_to)
     from_iso = from_d.isoformat()
     to_iso = to_d.isoformat()
-    to_ts = f"{to_iso} 23:59:59"
     day_list = [d.isoformat() for d in _date_range(from_d, to_d)]
 
     db = get_db()
@@ -143,9 +148,9 @@ def get_work_journal(
         f"SELECT id, full_name, role FROM users WHERE {where_users} ORDER BY full_name",
         params,
     ).fetchall()
+    db.close()
 
     if not users:
-        db.close()
         return {
             "period": {"date_from": from_iso, "date_to": to_iso, "days": day_list},
             "items": [],
@@ -155,49 +160,49 @@ def get_work_journal(
     user_ids = [u["id"] for u in users]
     placeholders = ",".join(["?"] * len(user_ids))
 
-    attendance_rows = db.execute(
-        f"""SELECT user_id, date, check_in, check_out
-            FROM attendance
-            WHERE user_id IN ({placeholders}) AND date BETWEEN ? AND ?""",
-        user_ids + [from_iso, to_iso],
-    ).fetchall()
-    attendance_map = {(r["user_id"], r["date"]): dict(r) for r in attendance_rows}
-
-    fine_rows = db.execute(
-        f"""SELECT user_id,
-                   COUNT(*) as fines_count,
-                   COALESCE(SUM(deduction_amount), 0) as fines_sum
-            FROM incidents
-            WHERE user_id IN ({placeholders})
-              AND deduction_amount > 0
-              AND created_at BETWEEN ? AND ?
-            GROUP BY user_id""",
-        user_ids + [from_iso, to_ts],
-    ).fetchall()
-    fine_map = {r["user_id"]: {"fines_count": int(r["fines_count"]), "fines_sum": float(r["fines_sum"] or 0)} for r in fine_rows}
-
-    task_rows = db.execute(
-        f"""SELECT assigned_to as user_id, COUNT(*) as tasks_done_count
-            FROM tasks
-            WHERE assigned_to IN ({placeholders})
-              AND is_done = 1
-              AND done_at IS NOT NULL
-              AND done_at BETWEEN ? AND ?
-            GROUP BY assigned_to""",
-        user_ids + [from_iso, to_ts],
-    ).fetchall()
-    task_map = {r["user_id"]: int(r["tasks_done_count"]) for r in task_rows}
-
-    leave_rows = db.execute(
-        f"""SELECT user_id, type, date_start, date_end
-            FROM leave_requests
-            WHERE user_id IN ({placeholders})
-              AND status = 'approved'
-              AND date_start <= ?
-              AND date_end >= ?""",
-        user_ids + [to_iso, from_iso],
-    ).fetchall()
-    db.close()
+    # The four per-user batches are independent: run them side by side.
+    rows = fan_out_reads({
+        "attendance": lambda db: db.execute(
+            f"""SELECT user_id, date, check_in, check_out
+                FROM attendance
+                WHERE user_id IN ({placeholders}) AND date BETWEEN ? AND ?""",
+            user_ids + [from_iso, to_iso],
+        ).fetchall(),
+        # From the per-employee daily KPIs (report_daily_employees).
+        "fines": lambda db: db.execute(
+            f"""SELECT user_id,
+                       SUM(fines_count) as fines_count,
+                       COALESCE(SUM(fines_total), 0) as fines_sum
+                FROM report_daily_employees
+                WHERE user_id IN ({placeholders})
+                  AND day BETWEEN ? AND ?
+                GROUP BY user_id
+                HAVING SUM(fines_count) > 0""",
+            user_ids + [from_iso, to_iso],
+        ).fetchall(),
+        "tasks": lambda db: db.execute(
+            f"""SELECT assigned_to as user_id, COUNT(*) as tasks_done_count
+                FROM tasks
+                WHERE assigned_to IN ({placeholders})
+                  AND is_done = 1
+                  AND done_day BETWEEN ? AND ?
+                GROUP BY assigned_to""",
+            user_ids + [day_key(from_d), day_key(to_d)],
+        ).fetchall(),
+        "leaves": lambda db: db.execute(
+            f"""SELECT user_id, type, date_start, date_end
+                FROM leave_requests
+                WHERE user_id IN ({placeholders})
+                  AND status = 'approved'
+                  AND date_start <= ?
+                  AND date_end >= ?""",
+            user_ids + [to_iso, from_iso],
+        ).fetchall(),
+    })
+    attendance_map = {(r["user_id"], r["date"]): dict(r) for r in rows["attendance"]}
+    fine_map = {r["user_id"]: {"fines_count": int(r["fines_count"]), "fines_sum": float(r["fines_sum"] or 0)} for r in rows["fines"]}
+    task_map = {r["user_id"]: int(r["tasks_done_count"]) for r in rows["tasks"]}
+    leave_rows = rows["leaves"]
 
     leave_days_map: dict[int, dict[str, str]] = {uid: {} for uid in user_ids}
     for row in leave_rows:
@@ -357,19 +362,22 @@ def create_leave_request(data: LeaveRequestCreate, user=Depends(get_current_user
             user["id"],
         ),
     )
-    db.commit()
-    rows = _fetch_leave_requests(db, "lr.id = ?", [cur.lastrowid])
-    publish_event(
+    enqueue_event(
+        db,
         "leave_requests.created",
         channels=["leave-requests", "work-journal", "dashboard"],
         cache_prefixes=["/api/leave-requests", "/api/work-journal"],
         payload={"leave_request_id": cur.lastrowid, "user_id": target_user_id},
     )
+    db.commit()
+    rows = _fetch_leave_requests(db, "lr.id = ?", [cur.lastrowid])
     db.close()
     return rows[0]
 
 
 @router.get("/api/leave-requests")
+@versioned("/api/leave-requests")
+@single_flight("/api/leave-requests", per_user_roles=("designer", "master", "assistant"))
 def list_leave_requests(
     status: str = "",
     user_id: int = 0,
@@ -451,13 +459,14 @@ def review_leave_request(
            WHERE id = ?""",
         (new_status, user["id"], (data.review_note or "").strip(), request_id),
     )
-    db.commit()
-    rows = _fetch_leave_requests(db, "lr.id = ?", [request_id])
-    publish_event(
+    enqueue_event(
+        db,
         "leave_requests.updated",
         channels=["leave-requests", "work-journal", "dashboard"],
         cache_prefixes=["/api/leave-requests", "/api/work-journal"],
         payload={"leave_request_id": request_id, "status": new_status, "user_id": row["user_id"]},
     )
+    db.commit()
+    rows = _fetch_leave_requests(db, "lr.id = ?", [request_id])
     db.close()
     return rows[0]
@@ -0,0 +1,107 @@
+"""Request coalescing (single-flight) for sync JSON GET endpoints.
+
+    @router.get("")
+    @single_flight("/api/orders", per_user_roles=("designer", "master", "assistant"))
+    def list_orders(...):
+
+Concurrent calls with the same endpoint, parameters and permission scope
+share one computation: the first caller runs the handler, the others wait
+for it and get the same result (or exception). The scope is the caller's
+role, plus the user id for roles in per_user_roles, whose rows the handler
+filters by user.
+
+A call only coalesces with one started after the last cache invalidation
+(see backend/response_cache.py), so a request made after a write never gets
+a result computed before it. Under @cached_response, put @single_flight
+below it: cache misses of identical requests are then computed once.
+"""
+import functools
+import threading
+
+from backend.response_cache import invalidation_generation
+
+_lock = threading.Lock()
+_calls: dict[tuple, "_Call"] = {}
+_stats: dict[str, dict[str, int]] = {}
+
+
+class _Call:
+    __slots__ = ("prefix", "done", "result", "error", "followers")
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.followers = 0
+
+
+def _prefix_stats(prefix: str) -> dict[str, int]:
+    if prefix not in _stats:
+        _stats[prefix] = {"calls": 0, "collapsed": 0, "max_followers": 0}
+    return _stats[prefix]
+
+
+def single_flight(prefix: str, *, per_user_roles: tuple[str, ...] = ()):
+    """Coalesce identical concurrent calls of a sync endpoint that takes the current user as `user`.
+
+    prefix groups the stats; per_user_roles lists the roles for which the
+    result depends on the user id, not only on the role.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user = kwargs.get("user") or {}
+            role = user.get("role")
+            scope = (role, user.get("id") if role in per_user_roles else None)
+            params = tuple(sorted((k, repr(v)) for k, v in kwargs.items() if k != "user"))
+            key = (func.__module__, func.__qualname__, scope, params, invalidation_generation())
+
+            with _lock:
+                call = _calls.get(key)
+                if call is None:
+                    call = _calls[key] = _Call(prefix)
+                    _prefix_stats(prefix)["calls"] += 1
+                    leader = True
+                else:
+                    call.followers += 1
+                    stats = _prefix_stats(prefix)
+                    stats["collapsed"] += 1
+                    stats["max_followers"] = max(stats["max_followers"], call.followers)
+                    leader = False
+
+            if not leader:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                return call.result
+
+            try:
+                call.result = func(*args, **kwargs)
+                return call.result
+            except BaseException as err:
+                call.error = err
+                raise
+            finally:
+                with _lock:
+                    _calls.pop(key, None)
+                call.done.set()
+
+        return wrapper
+
+    return decorator
+
+
+def single_flight_stats() -> dict:
+    with _lock:
+        per_prefix = {}
+        for prefix, counters in _stats.items():
+            requests = counters["calls"] + counters["collapsed"]
+            per_prefix[prefix] = {
+                **counters,
+                "collapse_ratio": round(counters["collapsed"] / requests, 3) if requests else 0.0,
+                "in_flight": 0,
+            }
+        for call in _calls.values():
+            per_prefix[call.prefix]["in_flight"] += 1
+        return {"in_flight": len(_calls), "prefixes": per_prefix}
@@ -0,0 +1,123 @@
+"""The React build (frontend-react/dist), served from memory.
+
+The build is read once, at startup (or on the first request after it
+appears): every file with its precompressed .br/.gz siblings (see
+backend/compression.py), media type and ETag. Requests are answered from
+this manifest without a filesystem call; files over MEMORY_MAX_BYTES stay
+on disk and go out through FileResponse (sendfile) with the stat taken at
+load time. A new build is picked up on restart.
+
+Vite names the files in assets/ by content hash, so the browser keeps them
+for a year without asking again. index.html and the other unhashed files
+are revalidated on every load (ETag, 304): after a deploy the page has to
+point at the new bundles, the old ones are gone.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from fastapi.responses import FileResponse, Response
+
+from backend.compression import STATIC_ENCODINGS, accepted_encodings
+from backend.etags import etag_matches
+
+MEMORY_MAX_BYTES = 4 * 1024 * 1024
+# Vite's default output name: assets/[name]-[hash].[ext], with an 8-character hash
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.\w+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_lock = threading.Lock()
+_manifest: dict[str, dict] | None = None
+
+
+def _variant(path: str) -> dict:
+    stat = os.stat(path)
+    if stat.st_size <= MEMORY_MAX_BYTES:
+        with open(path, "rb") as f:
+            return {"body": f.read()}
+    return {"file": path, "stat": stat}
+
+
+def _content_tag(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(dist_dir: str) -> dict[str, dict] | None:
+    """Read the build into memory; None when there is no build (no index.html)."""
+    if not os.path.isfile(os.path.join(dist_dir, "index.html")):
+        return None
+    sibling_suffixes = tuple(suffix for _, suffix in STATIC_ENCODINGS)
+    manifest = {}
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            if name.endswith(sibling_suffixes):
+                continue
+            path = os.path.join(root, name)
+            url_path = os.path.relpath(path, dist_dir).replace(os.sep, "/")
+            variants = {"identity": _variant(path)}
+            for encoding, suffix in STATIC_ENCODINGS:
+                if os.path.isfile(path + suffix):
+                    variants[encoding] = _variant(path + suffix)
+            manifest[url_path] = {
+                "media_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                "tag": _content_tag(path),
+                "cache_control": IMMUTABLE if HASHED_ASSET.match(url_path) else REVALIDATE,
+                "variants": variants,
+            }
+    return manifest
+
+
+def init_spa(dist_dir: str) -> None:
+    global _manifest
+    with _lock:
+        _manifest = load_manifest(dist_dir)
+
+
+def _get_manifest(dist_dir: str) -> dict[str, dict] | None:
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                _manifest = load_manifest(dist_dir)
+    return _manifest
+
+
+def spa_response(dist_dir: str, path: str, request) -> Response | None:
+    """Response for a path of the SPA, or None when the frontend is not built.
+
+    Unknown paths get index.html (client-side routes), except under assets/:
+    a missing bundle is a 404, never HTML.
+    """
+    manifest = _get_manifest(dist_dir)
+    if manifest is None:
+        return None
+    entry = manifest.get(path or "index.html")
+    if entry is None:
+        if path.startswith("assets/"):
+            return Response(status_code=404)
+        entry = manifest["index.html"]
+
+    variants = entry["variants"]
+    accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+    encoding = next((enc for enc, _ in STATIC_ENCODINGS if enc in variants and enc in accepted), "identity")
+    # Each encoding is a different representation: its own strong ETag.
+    etag = f'"{entry["tag"]}"' if encoding == "identity" else f'"{entry["tag"]}-{encoding}"'
+    headers = {"ETag": etag, "Cache-Control": entry["cache_control"]}
+    if len(variants) > 1:
+        headers["Vary"] = "Accept-Encoding"
+    if etag_matches(request.headers.get("If-None-Match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    variant = variants[encoding]
+    if "body" in variant:
+        return Response(variant["body"], media_type=entry["media_type"], headers=headers)
+    return FileResponse(variant["file"], media_type=entry["media_type"], headers=headers, stat_result=variant["stat"])
@@ -0,0 +1,215 @@
+"""Per-request SQL tracing and the slow-query log.
+
+DBCompat.execute adds every statement of a request to its usage dict (see
+track_sql_usage in backend/database.py): the SQL text, the parameter types
+and the time. The request middleware keeps the traces of the last
+POLYCONTROL_SQL_TRACE_REQUESTS requests by request id (the X-Request-ID
+response header); /api/debug/sql/{request_id} groups them by fingerprint,
+the SQL with literals replaced by `?` and IN lists collapsed. Request ids are
+always made by the server, so a client cannot file its statements under
+another request; an X-Request-ID sent by the client is kept as
+client_request_id.
+
+A statement slower than POLYCONTROL_SQL_SLOW_MS goes to the slow-query log
+with its fingerprint and parameter shape, never the values. The first time a
+fingerprint is slow, its plan is captured on the same connection:
+EXPLAIN QUERY PLAN on SQLite, EXPLAIN (without ANALYZE, nothing runs twice)
+on PostgreSQL inside a savepoint, so a failing EXPLAIN cannot abort the
+request's transaction.
+
+While a collector is registered (collect_statement, used by
+backend/index_advisor.py), every statement is also kept once per
+fingerprint with its first parameters, so it can be planned later.
+"""
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from backend.config import SQL_SLOW_MS, SQL_TRACE_REQUESTS
+
+SLOW_SQL_SECONDS = SQL_SLOW_MS / 1000
+SLOW_LOG_SIZE = 200
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_lock = threading.Lock()
+_requests: OrderedDict[str, dict] = OrderedDict()
+_slow: deque = deque(maxlen=SLOW_LOG_SIZE)
+_plans: dict[str, list[str] | None] = {}
+# Registered by index_advisor.collect_queries(): fingerprint -> {"sql", "args", "count"}.
+statement_collectors: list[dict] = []
+
+
+def fingerprint(sql: str) -> str:
+    """SQL with literals and placeholders as `?` and IN lists as `(...)`: one text per query shape."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql.replace("%s", "?"))
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def params_shape(types) -> str:
+    """`(int, str×3)` for the parameter types of a statement."""
+    parts = []
+    for type_ in types:
+        name = "NULL" if type_ is type(None) else type_.__name__
+        if parts and parts[-1][0] == name:
+            parts[-1][1] += 1
+        else:
+            parts.append([name, 1])
+    return "(" + ", ".join(name if count == 1 else f"{name}×{count}" for name, count in parts) + ")"
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def client_request_id(request) -> str | None:
+    """The caller's X-Request-ID when it looks like an id: shown with the trace, never its key."""
+    incoming = request.headers.get("X-Request-ID", "")
+    return incoming if _REQUEST_ID.match(incoming) else None
+
+
+def _explain(conn, engine: str, sql: str, args: tuple) -> list[str] | None:
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    cur = conn.cursor()
+    try:
+        if engine == "postgres":
+            cur.execute("SAVEPOINT sql_trace_explain")
+            try:
+                cur.execute("EXPLAIN " + sql, args)
+                plan = [row[0] for row in cur.fetchall()]
+            except Exception:
+                cur.execute("ROLLBACK TO SAVEPOINT sql_trace_explain")
+                return None
+            cur.execute("RELEASE SAVEPOINT sql_trace_explain")
+            return plan
+        cur.execute("EXPLAIN QUERY PLAN " + sql, args)
+        return [row[3] for row in cur.fetchall()]
+    except Exception:
+        return None
+    finally:
+        cur.close()
+
+
+def log_slow_query(conn, engine: str, sql: str, args: tuple, seconds: float, usage: dict | None) -> None:
+    """Record a statement over the threshold; called by DBCompat.execute right after it ran."""
+    shape = fingerprint(sql)
+    with _lock:
+        explained = shape in _plans
+        if not explained:
+            _plans[shape] = None
+    if not explained:
+        plan = _explain(conn, engine, sql, args)
+        with _lock:
+            _plans[shape] = plan
+    entry = {
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "request_id": usage.get("request_id") if usage else None,
+        "ms": round(seconds * 1000, 2),
+        "sql": shape,
+        "params": params_shape(map(type, args)),
+    }
+    with _lock:
+        _slow.append(entry)
+    print(f"SLOW SQL {entry['ms']:.0f}ms {entry['params']} {shape[:300]}")
+
+
+def collect_statement(sql: str, args: tuple) -> None:
+    """Add a statement to the registered collectors; DBCompat.execute calls it only while there are any."""
+    shape = fingerprint(sql)
+    with _lock:
+        for collected in statement_collectors:
+            entry = collected.get(shape)
+            if entry is None:
+                collected[shape] = {"sql": sql, "args": args, "count": 1}
+            else:
+                entry["count"] += 1
+
+
+def slow_queries() -> list[dict]:
+    with _lock:
+        return [{**entry, "plan": _plans.get(entry["sql"])} for entry in reversed(_slow)]
+
+
+def store_request_trace(
+    request_id: str,
+    method: str,
+    path: str,
+    status: int,
+    seconds: float,
+    usage: dict,
+    client_request_id: str | None = None,
+) -> None:
+    """Keep the usage dict of a finished request (statements of a streamed body keep arriving)."""
+    if usage.get("statements") is None:
+        return
+    trace = {
+        "request_id": request_id,
+        "client_request_id": client_request_id,
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "method": method,
+        "path": path,
+        "status": status,
+        "duration_ms": round(seconds * 1000, 2),
+        "usage": usage,
+    }
+    with _lock:
+        _requests[request_id] = trace
+        _requests.move_to_end(request_id)
+        while len(_requests) > SQL_TRACE_REQUESTS:
+            _requests.popitem(last=False)
+
+
+def _summary(trace: dict) -> dict:
+    usage = trace["usage"]
+    return {
+        **{key: value for key, value in trace.items() if key != "usage"},
+        "queries": usage["queries"],
+        "sql_ms": round(usage["seconds"] * 1000, 2),
+    }
+
+
+def recent_requests(limit: int = 50) -> list[dict]:
+    with _lock:
+        traces = list(_requests.values())[-limit:]
+    return [_summary(trace) for trace in reversed(traces)]
+
+
+def request_breakdown(request_id: str) -> dict | None:
+    """Statements of a request grouped by fingerprint, most expensive first."""
+    with _lock:
+        trace = _requests.get(request_id)
+        if trace is None:
+            return None
+        statements = list(trace["usage"]["statements"])
+        slow = [entry for entry in _slow if entry["request_id"] == request_id]
+
+    groups: dict[str, dict] = {}
+    for sql, types, seconds in statements:
+        shape = fingerprint(sql)
+        group = groups.get(shape)
+        if group is None:
+            group = groups[shape] = {"sql": shape, "params": params_shape(types), "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        group["count"] += 1
+        group["total_ms"] += seconds * 1000
+        group["max_ms"] = max(group["max_ms"], seconds * 1000)
+    for group in groups.values():
+        group["total_ms"] = round(group["total_ms"], 3)
+        group["max_ms"] = round(group["max_ms"], 3)
+
+    with _lock:
+        slow = [{**entry, "plan": _plans.get(entry["sql"])} for entry in slow]
+    return {
+        **_summary(trace),
+        "statements": sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True),
+        "slow": slow,
+    }
@@ -0,0 +1,117 @@
+"""Latency of order breakdowns: columnar NumPy snapshot vs. SQL GROUP BY.
+
+Fills a throwaway SQLite DB with 2025 from benchmarks.dataset, checks that
+backend.analytics.breakdown returns the same groups as the equivalent SQL
+query, and times both. The first snapshot load is reported separately;
+after it, every query refreshes the snapshot incrementally as the API does.
+
+    python -m benchmarks.analytics_breakdown --orders 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.dataset import BENCHMARK_END, load_dataset
+from benchmarks.report_fanout import _time
+
+YEAR = ("2025-01-01", "2025-12-31")
+OPEN_STATUSES = ["created", "design", "design_done", "production", "printed", "postprocess", "ready", "closed", "defect"]
+
+
+def _sql_cases():
+    day = "substr(o.created_at, 1, 10)"
+    orders_metrics = "COUNT(*) AS orders_count, SUM(o.total_price) AS revenue, SUM(o.material_cost) AS material_cost"
+    not_cancelled = "o.status != 'cancelled'"
+    return {
+        "status, year": (
+            dict(group_by="status", date_from=YEAR[0], date_to=YEAR[1]),
+            f"SELECT o.status AS key, {orders_metrics} FROM orders o WHERE {day} BETWEEN ? AND ? GROUP BY o.status",
+            YEAR,
+        ),
+        "month, dealers, open": (
+            dict(group_by="month", date_from=YEAR[0], date_to=YEAR[1], statuses=OPEN_STATUSES, client_type="dealer"),
+            f"""SELECT substr(o.created_at, 1, 7) AS key, {orders_metrics} FROM orders o
+                WHERE {day} BETWEEN ? AND ? AND {not_cancelled} AND o.client_type = 'dealer' GROUP BY key""",
+            YEAR,
+        ),
+        "week, Q2, closed": (
+            dict(group_by="week", date_from="2025-04-01", date_to="2025-06-30", statuses=["closed"]),
+            f"""SELECT date(o.created_at, '-6 days', 'weekday 1') AS key, {orders_metrics} FROM orders o
+                WHERE {day} BETWEEN ? AND ? AND o.status = 'closed' GROUP BY key""",
+            ("2025-04-01", "2025-06-30"),
+        ),
+        "manager, H1": (
+            dict(group_by="manager", date_from="2025-01-01", date_to="2025-06-30"),
+            f"SELECT o.created_by AS key, {orders_metrics} FROM orders o WHERE {day} BETWEEN ? AND ? GROUP BY o.created_by",
+            ("2025-01-01", "2025-06-30"),
+        ),
+        "service, year, open": (
+            dict(group_by="service", date_from=YEAR[0], date_to=YEAR[1], statuses=OPEN_STATUSES),
+            f"""SELECT oi.service_id AS key, COUNT(*) AS items_count, COUNT(DISTINCT o.id) AS orders_count,
+                       SUM(oi.total) AS revenue
+                FROM order_items oi JOIN orders o ON o.id = oi.order_id
+                WHERE {day} BETWEEN ? AND ? AND {not_cancelled} GROUP BY oi.service_id""",
+            YEAR,
+        ),
+        "day, two services": (
+            dict(group_by="day", date_from="2025-03-01", date_to="2025-03-31", service_ids=[1, 2]),
+            f"""SELECT {day} AS key, COUNT(*) AS items_count, COUNT(DISTINCT o.id) AS orders_count,
+                       SUM(oi.total) AS revenue
+                FROM order_items oi JOIN orders o ON o.id = oi.order_id
+                WHERE {day} BETWEEN ? AND ? AND oi.service_id IN (1, 2) GROUP BY key""",
+            ("2025-03-01", "2025-03-31"),
+        ),
+    }
+
+
+def _normalize(rows) -> dict:
+    return {
+        row["key"]: {k: round(float(v or 0), 2) for k, v in dict(row).items() if k not in ("key", "name")}
+        for row in rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="analytics-bench-")
+    os.environ["POLYCONTROL_DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(tmpdir, "uploads")
+    os.environ.pop("POLYCONTROL_DATABASE_URL", None)
+    os.environ.pop("DATABASE_URL", None)
+    from backend.database import get_db
+
+    started = time.perf_counter()
+    load_dataset(args.orders, employees=args.employees, years=1, end=BENCHMARK_END)
+    print(f"dataset: {args.orders} orders, {args.employees} employees ({time.perf_counter() - started:.1f}s)")
+
+    from backend import analytics
+
+    started = time.perf_counter()
+    analytics.breakdown("status")
+    print(f"snapshot load: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def sql(query, params):
+        db = get_db()
+        rows = db.execute(query, params).fetchall()
+        db.close()
+        return rows
+
+    print(f"{'case':<24}{'SQL ms':>10}{'NumPy ms':>10}{'speedup':>10}")
+    for name, (kwargs, query, params) in _sql_cases().items():
+        expected = _normalize(sql(query, params))
+        got = _normalize(analytics.breakdown(**kwargs))
+        if got != expected:
+            raise SystemExit(f"{name}: snapshot result differs from SQL")
+        sql_ms = _time(lambda: sql(query, params), args.repeat)
+        numpy_ms = _time(lambda: analytics.breakdown(**kwargs), args.repeat)
+        print(f"{name:<24}{sql_ms:>10.1f}{numpy_ms:>10.1f}{sql_ms / numpy_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,675 @@
+"""Deterministic synthetic dataset of production size, for benchmarks and fixtures.
+
+Generates the history of the print shop into the database the app is
+configured for (POLYCONTROL_DB_PATH, or POLYCONTROL_DATABASE_URL for
+PostgreSQL), on top of init_db() and seed_db():
+
+- employees emp001... of every role (some hired later, some gone), all with
+  the password EMPLOYEE_PASSWORD; the first of each role is active for the
+  whole period;
+- orders over `years` years up to `end`, more on weekdays, growing over time,
+  from repeat clients: 1-3 items each, the status history of the current
+  flow (and some of the legacy one), material reserve/consume/unreserve and
+  receipts in material_ledger, notifications when ready. Orders still in
+  progress at `end` keep their status;
+- working-day attendance with late arrivals, shift checklists, incidents
+  (lateness, defects of printed orders, complaints), daily and weekly tasks,
+  leave requests (approved leave means no attendance), weekly payroll with
+  the incidents' deductions, training with progress, announcements with reads
+  and price changes.
+
+The same seed, sizes and end date give the same rows. Rows are generated in
+one pass, in time order, and bulk-loaded in chunks: executemany in one
+transaction on SQLite, COPY on PostgreSQL. Secondary indexes of the loaded
+tables are dropped for the load and rebuilt after, then the report_daily_*
+rollups and ANALYZE (analyze=False skips it).
+
+    python -m benchmarks.dataset --db /tmp/bench.db --orders 1000000 --employees 60 --years 3
+    POLYCONTROL_DATABASE_URL=postgresql://... python -m benchmarks.dataset --orders 1000000
+
+From a benchmark or a test fixture, after pointing POLYCONTROL_DB_PATH (or
+POLYCONTROL_DATABASE_URL) at an empty database:
+
+    from benchmarks.dataset import load_dataset
+    load_dataset(orders=100000, employees=60, years=2, end=date(2025, 12, 31))
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import time
+from bisect import bisect
+from datetime import date, timedelta
+from itertools import accumulate
+
+EMPLOYEE_PASSWORD = "employee123"
+# Last day of the synthetic history in the benchmarks, which query 2025.
+BENCHMARK_END = date(2025, 12, 31)
+FLUSH_ROWS = 20000
+DAY = 86400
+HOUR = 3600
+
+ROLE_SHARES = (("manager", 0.15), ("designer", 0.25), ("master", 0.35), ("assistant", 0.25))
+WEEKLY_SALARY = {"manager": 9000, "designer": 8000, "master": 7500, "assistant": 5000}
+# Orders per weekday, Monday first.
+WEEKDAY_LOAD = (1.0, 1.0, 1.0, 1.0, 0.95, 0.7, 0.2)
+SERVICE_WEIGHTS = {
+    "banner": 20, "vinyl": 14, "mesh": 5, "table": 8, "forex": 4, "letters": 3, "plotter": 6,
+    "dtf": 8, "menu_a4": 4, "vizit_1": 6, "vizit_2": 5, "photo_a4": 8, "photo_a3": 4,
+}
+# Hours from the previous status, (min, max).
+STEP_HOURS = {
+    "design": (0.2, 6), "design_done": (1, 30), "production": (1, 48), "printed": (1, 24),
+    "postprocess": (0.5, 12), "ready": (1, 48), "closed": (2, 120), "cancelled": (1, 72), "defect": (1, 24),
+}
+FLOW = ("design", "production", "ready", "closed")
+LEGACY_FLOW = ("design", "design_done", "production", "printed", "postprocess", "ready", "closed")
+
+FIRST_NAMES = (
+    "Айбек", "Нурлан", "Азамат", "Бакыт", "Эрлан", "Максат", "Тимур", "Руслан", "Данияр", "Улан",
+    "Айгуль", "Жылдыз", "Нургуль", "Айпери", "Бермет", "Гульнара", "Елена", "Ольга", "Асель", "Динара",
+)
+LAST_NAMES = (
+    "Абдыкадыров", "Асанов", "Бекмуратов", "Джумабаев", "Иванов", "Касымов", "Мамытов", "Осмонов",
+    "Садыков", "Токтогулов", "Усенов", "Шаршенов", "Эшимбеков", "Юсупов", "Петров", "Сыдыков",
+)
+COMPANY_WORDS = ("Альфа", "Ала-Тоо", "Восток", "Нур", "Сапат", "Бишкек", "Тенир", "Медина", "Арча", "Кут")
+COMPANY_KINDS = ("Принт", "Строй", "Маркет", "Групп", "Трейд", "Медиа", "Сервис", "Моторс")
+DAILY_TASKS = ("Проверить остатки", "Обзвонить клиентов", "Подготовить макеты", "Убрать склад", "Заказать материалы")
+WEEKLY_TASKS = ("Отчёт за неделю", "Инвентаризация", "Обслуживание плоттера", "Планёрка")
+ANNOUNCEMENTS = (
+    "Завтра собрание в 9:00", "Поступила новая партия баннерной ткани", "Не забывайте отмечать чек-лист смены",
+    "В субботу короткий день", "Обновлён прайс-лист", "Проверьте график отпусков",
+)
+
+COLUMNS = {
+    "users": ("id", "username", "password_hash", "full_name", "role", "phone", "is_active", "lang", "created_at"),
+    "orders": (
+        "id", "order_number", "client_name", "client_phone", "client_type", "status", "total_price", "material_cost",
+        "notes", "assigned_designer", "assigned_master", "assigned_assistant", "deadline", "created_by",
+        "created_at", "updated_at",
+    ),
+    "order_items": (
+        "id", "order_id", "service_id", "material_id", "quantity", "width", "height", "unit_price", "total",
+        "material_qty", "options",
+    ),
+    "order_history": ("id", "order_id", "old_status", "new_status", "changed_by", "note", "created_at"),
+    "material_ledger": ("id", "material_id", "order_id", "action", "quantity", "note", "performed_by", "created_at"),
+    "client_notifications": ("id", "order_id", "channel", "message", "status", "created_at", "sent_at"),
+    "attendance": ("id", "user_id", "date", "check_in", "check_out"),
+    "shift_task_logs": ("id", "user_id", "task_id", "date", "completed"),
+    "incidents": (
+        "id", "user_id", "type", "description", "order_id", "material_waste", "deduction_amount", "status",
+        "created_by", "created_at",
+    ),
+    "tasks": ("id", "title", "type", "assigned_to", "assigned_by", "due_date", "is_done", "done_at", "created_at"),
+    "leave_requests": (
+        "id", "user_id", "type", "reason", "date_start", "date_end", "days_count", "status", "created_by",
+        "reviewed_by", "reviewed_at", "created_at",
+    ),
+    "payroll": (
+        "id", "user_id", "week_start", "week_end", "base_salary", "bonus", "deductions", "total", "is_paid",
+        "paid_at", "created_by", "created_at",
+    ),
+    "training": ("id", "title", "description", "youtube_url", "role_target", "created_by", "is_required", "created_at"),
+    "training_progress": ("id", "training_id", "user_id", "watched", "watched_at"),
+    "announcements": ("id", "message", "target_user_id", "created_by", "created_at"),
+    "announcement_reads": ("id", "announcement_id", "user_id", "read_at"),
+    "price_history": ("id", "service_id", "price_retail", "price_dealer", "changed_by", "changed_at"),
+}
+
+
+class _Loader:
+    """Buffers rows per table and bulk-loads them; hands out ids after the existing ones."""
+
+    def __init__(self, conn, engine: str):
+        self.conn = conn
+        self.engine = engine
+        self.buffers: dict[str, list] = {table: [] for table in COLUMNS}
+        self.counts: dict[str, int] = dict.fromkeys(COLUMNS, 0)
+        self.next_ids: dict[str, int] = {}
+        cur = conn.cursor()
+        for table in COLUMNS:
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            self.next_ids[table] = cur.fetchone()[0] + 1
+        cur.close()
+
+    def new_id(self, table: str) -> int:
+        value = self.next_ids[table]
+        self.next_ids[table] = value + 1
+        return value
+
+    def add(self, table: str, row: tuple) -> None:
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= FLUSH_ROWS:
+            self.flush(table)
+
+    def flush(self, table: str) -> None:
+        rows = self.buffers[table]
+        if not rows:
+            return
+        columns = COLUMNS[table]
+        cur = self.conn.cursor()
+        if self.engine == "postgres":
+            data = io.StringIO()
+            csv.writer(data).writerows(rows)
+            data.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data)
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        cur.close()
+        self.counts[table] += len(rows)
+        self.buffers[table] = []
+
+    def flush_all(self) -> None:
+        for table in COLUMNS:
+            self.flush(table)
+
+
+def _drop_indexes(conn, engine: str) -> list[str]:
+    """Drop the secondary (non-unique, non-constraint) indexes of the loaded tables; returns their DDL."""
+    cur = conn.cursor()
+    tables = list(COLUMNS)
+    if engine == "postgres":
+        cur.execute(
+            """SELECT i.indexname, i.indexdef FROM pg_indexes i
+               WHERE i.schemaname = current_schema() AND i.tablename = ANY(%s)
+                 AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+                 AND i.indexdef NOT LIKE 'CREATE UNIQUE%%'""",
+            (tables,),
+        )
+    else:
+        cur.execute(
+            f"""SELECT name, sql FROM sqlite_master
+                WHERE type = 'index' AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'
+                  AND tbl_name IN ({', '.join('?' for _ in tables)})""",
+            tables,
+        )
+    indexes = cur.fetchall()
+    for name, _ in indexes:
+        cur.execute(f"DROP INDEX {name}")
+    cur.close()
+    return [ddl for _, ddl in indexes]
+
+
+def _client_pool(rng: random.Random, size: int) -> list[tuple[str, str, str]]:
+    """(name, phone, client_type): companies are dealers more often than people."""
+    clients = []
+    for n in range(size):
+        phone = f"+99670{n % 10000000:07d}"
+        if rng.random() < 0.4:
+            name = f"ОсОО «{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)}»"
+            client_type = "dealer" if rng.random() < 0.55 else "retail"
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[0]}."
+            client_type = "dealer" if rng.random() < 0.05 else "retail"
+        clients.append((name, phone, client_type))
+    return clients
+
+
+def _day_counts(total: int, days: list[date]) -> list[int]:
+    """Orders per day: weekday load, a summer peak and 60% growth over the period, summing to total."""
+    weights = []
+    for n, day in enumerate(days):
+        season = 1 + 0.15 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365)
+        growth = 0.8 + 0.6 * n / max(len(days) - 1, 1)
+        weights.append(WEEKDAY_LOAD[day.weekday()] * season * growth)
+    scale = total / sum(weights)
+    counts = []
+    previous = 0
+    for cumulative in accumulate(weights):
+        current = round(cumulative * scale)
+        counts.append(current - previous)
+        previous = current
+    return counts
+
+
+class _Generator:
+    def __init__(self, loader: _Loader, rng: random.Random, days: list[date], director_id: int):
+        self.out = loader
+        self.rng = rng
+        self.days = days
+        self.day_text = [day.isoformat() for day in days]
+        self.end_second = len(days) * DAY - 1
+        self.director_id = director_id
+        self.employees: list[dict] = []
+        self.leave_days: dict[int, set[int]] = {}
+        # (user_id, week number) -> deductions, for payroll
+        self.deductions: dict[tuple[int, int], float] = {}
+        self.worked: dict[tuple[int, int], int] = {}
+        self.order_numbers: dict[int, int] = {}
+        self.stock: dict[int, list] = {}
+        # Employees on staff per role, for the day being generated
+        self._roster_day = -1
+        self._roster: dict[str | None, list[dict]] = {}
+
+    def ts(self, second: int) -> str:
+        day, rest = divmod(second, DAY)
+        return f"{self.day_text[day]} {rest // HOUR:02d}:{rest % HOUR // 60:02d}:{rest % 60:02d}"
+
+    def active(self, day: int, role: str | None = None) -> list[dict]:
+        if day != self._roster_day:
+            self._roster_day, self._roster = day, {}
+        people = self._roster.get(role)
+        if people is None:
+            people = self._roster[role] = [
+                employee for employee in self.employees
+                if employee["hired"] <= day < employee["left"] and (role is None or employee["role"] == role)
+            ]
+        return people
+
+    def pick(self, day: int, role: str) -> int:
+        people = self.active(day, role)
+        return self.rng.choice(people)["id"] if people else self.director_id
+
+    # -- people ---------------------------------------------------------------
+
+    def users(self, count: int, password_hash: str) -> None:
+        rng = self.rng
+        last_day = len(self.days)
+        roles = [role for role, share in ROLE_SHARES for _ in range(max(2, round(count * share)))]
+        roles = (roles + ["assistant"] * count)[:count]
+        for n, role in enumerate(roles):
+            # The first of each role stays for the whole period: a stable login for fixtures.
+            veteran = n == 0 or roles[n - 1] != role
+            hired = 0 if veteran or rng.random() < 0.75 else rng.randrange(last_day)
+            left = last_day
+            if not veteran and rng.random() < 0.1 and last_day - hired > 60:
+                left = rng.randrange(hired + 30, last_day)
+            user_id = self.out.new_id("users")
+            self.employees.append({"id": user_id, "role": role, "hired": hired, "left": left})
+            self.out.add("users", (
+                user_id, f"emp{n + 1:03d}", password_hash, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                role, f"+99655{n:07d}", 1 if left == last_day else 0, "ky" if rng.random() < 0.3 else "ru",
+                self.ts(hired * DAY + 9 * HOUR),
+            ))
+
+    def leave_requests(self) -> None:
+        rng = self.rng
+        for employee in self.employees:
+            leave = self.leave_days[employee["id"]] = set()
+            day = employee["hired"] + rng.randrange(30, 120)
+            while day < employee["left"]:
+                sick = rng.random() < 0.4
+                days_count = rng.randint(1, 5) if sick else rng.randint(3, 14)
+                created = day if sick else day - rng.randint(5, 30)
+                if created >= len(self.days):
+                    break
+                created = max(created, employee["hired"])
+                recent = created >= len(self.days) - 5
+                status = "pending" if recent else ("approved" if rng.random() < 0.85 else "rejected")
+                start = date.fromordinal(self.days[0].toordinal() + day)
+                self.out.add("leave_requests", (
+                    self.out.new_id("leave_requests"), employee["id"], "sick" if sick else "rest",
+                    "Болезнь" if sick else "Отпуск", start.isoformat(),
+                    (start + timedelta(days=days_count - 1)).isoformat(), days_count, status, employee["id"],
+                    None if recent else self.director_id, None if recent else self.ts((created + 1) * DAY + 10 * HOUR),
+                    self.ts(created * DAY + 9 * HOUR + rng.randrange(8 * HOUR)),
+                ))
+                if status == "approved":
+                    leave.update(range(day, day + days_count))
+                day += days_count + int(rng.expovariate(1 / 90)) + 14
+
+    # -- orders ---------------------------------------------------------------
+
+    def _material(self, material_id: int, need: float, second: int, day: int) -> None:
+        """Receive rolls when the free stock cannot cover a reservation."""
+        quantity, reserved, roll = self.stock[material_id]
+        if quantity - reserved >= need:
+            return
+        rolls = math.ceil((need - (quantity - reserved)) / roll) + self.rng.randint(2, 6)
+        self.stock[material_id][0] += rolls * roll
+        self.out.add("material_ledger", (
+            self.out.new_id("material_ledger"), material_id, None, "receive", rolls * roll, "Поступление",
+            self.pick(day, "master"), self.ts(max(second - HOUR, 0)),
+        ))
+
+    def order(self, second: int, clients, services, cum_weights) -> None:
+        rng, out = self.rng, self.out
+        day = second // DAY
+        order_id = out.new_id("orders")
+        year = self.days[day].year
+        self.order_numbers[year] = self.order_numbers.get(year, 0) + 1
+        name, phone, client_type = clients[int(len(clients) * rng.random() ** 2.5)]
+        manager = self.pick(day, "manager")
+        created = self.ts(second)
+
+        items = []
+        total_price = material_cost = 0.0
+        for _ in range(rng.choices((1, 2, 3), (60, 30, 10))[0]):
+            service = services[bisect(cum_weights, rng.random() * cum_weights[-1])]
+            service_id, unit, retail, dealer, cost, min_order, material_id, ratio = service
+            width = height = None
+            if unit == "м²":
+                width, height = round(rng.uniform(0.5, 6), 1), round(rng.uniform(0.5, 3), 1)
+                quantity = round(width * height, 2)
+            elif unit == "см":
+                quantity = rng.randrange(20, 120, 5)
+            elif unit == "лист":
+                quantity = max(min_order, rng.randrange(5, 60))
+            else:
+                quantity = max(min_order, rng.choice((1, 1, 2, 5, 10, 50, 100, 500)))
+            unit_price = dealer if client_type == "dealer" and dealer > 0 else retail
+            total = round(unit_price * quantity, 2)
+            material_qty = round(quantity * ratio, 3) if material_id else 0
+            total_price += total
+            material_cost += cost * quantity
+            items.append((out.new_id("order_items"), order_id, service_id, material_id, quantity, width, height,
+                          unit_price, total, material_qty, "{}"))
+
+        roll = rng.random()
+        if roll < 0.04:
+            path = (("design",) if rng.random() < 0.5 else ()) + ("cancelled",)
+        elif roll < 0.055:
+            path = ("production", "defect", "cancelled")
+        elif roll < 0.3:
+            path = LEGACY_FLOW
+        elif roll < 0.5:
+            path = FLOW[1:]
+        else:
+            path = FLOW
+        designer = self.pick(day, "designer") if "design" in path else None
+        master = self.pick(day, "master")
+        assistant = self.pick(day, "assistant") if "postprocess" in path or rng.random() < 0.4 else None
+
+        history = [(out.new_id("order_history"), order_id, None, "created", manager, "Заказ создан", created)]
+        reserved = [(item[3], item[9]) for item in items if item[3]]
+        for material_id, quantity in reserved:
+            self._material(material_id, quantity, second, day)
+            self.stock[material_id][1] += quantity
+            out.add("material_ledger", (out.new_id("material_ledger"), material_id, order_id, "reserve", -quantity,
+                                        "Резерв при создании заказа", manager, created))
+
+        status, at = "created", second
+        for new_status in path:
+            low, high = STEP_HOURS[new_status]
+            at += int(rng.uniform(low, high) * HOUR)
+            if at > self.end_second:
+                break
+            if new_status == "design_done" or (new_status == "production" and status in ("design", "design_done")):
+                by = designer or manager
+            elif new_status in ("printed", "ready") and status != "postprocess":
+                by = master
+            elif new_status in ("postprocess", "ready"):
+                by = assistant or master
+            else:
+                by = manager
+            when = self.ts(at)
+            history.append((out.new_id("order_history"), order_id, status, new_status, by, f"{status} -> {new_status}", when))
+            if new_status == "production":
+                for material_id, quantity in reserved:
+                    self.stock[material_id][0] -= quantity
+                    self.stock[material_id][1] -= quantity
+                    out.add("material_ledger", (out.new_id("material_ledger"), material_id, order_id, "consume",
+                                                -quantity, "Списание при печати", by, when))
+                reserved = []
+            elif new_status == "cancelled":
+                for material_id, quantity in reserved:
+                    self.stock[material_id][1] -= quantity
+                    out.add("material_ledger", (out.new_id("material_ledger"), material_id, order_id, "unreserve",
+                                                quantity, "Возврат при отмене заказа", by, when))
+                reserved = []
+            elif new_status == "defect":
+                self.incident(master, "defect", "Брак при печати", at, manager, order_id=order_id,
+                              waste=round(sum(item[9] for item in items), 3) or None,
+                              deduction=float(rng.choice((300, 500, 1000, 1500))))
+            elif new_status == "ready":
+                sent = at + rng.randrange(60, 2 * HOUR)
+                self.out.add("client_notifications", (
+                    out.new_id("client_notifications"), order_id, "manual", "Ваш заказ готов. Можете забирать. PolyControl.",
+                    "sent" if sent <= self.end_second else "queued", when, self.ts(sent) if sent <= self.end_second else None,
+                ))
+            status = new_status
+
+        deadline = self.days[min(day + rng.randint(1, 7), len(self.days) - 1)].isoformat()
+        out.add("orders", (
+            order_id, f"POL-{year}-{self.order_numbers[year]:03d}", name, phone, client_type, status,
+            round(total_price, 2), round(material_cost, 2), "Срочно" if rng.random() < 0.05 else None,
+            designer, master, assistant, deadline, manager, created, self.ts(at if at <= self.end_second else second),
+        ))
+        for item in items:
+            out.add("order_items", item)
+        for row in history:
+            out.add("order_history", row)
+
+    # -- working days ---------------------------------------------------------
+
+    def incident(self, user_id, kind, description, second, created_by, order_id=None, waste=None, deduction=0.0) -> None:
+        day = second // DAY
+        status = "reviewed" if day < len(self.days) - 14 else "pending"
+        self.out.add("incidents", (
+            self.out.new_id("incidents"), user_id, kind, description, order_id, waste, deduction, status,
+            created_by, self.ts(second),
+        ))
+        if deduction:
+            key = (user_id, day // 7)
+            self.deductions[key] = self.deductions.get(key, 0) + deduction
+
+    def working_day(self, day: int, shift_tasks: dict[str, list[int]]) -> None:
+        rng, out = self.rng, self.out
+        weekday = self.days[day].weekday()
+        last = day == len(self.days) - 1
+        managers = [employee["id"] for employee in self.active(day, "manager")] or [self.director_id]
+        for employee in self.active(day):
+            user_id = employee["id"]
+            if weekday == 6 or day in self.leave_days[user_id] or rng.random() > (0.6 if weekday == 5 else 0.96):
+                continue
+            check_in = day * DAY + 8 * HOUR + 45 * 60 + int(rng.gauss(0, 600))
+            if rng.random() < 0.07:
+                check_in += rng.randrange(20 * 60, 90 * 60)
+            check_out = check_in + int(8.5 * HOUR + rng.gauss(0, 1800))
+            out.add("attendance", (
+                out.new_id("attendance"), user_id, self.day_text[day], self.ts(check_in),
+                None if last and rng.random() < 0.5 else self.ts(check_out),
+            ))
+            week_key = (user_id, day // 7)
+            self.worked[week_key] = self.worked.get(week_key, 0) + 1
+            for task_id in shift_tasks.get(employee["role"], ()):
+                out.add("shift_task_logs", (out.new_id("shift_task_logs"), user_id, task_id, self.day_text[day],
+                                            1 if rng.random() < 0.9 else 0))
+            if check_in > day * DAY + 9 * HOUR + 10 * 60 and rng.random() < 0.5:
+                self.incident(user_id, "late", "Опоздание", check_in + 1800, rng.choice(managers),
+                              deduction=float(rng.choice((0, 100, 200))))
+            elif rng.random() < 0.003:
+                self.incident(user_id, rng.choice(("complaint", "other")), "Жалоба клиента",
+                              check_in + rng.randrange(8 * HOUR), rng.choice(managers), deduction=float(rng.choice((0, 500))))
+
+            tasks = [("daily", title) for title in rng.sample(DAILY_TASKS, rng.choices((0, 1, 2), (40, 45, 15))[0])]
+            if weekday == 0 and rng.random() < 0.35:
+                tasks.append(("weekly", rng.choice(WEEKLY_TASKS)))
+            for kind, title in tasks:
+                created = day * DAY + 8 * HOUR + rng.randrange(2 * HOUR)
+                due = day if kind == "daily" else min(day + 6, len(self.days) - 1)
+                done = created + (rng.randrange(HOUR, 9 * HOUR) if kind == "daily" else rng.randrange(DAY, 6 * DAY))
+                is_done = done <= self.end_second and rng.random() < 0.88
+                out.add("tasks", (
+                    out.new_id("tasks"), title, kind, user_id, rng.choice(managers), self.day_text[due],
+                    1 if is_done else 0, self.ts(done) if is_done else None, self.ts(created),
+                ))
+
+        if rng.random() < 0.4:
+            announced = day * DAY + 9 * HOUR + rng.randrange(8 * HOUR)
+            announcement_id = out.new_id("announcements")
+            target = rng.choice(self.employees)["id"] if rng.random() < 0.15 else None
+            out.add("announcements", (announcement_id, rng.choice(ANNOUNCEMENTS), target,
+                                      rng.choice(managers + [self.director_id]), self.ts(announced)))
+            readers = [target] if target else [employee["id"] for employee in self.active(day)]
+            for user_id in readers:
+                read = announced + rng.randrange(2 * DAY)
+                if read <= self.end_second and rng.random() < 0.85:
+                    out.add("announcement_reads", (out.new_id("announcement_reads"), announcement_id, user_id, self.ts(read)))
+
+        if weekday == 6:
+            self.payroll(day)
+
+    def payroll(self, sunday: int) -> None:
+        """Weekly pay for the week ending on this Sunday, paid the next morning."""
+        rng = self.rng
+        monday = sunday - 6
+        if monday < 0 or sunday + 1 >= len(self.days):
+            return
+        for employee in self.employees:
+            key = (employee["id"], sunday // 7)
+            worked = self.worked.get(key, 0)
+            if not worked:
+                continue
+            base = round(WEEKLY_SALARY[employee["role"]] * min(worked, 6) / 6, 2)
+            bonus = float(rng.choice((0, 0, 0, 500, 1000, 2000)))
+            deductions = self.deductions.get(key, 0.0)
+            paid = self.ts((sunday + 1) * DAY + 10 * HOUR)
+            self.out.add("payroll", (
+                self.out.new_id("payroll"), employee["id"], self.day_text[monday], self.day_text[sunday],
+                base, bonus, deductions, round(base + bonus - deductions, 2), 1, paid, self.director_id, paid,
+            ))
+
+    def training(self, count: int) -> None:
+        rng, out = self.rng, self.out
+        roles = [role for role, _ in ROLE_SHARES]
+        for n in range(count):
+            day = rng.randrange(len(self.days))
+            training_id = out.new_id("training")
+            role = rng.choice(roles) if rng.random() < 0.7 else None
+            created = day * DAY + 11 * HOUR
+            out.add("training", (training_id, f"Обучение №{n + 1}", None, f"https://youtu.be/training{n + 1:04d}",
+                                 role, self.director_id, 1 if rng.random() < 0.4 else 0, self.ts(created)))
+            for employee in self.active(day, role):
+                roll = rng.random()
+                watched = created + rng.randrange(20 * DAY)
+                if roll < 0.75 and watched <= self.end_second:
+                    out.add("training_progress", (out.new_id("training_progress"), training_id, employee["id"], 1, self.ts(watched)))
+                elif roll < 0.85:
+                    out.add("training_progress", (out.new_id("training_progress"), training_id, employee["id"], 0, None))
+
+    def price_history(self, services) -> None:
+        rng = self.rng
+        for service in services:
+            service_id, _, retail, dealer = service[:4]
+            for _ in range(rng.randint(1, 3)):
+                factor = rng.uniform(0.8, 1.0)
+                self.out.add("price_history", (
+                    self.out.new_id("price_history"), service_id, round(retail * factor), round(dealer * factor),
+                    self.director_id, self.ts(rng.randrange(len(self.days)) * DAY + 12 * HOUR),
+                ))
+
+
+def generate(
+    db, orders: int, employees: int = 60, years: int = 2, end: date | None = None, seed: int = 42, analyze: bool = True,
+) -> dict[str, int]:
+    """Bulk-load the dataset through an open connection (a get_db() handle); returns rows per table."""
+    from backend.auth import hash_password
+    from backend.rollups import rebuild_rollups
+
+    conn, engine = db._conn, db._engine
+    end = end or date.today()
+    first = end - timedelta(days=365 * years - 1)
+    days = [first + timedelta(days=n) for n in range(365 * years)]
+    rng = random.Random(seed)
+
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE role = 'director' ORDER BY id LIMIT 1")
+    director_id = cur.fetchone()[0]
+    cur.execute(
+        """SELECT s.id, s.unit, s.price_retail, s.price_dealer, s.cost_price, s.min_order, m.material_id, m.ratio, s.code
+           FROM services s LEFT JOIN service_material_map m ON m.service_id = s.id ORDER BY s.id"""
+    )
+    rows = cur.fetchall()
+    services = [tuple(row[:6]) + (row[6], row[7] or 0) for row in rows]
+    cum_weights = list(accumulate(SERVICE_WEIGHTS.get(row[8], 3) for row in rows))
+    cur.execute("SELECT id, quantity, reserved, roll_size FROM materials ORDER BY id")
+    stock = {row[0]: [row[1], row[2], row[3] or 50] for row in cur.fetchall()}
+    cur.execute("SELECT id, role FROM shift_tasks ORDER BY id")
+    shift_tasks: dict[str, list[int]] = {}
+    for task_id, role in cur.fetchall():
+        shift_tasks.setdefault(role, []).append(task_id)
+    if engine == "sqlite":
+        cur.execute("PRAGMA foreign_keys=OFF")
+        cur.execute("PRAGMA synchronous=OFF")
+    cur.close()
+
+    indexes = _drop_indexes(conn, engine)
+    loader = _Loader(conn, engine)
+    generator = _Generator(loader, rng, days, director_id)
+    generator.stock = stock
+    generator.users(employees, hash_password(EMPLOYEE_PASSWORD))
+    generator.leave_requests()
+    generator.training(max(10, 15 * years))
+    generator.price_history(services)
+    clients = _client_pool(rng, max(50, orders // 6))
+    counts = _day_counts(orders, days)
+    for day in range(len(days)):
+        for second in sorted(rng.randrange(8 * HOUR, 20 * HOUR) for _ in range(counts[day])):
+            generator.order(day * DAY + second, clients, services, cum_weights)
+        generator.working_day(day, shift_tasks)
+    loader.flush_all()
+
+    cur = conn.cursor()
+    for material_id, (quantity, reserved, _) in stock.items():
+        cur.execute(
+            "UPDATE materials SET quantity = %s, reserved = %s WHERE id = %s" if engine == "postgres"
+            else "UPDATE materials SET quantity = ?, reserved = ? WHERE id = ?",
+            (round(quantity, 3), round(reserved, 3), material_id),
+        )
+    for ddl in indexes:
+        cur.execute(ddl)
+    if engine == "postgres":
+        for table in COLUMNS:
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+    cur.close()
+    rebuild_rollups(db)
+    db.commit()
+    cur = conn.cursor()
+    if engine == "sqlite":
+        cur.execute("PRAGMA foreign_keys=ON")
+    if analyze:
+        cur.execute("ANALYZE")
+    cur.close()
+    db.commit()
+    return loader.counts
+
+
+def load_dataset(
+    orders: int = 100000, employees: int = 60, years: int = 2, end: date | None = None, seed: int = 42, analyze: bool = True,
+) -> dict[str, int]:
+    """init_db() and seed_db() on the configured (empty) database, then generate()."""
+    from backend.database import get_db, init_db
+    from backend.seed import seed_db
+
+    init_db()
+    seed_db()
+    db = get_db()
+    try:
+        if db.execute("SELECT 1 FROM orders LIMIT 1").fetchone():
+            raise RuntimeError("The database already has orders: generate into an empty one")
+        return generate(db, orders, employees=employees, years=years, end=end, seed=seed, analyze=analyze)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="SQLite file to create (without POLYCONTROL_DATABASE_URL)")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--employees", type=int, default=60)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="last day, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not (os.getenv("POLYCONTROL_DATABASE_URL") or os.getenv("DATABASE_URL")):
+        if not args.db:
+            parser.error("--db is required for SQLite")
+        os.environ["POLYCONTROL_DB_PATH"] = args.db
+
+    started = time.perf_counter()
+    counts = load_dataset(args.orders, employees=args.employees, years=args.years, end=args.end, seed=args.seed)
+    for table, count in counts.items():
+        print(f"{table:<22}{count:>12}")
+    print(f"loaded in {time.perf_counter() - started:.1f}s (seed {args.seed}, {args.years}y up to {args.end})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Range filters on TEXT timestamps vs. the integer created_day/done_day columns.
+
+Fills a throwaway SQLite DB with 2025 from benchmarks.dataset (1M orders by
+default: ~5M order_history rows, ~1.7M ledger rows), then runs each report filter in its old form (`created_at >= ?`,
+`created_at <= date_to || ' 23:59:59'`, `date(created_at)`) and against the
+indexed YYYYMMDD columns, checks both return the same rows and times them.
+No ANALYZE is run, as in the application database.
+
+    python -m benchmarks.day_columns --orders 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.dataset import BENCHMARK_END, load_dataset
+from benchmarks.report_fanout import _time
+
+MONTH = ("2025-06-01", "2025-06-30")
+MONTH_TS = (MONTH[0], MONTH[1] + " 23:59:59")  # the old `date_to || ' 23:59:59'` bound
+MONTH_DAYS = (20250601, 20250630)
+
+CASES = {
+    "orders export filter": (
+        "SELECT COUNT(*), SUM(total_price) FROM orders WHERE created_at >= ? AND created_at <= ?",
+        "SELECT COUNT(*), SUM(total_price) FROM orders WHERE created_day >= ? AND created_day <= ?",
+    ),
+    "orders per day": (
+        "SELECT date(created_at) AS d, COUNT(*) FROM orders WHERE created_at >= ? AND created_at <= ? GROUP BY date(created_at) ORDER BY d",
+        "SELECT created_day, COUNT(*) FROM orders WHERE created_day >= ? AND created_day <= ? GROUP BY created_day ORDER BY created_day",
+    ),
+    "material usage": (
+        """SELECT material_id, SUM(ABS(quantity)) FROM material_ledger
+           WHERE action = 'consume' AND created_at >= ? AND created_at <= ? GROUP BY material_id ORDER BY material_id""",
+        """SELECT material_id, SUM(ABS(quantity)) FROM material_ledger
+           WHERE action = 'consume' AND created_day >= ? AND created_day <= ? GROUP BY material_id ORDER BY material_id""",
+    ),
+    "payroll design_done": (
+        """SELECT changed_by, COUNT(*) FROM order_history
+           WHERE new_status = 'design_done' AND created_at BETWEEN ? AND ? GROUP BY changed_by ORDER BY changed_by""",
+        """SELECT changed_by, COUNT(*) FROM order_history
+           WHERE new_status = 'design_done' AND created_day BETWEEN ? AND ? GROUP BY changed_by ORDER BY changed_by""",
+    ),
+    "history per employee": (
+        "SELECT changed_by, COUNT(*) FROM order_history WHERE created_at BETWEEN ? AND ? GROUP BY changed_by ORDER BY changed_by",
+        "SELECT changed_by, COUNT(*) FROM order_history WHERE created_day BETWEEN ? AND ? GROUP BY changed_by ORDER BY changed_by",
+    ),
+    "incidents": (
+        "SELECT user_id, COUNT(*), SUM(deduction_amount) FROM incidents WHERE created_at BETWEEN ? AND ? GROUP BY user_id ORDER BY user_id",
+        "SELECT user_id, COUNT(*), SUM(deduction_amount) FROM incidents WHERE created_day BETWEEN ? AND ? GROUP BY user_id ORDER BY user_id",
+    ),
+    "journal tasks done": (
+        """SELECT assigned_to, COUNT(*) FROM tasks
+           WHERE is_done = 1 AND done_at IS NOT NULL AND done_at BETWEEN ? AND ? GROUP BY assigned_to ORDER BY assigned_to""",
+        """SELECT assigned_to, COUNT(*) FROM tasks
+           WHERE is_done = 1 AND done_day BETWEEN ? AND ? GROUP BY assigned_to ORDER BY assigned_to""",
+    ),
+}
+
+
+def _normalize(rows):
+    # date(created_at) -> 'YYYY-MM-DD', created_day -> YYYYMMDD: compare as digits.
+    # Sums are rounded: another scan order adds the floats in another order.
+    return [
+        tuple(str(v).replace("-", "") if i == 0 else round(v, 2) for i, v in enumerate(dict(r).values()))
+        for r in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="day-columns-bench-")
+    os.environ["POLYCONTROL_DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(tmpdir, "uploads")
+    os.environ.pop("POLYCONTROL_DATABASE_URL", None)
+    os.environ.pop("DATABASE_URL", None)
+    from backend.database import get_db
+
+    started = time.perf_counter()
+    load_dataset(args.orders, employees=args.employees, years=1, end=BENCHMARK_END, analyze=False)
+    print(f"dataset: {args.orders} orders, {args.employees} employees ({time.perf_counter() - started:.1f}s)")
+
+    def run(query, params):
+        db = get_db()
+        rows = db.execute(query, params).fetchall()
+        db.close()
+        return rows
+
+    print(f"month {MONTH[0]}..{MONTH[1]}")
+    print(f"{'case':<24}{'TEXT ms':>10}{'day ms':>10}{'speedup':>10}")
+    for name, (text_query, day_query) in CASES.items():
+        if _normalize(run(text_query, MONTH_TS)) != _normalize(run(day_query, MONTH_DAYS)):
+            raise SystemExit(f"{name}: results differ")
+        text_ms = _time(lambda: run(text_query, MONTH_TS), args.repeat)
+        day_ms = _time(lambda: run(day_query, MONTH_DAYS), args.repeat)
+        print(f"{name:<24}{text_ms:>10.1f}{day_ms:>10.1f}{text_ms / day_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
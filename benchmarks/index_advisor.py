@@ -0,0 +1,186 @@
+"""Index advice for the queries the API runs (see backend/index_advisor.py).
+
+Fills a throwaway SQLite DB with 2025 from benchmarks.dataset (or uses the
+database from POLYCONTROL_DATABASE_URL as is, then only GET requests are
+made), walks the API with a TestClient while collecting the distinct
+queries, and plans them.
+
+    python -m benchmarks.index_advisor --orders 20000
+    python -m benchmarks.index_advisor --json index-advice.json
+
+As a CI gate: accept the current proposals once, then fail (exit code 1)
+when a query added later needs an index that is not in the baseline.
+
+    python -m benchmarks.index_advisor --write-baseline index-advice-baseline.json
+    python -m benchmarks.index_advisor --baseline index-advice-baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.dataset import BENCHMARK_END, load_dataset
+
+
+def _reads(today: date, order_id, material_id, user_id) -> list[str]:
+    month_ago = today - timedelta(days=30)
+    year_ago = today - timedelta(days=365)
+    period = f"date_from={month_ago}&date_to={today}"
+    paths = [
+        "/api/auth/me",
+        "/api/orders?limit=100&offset=0",
+        "/api/orders?status=production&limit=50",
+        "/api/orders?search=POL-2025-1&limit=50",
+        "/api/pricelist",
+        "/api/inventory",
+        "/api/inventory/alerts",
+        "/api/hr/attendance/today",
+        f"/api/hr/attendance?{period}",
+        "/api/hr/my-attendance",
+        "/api/hr/shift-tasks",
+        "/api/hr/shift-tasks/catalog",
+        "/api/hr/shift-tasks/report?role=master",
+        "/api/hr/incidents?status=pending",
+        "/api/hr/incidents",
+        "/api/payroll",
+        f"/api/payroll/month-report?month_start={today.replace(day=1)}&month_end={today}",
+        f"/api/payroll/week-report?week_start={today - timedelta(days=today.weekday())}",
+        "/api/users",
+        "/api/tasks?type=daily",
+        "/api/tasks",
+        "/api/training",
+        "/api/training/progress",
+        "/api/announcements",
+        "/api/leave-requests",
+        f"/api/work-journal?{period}",
+        f"/api/dashboard?{period}",
+        f"/api/reports/orders-summary?{period}",
+        f"/api/reports/material-usage?{period}",
+        f"/api/reports/employee-stats?{period}",
+        f"/api/reports/finance?date_from={year_ago}&date_to={today}",
+        f"/api/reports/orders-export.csv?{period}",
+    ]
+    if order_id:
+        paths.append(f"/api/orders/{order_id}")
+    if material_id:
+        paths.append(f"/api/inventory/{material_id}/ledger")
+    if user_id:
+        paths.append(f"/api/hr/attendance?{period}&user_id={user_id}")
+    return paths
+
+
+def _writes(client, headers, services, material_id, today: date) -> None:
+    """One of each common write, so their UPDATE/DELETE ... WHERE get planned too."""
+    if material_id:
+        client.post(f"/api/inventory/{material_id}/receive", json={"quantity": 1000}, headers=headers)
+    order = client.post(
+        "/api/orders",
+        json={"client_name": "Index advisor", "items": [{"service_id": services[0]["id"], "quantity": 1, "width": 1, "height": 1}]},
+        headers=headers,
+    ).json()
+    if "id" in order:
+        client.patch(f"/api/orders/{order['id']}/status", json={"status": "production"}, headers=headers)
+        client.put(f"/api/orders/{order['id']}", json={"notes": "index advisor"}, headers=headers)
+    user = client.post(
+        "/api/users",
+        json={"username": f"advisor{int(time.time())}", "password": "advisor", "full_name": "Index advisor", "role": "master"},
+        headers=headers,
+    ).json()
+    client.post("/api/hr/checkin", headers=headers)
+    client.post("/api/hr/checkout", headers=headers)
+    if "id" in user:
+        incident = client.post(
+            "/api/hr/incidents",
+            json={"user_id": user["id"], "type": "late", "description": "index advisor", "deduction_amount": 100},
+            headers=headers,
+        ).json()
+        if "id" in incident:
+            client.patch(f"/api/hr/incidents/{incident['id']}/review", headers=headers)
+        task = client.post("/api/tasks", json={"title": "index advisor", "assigned_to": user["id"]}, headers=headers).json()
+        if "id" in task:
+            client.patch(f"/api/tasks/{task['id']}/done", headers=headers)
+        client.post(
+            "/api/leave-requests",
+            json={"user_id": user["id"], "type": "rest", "reason": "index advisor", "date_start": str(today + timedelta(days=7)), "days_count": 2},
+            headers=headers,
+        )
+    training = client.post("/api/training", json={"title": "index advisor", "youtube_url": "http://example.com"}, headers=headers).json()
+    if "id" in training:
+        client.patch(f"/api/training/{training['id']}/watch", headers=headers)
+    announcement = client.post("/api/announcements", json={"message": "index advisor"}, headers=headers).json()
+    if "id" in announcement:
+        client.post(f"/api/announcements/{announcement['id']}/read", headers=headers)
+
+
+def run_workload(username: str, password: str, writes: bool) -> None:
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"username": username, "password": password})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        orders = client.get("/api/orders?limit=1", headers=headers).json().get("orders") or []
+        materials = client.get("/api/inventory", headers=headers).json()
+        users = client.get("/api/users", headers=headers).json()
+        services = client.get("/api/pricelist", headers=headers).json()
+        material_id = materials[0]["id"] if materials else None
+        today = date.today()
+        if writes and services:
+            _writes(client, headers, services, material_id, today)
+        user_id = users[-1]["id"] if users else None
+        for path in _reads(today, orders[0]["id"] if orders else None, material_id, user_id):
+            client.get(path, headers=headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--min-rows", type=int, default=None, help="smaller tables get no proposal")
+    parser.add_argument("--json", help="also write the report as JSON to this file")
+    parser.add_argument("--baseline", help="fail on improving proposals not listed in this file")
+    parser.add_argument("--write-baseline", help="accept the current proposals into this file")
+    args = parser.parse_args()
+
+    throwaway = not (os.getenv("POLYCONTROL_DATABASE_URL") or os.getenv("DATABASE_URL"))
+    if throwaway:
+        tmpdir = tempfile.mkdtemp(prefix="index-advisor-")
+        os.environ["POLYCONTROL_DB_PATH"] = os.path.join(tmpdir, "advisor.db")
+        os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(tmpdir, "uploads")
+        load_dataset(args.orders, employees=args.employees, years=1, end=BENCHMARK_END)
+
+    from backend.index_advisor import MIN_ROWS, analyze, collect_queries, format_report, new_proposals
+
+    with collect_queries() as queries:
+        run_workload(args.username, args.password, writes=throwaway)
+    report = analyze(queries, min_rows=MIN_ROWS if args.min_rows is None else args.min_rows)
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.write_baseline:
+        accepted = sorted(proposal["index"] for proposal in report["proposals"] if proposal["improves"])
+        with open(args.write_baseline, "w", encoding="utf-8") as f:
+            json.dump(accepted, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            missing = new_proposals(report, json.load(f))
+        if missing:
+            print("\nНовые индексы, которых нет в baseline:", file=sys.stderr)
+            for proposal in missing:
+                print(f"  {proposal['sql']};", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
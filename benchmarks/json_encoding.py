@@ -0,0 +1,91 @@
+"""JSON encoding of the largest API responses: jsonable_encoder + json vs. fast_json.dumps.
+
+Fills a throwaway SQLite DB with 2025 from benchmarks.dataset, takes the
+data the handlers return for the orders list (100 orders with items), the
+month work journal (31 days x all employees) and the payroll month report
+with its incidents, checks both encoders produce the same bytes and times
+the handler and each encoder.
+
+    python -m benchmarks.json_encoding --orders 50000
+"""
+import argparse
+import inspect
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.dataset import BENCHMARK_END, load_dataset
+from benchmarks.report_fanout import _time
+
+MONTH = ("2025-06-01", "2025-06-30")
+
+
+def _stdlib_encode(content) -> bytes:
+    # What FastAPI's default path does: serialize_response + JSONResponse.render.
+    from fastapi.encoders import jsonable_encoder
+
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="json-bench-")
+    os.environ["POLYCONTROL_DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(tmpdir, "uploads")
+    os.environ.pop("POLYCONTROL_DATABASE_URL", None)
+    os.environ.pop("DATABASE_URL", None)
+    from backend.database import get_db
+    from backend.fast_json import dumps, orjson
+    from backend.routers import orders, payroll, work_journal
+
+    started = time.perf_counter()
+    load_dataset(args.orders, employees=args.employees, years=1, end=BENCHMARK_END)
+    print(f"dataset: {args.orders} orders, {args.employees} employees ({time.perf_counter() - started:.1f}s)")
+    print(f"fast encoder: {'orjson ' + orjson.__version__ if orjson else 'stdlib json (orjson not installed)'}")
+
+    db = get_db()
+    director = dict(db.execute("SELECT * FROM users WHERE role = 'director' LIMIT 1").fetchone())
+    db.close()
+
+    # The undecorated handlers: no response cache, no single-flight.
+    handlers = {
+        "orders list": lambda: inspect.unwrap(orders.list_orders)(
+            status="", search="", assigned="", limit=100, offset=0, user=director,
+        ),
+        "work journal month": lambda: inspect.unwrap(work_journal.get_work_journal)(
+            date_from=MONTH[0], date_to=MONTH[1], user_id=0, sort_by="", sort_dir="desc", user=director,
+        ),
+        "payroll month report": lambda: inspect.unwrap(payroll.month_report)(
+            month_start=MONTH[0], month_end=MONTH[1], user=director,
+        ),
+    }
+
+    print(f"{'endpoint':<22}{'KB':>8}{'handler ms':>12}{'stdlib ms':>11}{'fast ms':>9}{'speedup':>9}")
+    for name, handler in handlers.items():
+        content = handler()
+        body = _stdlib_encode(content)
+        if dumps(content) != body:
+            raise SystemExit(f"{name}: encoded bodies differ")
+        handler_ms = _time(handler, max(args.repeat // 4, 1))
+        stdlib_ms = _time(lambda: _stdlib_encode(content), args.repeat)
+        fast_ms = _time(lambda: dumps(content), args.repeat)
+        print(
+            f"{name:<22}{len(body) / 1024:>8.0f}{handler_ms:>12.1f}{stdlib_ms:>11.2f}{fast_ms:>9.2f}"
+            f"{stdlib_ms / fast_ms:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
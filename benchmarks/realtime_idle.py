@@ -0,0 +1,148 @@
+"""Idle CPU of the SSE broker with many connected clients.
+
+Starts uvicorn in a subprocess on a throwaway SQLite DB, opens N
+`/api/realtime/stream` connections and measures the server's CPU time while
+nothing is published (only heartbeats flow).
+
+    python -m benchmarks.realtime_idle --clients 1000 --seconds 60
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _process_cpu_seconds(pid: int) -> float:
+    # Linux only: utime + stime from /proc/<pid>/stat, in clock ticks.
+    with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf(os.sysconf_names["SC_CLK_TCK"])
+    return (int(fields[11]) + int(fields[12])) / ticks
+
+
+def _wait_server(base_url: str, timeout: float = 30) -> None:
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            with urllib.request.urlopen(base_url + "/api/auth/me", timeout=2):
+                return
+        except urllib.error.HTTPError:
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+async def _client(host: str, port: int, token: str, ready: asyncio.Event, counter: dict, stop: asyncio.Event):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        (
+            "GET /api/realtime/stream HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Authorization: Bearer {token}\r\n"
+            "Accept: text/event-stream\r\n\r\n"
+        ).encode()
+    )
+    await writer.drain()
+    await reader.readuntil(b"event: hello")
+    counter["connected"] += 1
+    if counter["connected"] == counter["target"]:
+        ready.set()
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(4096)
+            if not chunk:
+                break
+            counter["pings"] += chunk.count(b": ping")
+    finally:
+        writer.close()
+
+
+async def _run(host: str, port: int, token: str, clients: int, seconds: float, pid: int) -> dict:
+    ready = asyncio.Event()
+    stop = asyncio.Event()
+    counter = {"connected": 0, "target": clients, "pings": 0}
+    tasks = [asyncio.create_task(_client(host, port, token, ready, counter, stop)) for _ in range(clients)]
+    await asyncio.wait_for(ready.wait(), timeout=120)
+
+    # Let connection setup settle before measuring.
+    await asyncio.sleep(2)
+    cpu_before = _process_cpu_seconds(pid)
+    wall_before = time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu_after = _process_cpu_seconds(pid)
+    wall = time.perf_counter() - wall_before
+
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    cpu = cpu_after - cpu_before
+    return {
+        "clients": clients,
+        "seconds": round(wall, 1),
+        "server_cpu_seconds": round(cpu, 3),
+        "server_cpu_percent": round(cpu / wall * 100, 2),
+        "pings_received": counter["pings"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--heartbeat", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8011)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = args.clients * 2 + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+    tmpdir = tempfile.mkdtemp(prefix="realtime-bench-")
+    env = dict(os.environ)
+    env.update({
+        "POLYCONTROL_DATABASE_URL": "",
+        "DATABASE_URL": "",
+        "POLYCONTROL_DB_PATH": os.path.join(tmpdir, "bench.db"),
+        "POLYCONTROL_UPLOAD_DIR": os.path.join(tmpdir, "uploads"),
+        "POLYCONTROL_REALTIME_HEARTBEAT": str(args.heartbeat),
+    })
+    os.environ.update(env)
+
+    host = "127.0.0.1"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", host, "--port", str(args.port),
+         "--log-level", "warning", "--backlog", str(args.clients + 128)],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        _wait_server(f"http://{host}:{args.port}")
+
+        from backend.auth import create_token
+
+        token = create_token(1, "director")
+        result = asyncio.run(_run(host, args.port, token, args.clients, args.seconds, server.pid))
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=8)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == "__main__":
+    main()
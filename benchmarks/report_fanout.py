@@ -0,0 +1,71 @@
+"""Latency of report builders with sequential vs. fanned-out queries.
+
+Fills a throwaway SQLite DB with 2025 from benchmarks.dataset (or uses the
+database from POLYCONTROL_DATABASE_URL as is, e.g. a loaded Postgres copy)
+and times _build_finance_data, payroll _period_report and the work journal
+sequentially and with --workers fan-out threads.
+
+    python -m benchmarks.report_fanout --orders 200000 --workers 4
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+
+def _time(fn, repeat: int) -> float:
+    fn()  # warm up page cache
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not (os.getenv("POLYCONTROL_DATABASE_URL") or os.getenv("DATABASE_URL")):
+        tmpdir = tempfile.mkdtemp(prefix="fanout-bench-")
+        os.environ["POLYCONTROL_DB_PATH"] = os.path.join(tmpdir, "bench.db")
+        os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(tmpdir, "uploads")
+        from benchmarks.dataset import BENCHMARK_END, load_dataset
+
+        started = time.perf_counter()
+        load_dataset(args.orders, employees=args.employees, years=1, end=BENCHMARK_END)
+        print(f"dataset: {args.orders} orders, {args.employees} employees ({time.perf_counter() - started:.1f}s)")
+
+    import backend.database as database
+    from backend.routers.payroll import _period_report
+    from backend.routers.reports import _build_finance_data
+    from backend.routers.work_journal import get_work_journal
+
+    # Bypass the response cache: measure the builders themselves.
+    journal = get_work_journal.__wrapped__
+    cases = {
+        "finance (year)": lambda: _build_finance_data("2025-01-01", "2025-12-31"),
+        "payroll period (year)": lambda: _period_report("2025-01-01", "2025-12-31"),
+        "work journal (month)": lambda: journal(
+            date_from="2025-06-01", date_to="2025-06-30", user_id=0, sort_by="", sort_dir="desc", user={"role": "director"},
+        ),
+    }
+
+    workers = args.workers
+    print(f"{'case':<24}{'sequential ms':>15}{f'fan-out x{workers} ms':>18}{'speedup':>10}")
+    for name, fn in cases.items():
+        database.QUERY_FANOUT_WORKERS = 1
+        sequential = _time(fn, args.repeat)
+        database.QUERY_FANOUT_WORKERS = workers
+        parallel = _time(fn, args.repeat)
+        print(f"{name:<24}{sequential:>15.1f}{parallel:>18.1f}{sequential / parallel:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,17 @@ const ROUTE_CHANNELS = {
     '/leave-requests': ['leave-requests', 'work-journal'],
 };
 
+// Channels every screen listens to regardless of route (global toasts).
+const GLOBAL_CHANNELS = ['announcements'];
+
+function realtimeTransport() {
+    return localStorage.getItem('pc_realtime_transport') === 'ws' ? 'ws' : 'sse';
+}
+
+function routeRealtimeChannels(route) {
+    return [...new Set([...GLOBAL_CHANNELS, ...(ROUTE_CHANNELS[route] || [])])];
+}
+
 function snapshotLegacyState() {
     return {
         token: state.token,
@@ -60,6 +71,7 @@ export default function App() {
     const lastAnnouncementCheckRef = useRef(0);
     const routeInfoRef = useRef(routeInfo);
     const refreshTimerRef = useRef(null);
+    const realtimeRef = useRef(null);
     const [session, setSession] = useState(() => {
         loadState(false);
         return snapshotLegacyState();
@@ -154,15 +166,37 @@ export default function App() {
     useEffect(() => {
         if (!session.token) return undefined;
 
-        const cleanup = connectRealtime(session.token, {
+        const scheduleRefresh = () => {
+            clearTimeout(refreshTimerRef.current);
+            refreshTimerRef.current = window.setTimeout(() => {
+                startTransition(() => {
+                    setRefreshVersion((value) => value + 1);
+                });
+            }, 120);
+        };
+
+        const connection = connectRealtime(session.token, {
+            transport: realtimeTransport(),
+            channels: routeRealtimeChannels(routeInfoRef.current.route),
             onEvent(event) {
                 if (event.type === 'hello') {
                     return;
                 }
 
+                if (event.type === 'resync') {
+                    // The server dropped events for this tab: nothing cached can be trusted.
+                    api.clearCache();
+                    scheduleRefresh();
+                    return;
+                }
+
                 for (const prefix of event.cache_prefixes || []) {
                     api.clearCache(prefix);
                 }
+                if (event.kind === 'cache.refreshed' && event.payload?.prefix) {
+                    // A report served stale was recomputed on the server.
+                    api.clearCache(event.payload.prefix);
+                }
 
                 window.dispatchEvent(new CustomEvent('pc:realtime', {
                     detail: event,
@@ -185,21 +219,29 @@ export default function App() {
                     return;
                 }
 
-                clearTimeout(refreshTimerRef.current);
-                refreshTimerRef.current = window.setTimeout(() => {
-                    startTransition(() => {
-                        setRefreshVersion((value) => value + 1);
-                    });
-                }, 120);
+                scheduleRefresh();
             },
         });
 
+        realtimeRef.current = connection;
+
         return () => {
             clearTimeout(refreshTimerRef.current);
-            cleanup();
+            realtimeRef.current = null;
+            connection.close();
         };
     }, [session.token]);
 
+    useEffect(() => {
+        const connection = realtimeRef.current;
+        if (!connection) return;
+
+        // Events for channels we were not subscribed to never reached this tab,
+        // so cached GETs from other screens may be stale.
+        api.clearCache();
+        connection.setChannels(routeRealtimeChannels(routeInfo.route));
+    }, [routeInfo.route]);
+
     const shouldRenderPage = session.token || routeInfo.route === '/login';
     const renderKey = `${routeInfo.hash}:${refreshVersion}`;
 
@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { api } from '@legacy/api.js';
 import { showToast } from '@legacy/components/toast.js';
 import { state } from '@legacy/state.js';
@@ -246,7 +246,7 @@ function TasksCard({ tasks, onToggle }) {
     );
 }
 
-async function exportFinanceCsv(range) {
+async function exportCsv(path, filePrefix, range) {
     if (!range.from || !range.to) {
         showToast('Укажите диапазон дат', 'warning');
         return;
@@ -254,7 +254,7 @@ async function exportFinanceCsv(range) {
 
     try {
         const q = new URLSearchParams({ date_from: range.from, date_to: range.to }).toString();
-        const res = await fetch(`/api/reports/finance-export.csv?${q}`, {
+        const res = await fetch(`${path}?${q}`, {
             headers: { Authorization: `Bearer ${state.token}` },
         });
 
@@ -271,7 +271,7 @@ async function exportFinanceCsv(range) {
         const url = URL.createObjectURL(blob);
         const link = document.createElement('a');
         link.href = url;
-        link.download = `finance_${range.from}_${range.to}.csv`;
+        link.download = `${filePrefix}_${range.from}_${range.to}.csv`;
         document.body.appendChild(link);
         link.click();
         link.remove();
@@ -293,32 +293,37 @@ export default function DashboardPage({ refreshToken = 0 }) {
     const [tasks, setTasks] = useState([]);
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
+    // Last received data and version of every /api/dashboard widget.
+    const widgetsRef = useRef({});
 
     const activeRange = getActiveRange(activePeriod, customRangeApplied);
 
     useEffect(() => {
         let alive = true;
+        api.clearCache('/api/dashboard');
 
         async function loadDashboard() {
             setIsLoading(true);
             setError('');
 
             try {
-                const requests = [];
-                if (isDirector) {
-                    requests.push(api.get(`/api/reports/finance?date_from=${activeRange.from}&date_to=${activeRange.to}`));
-                } else if (canUsePeriods) {
-                    requests.push(api.get(`/api/reports/orders-summary?date_from=${activeRange.from}&date_to=${activeRange.to}`));
-                } else {
-                    requests.push(Promise.resolve(null));
-                }
-                requests.push(api.get('/api/tasks?done=0'));
-
-                const [nextSummary, nextTasks] = await Promise.all(requests);
+                const known = widgetsRef.current;
+                const versions = Object.entries(known)
+                    .map(([name, widget]) => `${name}:${widget.version}`)
+                    .join(',');
+                const params = new URLSearchParams({ date_from: activeRange.from, date_to: activeRange.to, versions });
+                const response = await api.get(`/api/dashboard?${params}`);
                 if (!alive) return;
 
-                setSummary(nextSummary);
-                setTasks(nextTasks || []);
+                // Unchanged widgets come without data: keep what we already have.
+                const next = {};
+                for (const [name, widget] of Object.entries(response.widgets)) {
+                    next[name] = widget.unchanged ? known[name] : widget;
+                }
+                widgetsRef.current = next;
+
+                setSummary(next.summary?.data ?? null);
+                setTasks(next.tasks?.data || []);
             } catch {
                 if (!alive) return;
                 setError('Ошибка загрузки');
@@ -421,11 +426,18 @@ export default function DashboardPage({ refreshToken = 0 }) {
                 ) : null}
 
                 {isDirector ? (
-                    <div className="flex justify-end">
+                    <div className="flex justify-end gap-2">
+                        <button
+                            type="button"
+                            className="btn btn-secondary btn-sm"
+                            onClick={() => exportCsv('/api/reports/orders-export.csv', 'orders', activeRange)}
+                        >
+                            Строки заказов CSV
+                        </button>
                         <button
                             type="button"
                             className="btn btn-secondary btn-sm"
-                            onClick={() => exportFinanceCsv(activeRange)}
+                            onClick={() => exportCsv('/api/reports/finance-export.csv', 'finance', activeRange)}
                         >
                             Экспорт CSV
                         </button>
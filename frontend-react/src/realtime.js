@@ -1,11 +1,14 @@
-export function connectRealtime(token, { onEvent, onStatusChange } = {}) {
-    if (!token) {
-        return () => {};
-    }
+function channelsQuery(channels) {
+    if (!channels || !channels.length) return '';
+    return `?channels=${encodeURIComponent(channels.join(','))}`;
+}
 
+function connectEventStream(token, { channels, onEvent, onStatusChange }) {
     let stopped = false;
     let controller = null;
     let reconnectTimer = null;
+    let subscriptionId = null;
+    let currentChannels = channels;
 
     const scheduleReconnect = () => {
         if (stopped) return;
@@ -17,6 +20,9 @@ export function connectRealtime(token, { onEvent, onStatusChange } = {}) {
         if (!dataLines.length) return;
         try {
             const payload = JSON.parse(dataLines.join('\n'));
+            if (eventName === 'hello') {
+                subscriptionId = payload.subscription_id || null;
+            }
             onEvent?.({
                 type: eventName || 'message',
                 ...payload,
@@ -76,7 +82,8 @@ export function connectRealtime(token, { onEvent, onStatusChange } = {}) {
         onStatusChange?.('connecting');
 
         try {
-            const response = await fetch('/api/realtime/stream', {
+            subscriptionId = null;
+            const response = await fetch(`/api/realtime/stream${channelsQuery(currentChannels)}`, {
                 method: 'GET',
                 headers: {
                     Authorization: `Bearer ${token}`,
@@ -98,11 +105,136 @@ export function connectRealtime(token, { onEvent, onStatusChange } = {}) {
         scheduleReconnect();
     };
 
+    const setChannels = async (nextChannels) => {
+        currentChannels = nextChannels;
+        if (stopped || !subscriptionId) return;
+
+        try {
+            await fetch(`/api/realtime/subscriptions/${subscriptionId}`, {
+                method: 'PUT',
+                headers: {
+                    Authorization: `Bearer ${token}`,
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ channels: nextChannels || [] }),
+            });
+        } catch (error) {
+            // The next reconnect sends the current channels in the query string anyway.
+            console.error('Realtime subscription update error:', error);
+        }
+    };
+
     connect();
 
-    return () => {
-        stopped = true;
+    return {
+        setChannels,
+        close() {
+            stopped = true;
+            clearTimeout(reconnectTimer);
+            controller?.abort();
+        },
+    };
+}
+
+function decodeFrame(frame, tables) {
+    if (frame === 0) {
+        return null;
+    }
+    if (!Array.isArray(frame)) {
+        return { type: frame.t || 'message', ...frame };
+    }
+
+    const [id, kind, channelIds = [], prefixIds = [], payload = {}] = frame;
+    if (kind === 'realtime.resync') {
+        return { type: 'resync', id, kind };
+    }
+    return {
+        type: 'update',
+        id,
+        kind,
+        channels: channelIds.map((c) => (typeof c === 'number' ? tables.channels[c] : c)),
+        cache_prefixes: prefixIds.map((p) => (typeof p === 'number' ? tables.prefixes[p] : p)),
+        payload,
+    };
+}
+
+function connectWebSocket(token, { channels, onEvent, onStatusChange }) {
+    let stopped = false;
+    let socket = null;
+    let reconnectTimer = null;
+    let currentChannels = channels;
+    let tables = { channels: [], prefixes: [] };
+
+    const scheduleReconnect = () => {
+        if (stopped) return;
         clearTimeout(reconnectTimer);
-        controller?.abort();
+        reconnectTimer = window.setTimeout(connect, 2000);
+    };
+
+    const connect = () => {
+        if (stopped) return;
+
+        onStatusChange?.('connecting');
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        socket = new WebSocket(`${protocol}//${window.location.host}/api/realtime/ws`);
+
+        socket.onopen = () => {
+            socket.send(JSON.stringify({ token, channels: currentChannels || [] }));
+        };
+
+        socket.onmessage = (message) => {
+            let event;
+            try {
+                const frame = JSON.parse(message.data);
+                if (frame && frame.t === 'hello') {
+                    tables = { channels: frame.channels || [], prefixes: frame.prefixes || [] };
+                    onStatusChange?.('connected');
+                }
+                event = decodeFrame(frame, tables);
+            } catch (error) {
+                console.error('Realtime parse error:', error);
+                return;
+            }
+            if (event) {
+                onEvent?.(event);
+            }
+        };
+
+        socket.onclose = () => {
+            socket = null;
+            if (stopped) return;
+            onStatusChange?.('reconnecting');
+            scheduleReconnect();
+        };
+    };
+
+    connect();
+
+    return {
+        setChannels(nextChannels) {
+            currentChannels = nextChannels;
+            if (socket?.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify({ channels: nextChannels || [] }));
+            }
+        },
+        close() {
+            stopped = true;
+            clearTimeout(reconnectTimer);
+            socket?.close();
+        },
     };
 }
+
+// transport: 'sse' (default) or 'ws' — compact WebSocket frames, does not hold
+// one of the browser's per-origin HTTP/1.1 connections.
+export function connectRealtime(token, { transport = 'sse', channels = null, onEvent, onStatusChange } = {}) {
+    if (!token) {
+        return { close() {}, setChannels() {} };
+    }
+
+    const options = { channels, onEvent, onStatusChange };
+    if (transport === 'ws' && typeof WebSocket !== 'undefined') {
+        return connectWebSocket(token, options);
+    }
+    return connectEventStream(token, options);
+}
@@ -0,0 +1,55 @@
+import fs from 'node:fs';
+import path from 'node:path';
+import zlib from 'node:zlib';
+
+// Writes .br and .gz next to every text asset of the build; the backend
+// serves them to clients that accept the encoding (backend/compression.py).
+const COMPRESSIBLE = new Set(['.js', '.mjs', '.css', '.html', '.svg', '.json', '.txt', '.webmanifest']);
+const MIN_BYTES = 1024;
+
+function walk(dir) {
+    return fs.readdirSync(dir, { withFileTypes: true }).flatMap((entry) => {
+        const full = path.join(dir, entry.name);
+        return entry.isDirectory() ? walk(full) : [full];
+    });
+}
+
+export function precompressDir(dir) {
+    let written = 0;
+    for (const file of walk(dir)) {
+        if (!COMPRESSIBLE.has(path.extname(file))) continue;
+        const source = fs.readFileSync(file);
+        if (source.length < MIN_BYTES) continue;
+        const variants = [
+            ['.br', zlib.brotliCompressSync(source, {
+                params: {
+                    [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+                    [zlib.constants.BROTLI_PARAM_SIZE_HINT]: source.length,
+                },
+            })],
+            ['.gz', zlib.gzipSync(source, { level: zlib.constants.Z_BEST_COMPRESSION })],
+        ];
+        for (const [suffix, compressed] of variants) {
+            // Not worth a Content-Encoding if it barely shrinks.
+            if (compressed.length >= source.length * 0.9) continue;
+            fs.writeFileSync(file + suffix, compressed);
+            written += 1;
+        }
+    }
+    return written;
+}
+
+export default function precompress() {
+    let outDir = 'dist';
+    return {
+        name: 'polycontrol-precompress',
+        apply: 'build',
+        configResolved(config) {
+            outDir = path.resolve(config.root, config.build.outDir);
+        },
+        closeBundle() {
+            const written = precompressDir(outDir);
+            console.log(`precompress: ${written} .br/.gz files in ${outDir}`);
+        },
+    };
+}
@@ -2,11 +2,12 @@ import path from 'node:path';
 import { fileURLToPath } from 'node:url';
 import { defineConfig } from 'vite';
 import react from '@vitejs/plugin-react';
+import precompress from './vite-plugin-precompress.js';
 
 const __dirname = path.dirname(fileURLToPath(import.meta.url));
 
 export default defineConfig({
-    plugins: [react()],
+    plugins: [react(), precompress()],
     resolve: {
         alias: {
             '@legacy': path.resolve(__dirname, '../frontend/js'),
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import json
 import os
@@ -24,11 +25,19 @@ class HttpError(Exception):
     pass
 
 
-def prepare_perf_db():
-    src = os.path.join(ROOT, "polycontrol.db")
-    if os.path.exists(PERF_DB_PATH):
-        os.remove(PERF_DB_PATH)
-    shutil.copyfile(src, PERF_DB_PATH)
+def prepare_perf_db(orders, employees, years, copy_db=False):
+    """Fresh polycontrol.perf.db: generated history up to today, or a copy of polycontrol.db."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(PERF_DB_PATH + suffix):
+            os.remove(PERF_DB_PATH + suffix)
+    if copy_db:
+        shutil.copyfile(os.path.join(ROOT, "polycontrol.db"), PERF_DB_PATH)
+        return {"source": "polycontrol.db"}
+    from benchmarks.dataset import load_dataset
+
+    started = time.perf_counter()
+    counts = load_dataset(orders, employees=employees, years=years, end=date.today())
+    return {"source": "benchmarks.dataset", "seconds": round(time.perf_counter() - started, 1), "rows": counts}
 
 
 def ensure_diag_user():
@@ -375,44 +384,11 @@ async def run_frontend_scan(order_id, token, user_obj):
 
 
 def run_sql_count_scan(username, password):
-    import backend.routers.announcements as r_ann
-    import backend.routers.hr as r_hr
-    import backend.routers.inventory as r_inv
-    import backend.routers.orders as r_orders
-    import backend.routers.payroll as r_payroll
-    import backend.routers.pricelist as r_price
-    import backend.routers.reports as r_reports
-    import backend.routers.tasks as r_tasks
-    import backend.routers.training as r_training
-    import backend.routers.users as r_users
+    # Query counts come from the X-SQL-Queries / X-SQL-Time headers set by
+    # backend/main.py; the per-statement breakdown is at /api/debug/sql/{request_id}.
     from backend.main import app
 
-    modules = [r_ann, r_hr, r_inv, r_orders, r_payroll, r_price, r_reports, r_tasks, r_training, r_users]
-    state = {"count": 0}
-    original_getters = {}
-
-    def wrap_get_db(orig):
-        def wrapped():
-            inner = orig()
-
-            class CountingDB:
-                def execute(self, query, params=()):
-                    state["count"] += 1
-                    return inner.execute(query, params)
-
-                def __getattr__(self, name):
-                    return getattr(inner, name)
-
-            return CountingDB()
-
-        return wrapped
-
-    for mod in modules:
-        original_getters[mod] = mod.get_db
-        mod.get_db = wrap_get_db(mod.get_db)
-
     def call(client, method, path, token=None, payload=None):
-        state["count"] = 0
         headers = {}
         if token:
             headers["Authorization"] = f"Bearer {token}"
@@ -424,7 +400,9 @@ def run_sql_count_scan(username, password):
             "status": resp.status_code,
             "elapsed_ms": round(elapsed, 2),
             "bytes": len(resp.content),
-            "sql_queries": state["count"],
+            "sql_queries": int(resp.headers.get("X-SQL-Queries", 0)),
+            "sql_ms": round(float(resp.headers.get("X-SQL-Time", 0)) * 1000, 2),
+            "request_id": resp.headers.get("X-Request-ID"),
         }
 
     results = []
@@ -477,16 +455,17 @@ def run_sql_count_scan(username, password):
         for method, path, payload in endpoints:
             results.append(call(client, method, path, token=token, payload=payload))
 
-    for mod, orig in original_getters.items():
-        mod.get_db = orig
-
     return results
 
 
-async def main():
-    prepare_perf_db()
+async def main(args):
+    dataset = prepare_perf_db(args.orders, args.employees, args.years, copy_db=args.copy_db)
     username, password = ensure_diag_user()
-    sql_scan = run_sql_count_scan(username, password)
+    from backend.index_advisor import analyze, collect_queries
+
+    with collect_queries() as queries:
+        sql_scan = run_sql_count_scan(username, password)
+    index_advice = analyze(queries)
 
     server = subprocess.Popen(
         [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", "8010"],
@@ -509,7 +488,9 @@ async def main():
 
         result = {
             "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "dataset": dataset,
             "sql_scan": sql_scan,
+            "index_advice": index_advice,
             "http_scan": http_scan,
             "frontend_scan": frontend_scan,
         }
@@ -528,4 +509,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="SQL, HTTP and frontend diagnostics on a production-size database.")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--employees", type=int, default=60)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--copy-db", action="store_true", help="measure a copy of polycontrol.db instead")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""Shared fixtures: the app on a throwaway SQLite database filled by benchmarks.dataset.
+
+backend.config reads the environment at import time, so it is set here,
+before any test module imports the backend. Run from the repository root:
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+import time
+
+import pytest
+
+_TMPDIR = tempfile.mkdtemp(prefix="polycontrol-tests-")
+os.environ["POLYCONTROL_DB_PATH"] = os.path.join(_TMPDIR, "test.db")
+os.environ["POLYCONTROL_UPLOAD_DIR"] = os.path.join(_TMPDIR, "uploads")
+os.environ["POLYCONTROL_PROFILE_DIR"] = os.path.join(_TMPDIR, "profiles")
+os.environ.pop("POLYCONTROL_DATABASE_URL", None)
+os.environ.pop("DATABASE_URL", None)
+
+DATASET_ORDERS = 1500
+DATASET_EMPLOYEES = 12
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """Row counts of the generated history (a year up to BENCHMARK_END, seed 42)."""
+    from benchmarks.dataset import BENCHMARK_END, load_dataset
+
+    return load_dataset(DATASET_ORDERS, employees=DATASET_EMPLOYEES, years=1, end=BENCHMARK_END)
+
+
+@pytest.fixture(scope="session")
+def client(dataset):
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def relay_idle(client) -> None:
+    """Wait until the outbox relay published this worker's commits.
+
+    Until then a publish can still invalidate cached responses and move
+    versions from pending to relayed under a test.
+    """
+    from backend import etags
+
+    deadline = time.monotonic() + 5
+    while etags._pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def login(client, username: str, password: str) -> dict:
+    response = client.post("/api/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture(scope="session")
+def director(client) -> dict:
+    return login(client, "admin", "admin123")
+
+
+@pytest.fixture(scope="session")
+def manager(client) -> dict:
+    from benchmarks.dataset import EMPLOYEE_PASSWORD
+
+    # emp001 is the first manager, on staff for the whole period.
+    return login(client, "emp001", EMPLOYEE_PASSWORD)
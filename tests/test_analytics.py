@@ -0,0 +1,94 @@
+"""Analytics snapshot: consistent with the tables when orders commit between reads or out of id order."""
+import pytest
+
+from backend import analytics
+from backend.database import get_db
+
+DAY = "2030-01-01"  # after the generated history, so only the orders inserted here fall on it
+
+
+@pytest.fixture
+def insert_order(client):
+    """Insert an order with one item directly, under a chosen id; removed again after the test."""
+    db = get_db()
+    base = db.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+    service_id = db.execute("SELECT MIN(id) FROM services").fetchone()[0]
+    db.close()
+
+    def insert(offset: int, status: str = "created") -> int:
+        order_id = base + offset
+        db = get_db()
+        db.execute(
+            """INSERT INTO orders (id, order_number, client_name, client_type, status, total_price, created_by, created_at)
+               VALUES (?, ?, 'Analytics test', 'retail', ?, 100, 1, ?)""",
+            (order_id, f"AT-{order_id}", status, f"{DAY} 12:00:00"),
+        )
+        db.execute(
+            "INSERT INTO order_items (order_id, service_id, quantity, unit_price, total) VALUES (?, ?, 1, 100, 100)",
+            (order_id, service_id),
+        )
+        db.commit()
+        db.close()
+        return order_id
+
+    analytics.reset_snapshot()
+    yield insert
+    db = get_db()
+    db.execute("DELETE FROM order_items WHERE order_id > ?", (base,))
+    db.execute("DELETE FROM orders WHERE id > ?", (base,))
+    db.commit()
+    db.close()
+    analytics.reset_snapshot()
+
+
+def _services():
+    return analytics.breakdown("service", DAY, DAY)
+
+
+def _statuses() -> dict[str, int]:
+    return {row["key"]: row["orders_count"] for row in analytics.breakdown("status", DAY, DAY)}
+
+
+def test_order_committed_between_the_two_reads(insert_order, monkeypatch):
+    insert_order(1)
+    assert _services()[0]["items_count"] == 1
+
+    columns = analytics._columns
+
+    def commit_before_items(query, params):
+        if "FROM order_items" in query:
+            monkeypatch.setattr(analytics, "_columns", columns)
+            insert_order(3)
+        return columns(query, params)
+
+    insert_order(2)
+    monkeypatch.setattr(analytics, "_columns", commit_before_items)
+    assert _services()[0]["items_count"] == 2
+
+    for _ in range(2):
+        rows = _services()
+        assert (rows[0]["items_count"], rows[0]["orders_count"], rows[0]["revenue"]) == (3, 3, 300.0)
+
+
+def test_order_committed_below_the_loaded_end(insert_order):
+    insert_order(2)
+    assert _statuses() == {"created": 1}
+
+    insert_order(1, status="closed")
+    assert _statuses() == {"created": 1, "closed": 1}
+    assert _services()[0]["items_count"] == 2
+
+
+def test_event_for_an_order_missing_from_the_snapshot(insert_order):
+    insert_order(2)
+    assert _statuses() == {"created": 1}
+    analytics._gaps.clear()  # as if the gap had outlived GAP_HORIZON_SECONDS
+
+    order_id = insert_order(1, status="closed")
+    analytics._on_event("orders.status_changed", {"order_id": order_id})
+    assert _statuses() == {"created": 1, "closed": 1}
+
+
+def test_malformed_date_is_rejected(client, director):
+    response = client.get("/api/reports/breakdown?date_from=garbage", headers=director)
+    assert response.status_code == 400
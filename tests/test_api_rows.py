@@ -0,0 +1,30 @@
+"""API rows of tables with generated *_day index columns keep their documented shape."""
+from backend.database import DAY_COLUMNS
+
+DAY_COLUMN_NAMES = {column for _, column, _ in DAY_COLUMNS}
+
+
+def _rows(client, headers, url) -> list[dict]:
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _assert_no_day_columns(rows: list[dict]) -> None:
+    assert rows
+    for row in rows:
+        assert DAY_COLUMN_NAMES.isdisjoint(row), sorted(DAY_COLUMN_NAMES & set(row))
+
+
+def test_rows_do_not_expose_day_columns(client, director):
+    _assert_no_day_columns(_rows(client, director, "/api/hr/incidents?date_from=2025-01-01&date_to=2025-12-31"))
+    _assert_no_day_columns(_rows(client, director, "/api/tasks"))
+
+    report = _rows(client, director, "/api/payroll/month-report?month_start=2025-12-01&month_end=2025-12-31")
+    _assert_no_day_columns([incident for row in report for incident in row["incidents"]])
+
+    order_id = client.get("/api/orders?status=closed", headers=director).json()["orders"][0]["id"]
+    _assert_no_day_columns(_rows(client, director, f"/api/orders/{order_id}")["history"])
+
+    material_id = _rows(client, director, "/api/inventory")[0]["id"]
+    _assert_no_day_columns(_rows(client, director, f"/api/inventory/{material_id}/ledger"))
@@ -0,0 +1,87 @@
+"""API compression: only from COMPRESSION_MIN_BYTES, only compressible types, always with Vary."""
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from backend import compression
+from backend.compression import CompressionMiddleware
+from backend.config import COMPRESSION_MIN_BYTES
+
+SMALL = "x" * (COMPRESSION_MIN_BYTES - 1)
+LARGE = "x" * COMPRESSION_MIN_BYTES
+
+
+@pytest.fixture(scope="module")
+def api():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+    @app.get("/api/text")
+    def text(size: int):
+        return PlainTextResponse("x" * size)
+
+    @app.get("/api/events")
+    def events():
+        return StreamingResponse(iter([LARGE]), media_type="text/event-stream")
+
+    @app.get("/api/export")
+    def export():
+        return StreamingResponse(iter([LARGE, LARGE]), media_type="text/csv")
+
+    @app.get("/page")
+    def page():
+        return PlainTextResponse(LARGE)
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _get(api, url, accept_encoding="gzip"):
+    # iter_raw: the body as sent, before httpx decodes it.
+    with api.stream("GET", url, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_threshold(api):
+    response, body = _get(api, f"/api/text?size={len(SMALL)}")
+    assert "Content-Encoding" not in response.headers
+    assert body == SMALL.encode()
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+    response, body = _get(api, f"/api/text?size={len(LARGE)}")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Length"] == str(len(body))
+    assert gzip.decompress(body) == LARGE.encode()
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_encoding_follows_accept_encoding(api, monkeypatch):
+    url = f"/api/text?size={len(LARGE)}"
+    response, body = _get(api, url, "identity")
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+    response, _ = _get(api, url, "gzip;q=0, deflate")
+    assert "Content-Encoding" not in response.headers
+
+    monkeypatch.setattr(compression, "brotli", None)
+    response, _ = _get(api, url, "br, gzip")
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+def test_streamed_body_is_compressed_chunk_by_chunk(api):
+    response, body = _get(api, "/api/export")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(body) == (LARGE * 2).encode()
+
+
+def test_events_and_non_api_paths_are_left_alone(api):
+    for url in ("/api/events", "/page"):
+        response, body = _get(api, url)
+        assert "Content-Encoding" not in response.headers
+        assert "Vary" not in response.headers
+        assert body == LARGE.encode()
@@ -0,0 +1,28 @@
+"""Dashboard widgets: the summary equals the report it mirrors, computed inside the dashboard's fan-out."""
+import pytest
+
+from backend.database import fan_out_reads
+
+PERIOD = "date_from=2025-06-01&date_to=2025-06-30"
+
+
+def _summary(client, headers) -> dict:
+    response = client.get(f"/api/dashboard?{PERIOD}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["widgets"]["summary"]["data"]
+
+
+@pytest.mark.parametrize(
+    ("role", "report"),
+    [("director", "/api/reports/finance"), ("manager", "/api/reports/orders-summary")],
+)
+def test_summary_matches_report(client, role, report, request):
+    headers = request.getfixturevalue(role)
+    response = client.get(f"{report}?{PERIOD}", headers=headers)
+    assert response.status_code == 200, response.text
+    assert _summary(client, headers) == response.json()
+
+
+def test_jobs_cannot_fan_out_again():
+    with pytest.raises(RuntimeError):
+        fan_out_reads({"nested": lambda db: fan_out_reads({"inner": lambda inner: 1})})
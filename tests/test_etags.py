@@ -0,0 +1,37 @@
+"""ETag / If-None-Match: 304 until a write changes the endpoint's data versions."""
+
+
+def _etag(client, headers, url) -> str:
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.headers["ETag"]
+
+
+def test_not_modified_until_a_write(client, director):
+    etag = _etag(client, director, "/api/tasks")
+    response = client.get("/api/tasks", headers={**director, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    users = client.get("/api/users", headers=director).json()
+    employee_id = next(u["id"] for u in users if u["is_active"] and u["role"] != "director")
+    response = client.post("/api/tasks", json={"title": "Проверка ETag", "assigned_to": employee_id}, headers=director)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/tasks", headers={**director, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_unrelated_write_keeps_the_validator(client, director, relay_idle):
+    etag = _etag(client, director, "/api/tasks")
+    response = client.post("/api/announcements", json={"message": "Проверка ETag"}, headers=director)
+    assert response.status_code == 200, response.text
+    assert client.get("/api/tasks", headers={**director, "If-None-Match": etag}).status_code == 304
+
+
+def test_validator_is_per_user_and_query(client, director, manager):
+    etag = _etag(client, director, "/api/tasks")
+    assert client.get("/api/tasks", headers={**manager, "If-None-Match": etag}).status_code == 200
+    assert client.get("/api/tasks?done=1", headers={**director, "If-None-Match": etag}).status_code == 200
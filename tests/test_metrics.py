@@ -0,0 +1,28 @@
+"""GET /metrics: closed unless a token or local access is configured."""
+import pytest
+
+from backend.routers import metrics
+
+# Address TestClient reports for its requests.
+TEST_CLIENT_HOST = "testclient"
+
+
+def test_disabled_without_token_or_opt_in(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "polycontrol_http_requests_total" in response.text
+
+
+@pytest.mark.parametrize("allow_local", [False, True])
+def test_loopback_clients_need_the_opt_in(client, monkeypatch, allow_local):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    monkeypatch.setattr(metrics, "METRICS_ALLOW_LOCAL", allow_local)
+    monkeypatch.setattr(metrics, "LOOPBACK_HOSTS", (TEST_CLIENT_HOST,))
+    assert client.get("/metrics").status_code == (200 if allow_local else 403)
@@ -0,0 +1,76 @@
+"""Outbox relay: gaps left by rolled-back transactions and ids that commit late."""
+import asyncio
+import json
+
+import pytest
+
+from backend import etags, outbox, realtime
+from backend.database import get_db
+
+PREFIX = "/api/tests-outbox"
+
+
+@pytest.fixture
+def relay(client, monkeypatch):
+    """The relay stopped, so the test polls it; published row ids are collected."""
+    client.portal.call(outbox.stop_outbox_relay)
+    published = []
+    monkeypatch.setattr(realtime, "_listeners", [*realtime._listeners, lambda kind, payload: published.append(payload["row"])])
+    db = get_db()
+    base = db.execute("SELECT COALESCE(MAX(id), 0) FROM realtime_outbox").fetchone()[0]
+    db.close()
+    monkeypatch.setattr(outbox, "_last_id", base)
+    outbox._gaps.clear()
+    yield base, published
+    outbox._gaps.clear()
+    client.portal.call(outbox.start_outbox_relay)
+
+
+def _commit_row(row_id: int) -> None:
+    """An outbox row committed with a given id, as a transaction holding that sequence value would."""
+    db = get_db()
+    db.execute(
+        "INSERT INTO realtime_outbox (id, kind, cache_prefixes, payload) VALUES (?, 'tests.gap', ?, ?)",
+        (row_id, json.dumps([PREFIX]), json.dumps({"row": row_id})),
+    )
+    db.commit()
+    db.close()
+
+
+def _poll() -> None:
+    asyncio.run(outbox.relay_once())
+
+
+def test_rolled_back_id_does_not_hold_back_later_rows(relay, monkeypatch):
+    base, published = relay
+    _commit_row(base + 2)  # base + 1 rolled back
+    _poll()
+    assert published == [base + 2]
+    assert list(outbox._gaps) == [base + 1]
+
+    _commit_row(base + 3)
+    _poll()
+    assert published == [base + 2, base + 3]
+
+    # Past the horizon the missing id is forgotten.
+    monkeypatch.setitem(outbox._gaps, base + 1, 0.0)
+    _poll()
+    assert outbox._gaps == {}
+    assert published == [base + 2, base + 3]
+
+
+def test_late_commit_is_published_and_changes_the_version(relay):
+    base, published = relay
+    _commit_row(base + 2)
+    _poll()
+    version = etags.data_version([PREFIX])
+
+    # The transaction that holds base + 1 commits after the relay moved past it.
+    _commit_row(base + 1)
+    _poll()
+    assert published == [base + 2, base + 1]
+    assert outbox._gaps == {}
+    assert etags.data_version([PREFIX]) != version
+
+    _poll()
+    assert published == [base + 2, base + 1]
@@ -0,0 +1,60 @@
+"""Request profiling: a director's flagged request gets X-Profile-ID, and that id is what /api/debug serves."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.profiling import profile_request, profiled
+
+
+@pytest.fixture(scope="module")
+def profiled_api(client):
+    # The switch is read at import time and off in tests: install the hooks by hand.
+    app = FastAPI()
+    app.middleware("http")(profile_request)
+
+    @app.get("/api/work")
+    @profiled
+    def work():
+        return {"total": sum(i * i for i in range(200000))}
+
+    with TestClient(app) as profiled_client:
+        yield profiled_client
+
+
+def _profile_id(profiled_api, headers, url="/api/work") -> str | None:
+    response = profiled_api.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.headers.get("X-Profile-ID")
+
+
+@pytest.mark.parametrize(("flag", "suffix"), [("sample", ".collapsed.txt"), ("cprofile", ".pstats")])
+def test_profile_id_names_the_stored_profile(client, profiled_api, director, flag, suffix):
+    profile_id = _profile_id(profiled_api, {**director, "X-Profile": flag})
+    assert profile_id and profile_id.isalnum()
+
+    response = client.get(f"/api/debug/profiles/{profile_id}", headers=director)
+    assert response.status_code == 200, response.text
+    meta = response.json()
+    assert (meta["id"], meta["mode"], meta["path"], meta["file"]) == (profile_id, flag, "/api/work", profile_id + suffix)
+    assert profile_id in {profile["id"] for profile in client.get("/api/debug/profiles", headers=director).json()["profiles"]}
+
+    response = client.get(f"/api/debug/profiles/{profile_id}/download", headers=director)
+    assert response.status_code == 200
+    assert response.content
+
+
+def test_query_flag_and_unknown_mode(client, profiled_api, director):
+    profile_id = _profile_id(profiled_api, director, "/api/work?_profile=fast")
+    assert client.get(f"/api/debug/profiles/{profile_id}", headers=director).json()["mode"] == "sample"
+
+
+def test_no_profile_id_without_a_directors_flag(profiled_api, director, manager):
+    assert _profile_id(profiled_api, director) is None
+    assert _profile_id(profiled_api, {**director, "X-Profile": "off"}) is None
+    assert _profile_id(profiled_api, {**manager, "X-Profile": "sample"}) is None
+
+
+def test_only_profile_ids_are_served(client, director, manager):
+    assert client.get("/api/debug/profiles/not-an-id", headers=director).status_code == 404
+    assert client.get("/api/debug/profiles/0123456789abcdef", headers=director).status_code == 404
+    assert client.get("/api/debug/profiles", headers=manager).status_code == 403
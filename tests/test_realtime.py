@@ -0,0 +1,82 @@
+"""WebSocket transport and the overflow policies of the realtime broker."""
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend import realtime
+
+USER = {"id": 1, "role": "director"}
+
+
+def _event(event_id: int, channel: str = "orders") -> dict:
+    return {
+        "id": event_id, "kind": "orders.updated", "channels": [channel], "cache_prefixes": ["/api/orders"],
+        "payload": {"order_id": event_id}, "user_ids": [], "roles": [], "created_at": "2025-01-01T00:00:00",
+    }
+
+
+def test_ws_rejects_bad_token(client):
+    with client.websocket_connect("/api/realtime/ws") as ws:
+        ws.send_json({"token": "not-a-token"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4401
+
+
+def test_ws_hello_frames_and_overflow_close(client, director):
+    token = director["Authorization"][7:]
+    with client.websocket_connect("/api/realtime/ws") as ws:
+        ws.send_json({"token": token, "channels": ["orders"]})
+        hello = json.loads(ws.receive_text())
+        assert hello["t"] == "hello"
+        assert hello["channels"] == list(realtime.CHANNEL_TABLE)
+        sub = realtime.get_subscription(hello["subscription_id"])
+        assert sub.transport == "ws" and sub.channels == {"orders"}
+
+        # Not subscribed to hr: filtered out at publish time, the orders event arrives.
+        realtime._loop.call_soon_threadsafe(realtime._fan_out, _event(7, channel="hr"))
+        realtime._loop.call_soon_threadsafe(realtime._fan_out, _event(8))
+        frame = json.loads(ws.receive_text())
+        assert frame == [8, "orders.updated", [realtime.CHANNEL_TABLE.index("orders")],
+                         [realtime.PREFIX_TABLE.index("/api/orders")], {"order_id": 8}]
+
+        # The disconnect policy queues None: the socket is closed with 4000.
+        realtime._loop.call_soon_threadsafe(sub.queue.put_nowait, None)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_text()
+    assert closed.value.code == 4000
+    assert realtime.get_subscription(hello["subscription_id"]) is None
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "resync", "disconnect"])
+def test_overflow_policies(monkeypatch, policy):
+    monkeypatch.setattr(realtime, "REALTIME_QUEUE_SIZE", 2)
+    monkeypatch.setattr(realtime, "REALTIME_OVERFLOW_POLICY", policy)
+
+    async def scenario():
+        sub = realtime.subscribe(USER, {"orders"}, transport="ws")
+        try:
+            for event_id in range(1, 6):
+                realtime._fan_out(_event(event_id))
+            queued = []
+            while not sub.queue.empty():
+                queued.append(sub.queue.get_nowait())
+            return sub, queued
+        finally:
+            realtime.unsubscribe(sub)
+            realtime._heartbeat_task.cancel()
+
+    sub, queued = asyncio.run(scenario())
+    if policy == "drop_oldest":
+        assert [event["id"] for event in queued] == [4, 5]
+        assert sub.dropped == 3
+    elif policy == "resync":
+        # Each overflow replaces the backlog with one marker carrying the newest id.
+        assert [event["kind"] for event in queued] == [realtime.RESYNC_KIND]
+        assert realtime.encode_compact(queued[0]) == f'[5,"{realtime.RESYNC_KIND}"]'
+        assert sub.dropped == 6
+    else:
+        assert queued[0] is None
+        assert sub.dropped == 3
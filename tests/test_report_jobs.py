@@ -0,0 +1,41 @@
+"""Report jobs: a finished result is reused until the data versions it was built at change."""
+import time
+
+from backend import etags
+
+JOB = {"kind": "orders-summary", "date_from": "2025-01-01", "date_to": "2025-12-31"}
+
+
+def _submit(client, headers) -> dict:
+    response = client.post("/api/reports/jobs", json=JOB, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _finished(client, headers) -> str:
+    job = _submit(client, headers)
+    deadline = time.monotonic() + 10
+    while job["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, job
+        time.sleep(0.02)
+        job = client.get(f"/api/reports/jobs/{job['id']}", headers=headers).json()
+    assert job["status"] == "done", job
+    return job["id"]
+
+
+def test_result_is_reused_until_a_write(client, director):
+    job_id = _finished(client, director)
+    assert _submit(client, director)["id"] == job_id
+
+    response = client.post("/api/orders", json={"client_name": "Report job test", "items": []}, headers=director)
+    assert response.status_code == 200, response.text
+    assert _submit(client, director)["id"] != job_id
+
+
+def test_late_commit_below_the_relay_position_is_a_change(client, director):
+    job_id = _finished(client, director)
+    assert _submit(client, director)["id"] == job_id
+
+    # What the relay reports for an outbox id that committed after higher ones.
+    etags.mark_relayed(["/api/orders"], 1)
+    assert _submit(client, director)["id"] != job_id
@@ -0,0 +1,89 @@
+"""Response cache: invalidation by write events, periods that end today and stale-while-revalidate."""
+import time
+from datetime import date, timedelta
+
+from backend import outbox, realtime, response_cache
+from backend.database import get_db
+
+
+def _get(client, headers, url):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_write_invalidates_cached_response(client, director, relay_idle):
+    url = "/api/work-journal?date_from=2025-12-01&date_to=2025-12-31"
+    _get(client, director, url)
+    assert _get(client, director, url).headers["X-Cache"] == "HIT"
+
+    # tasks.created lists /api/work-journal in its cache_prefixes.
+    users = client.get("/api/users", headers=director).json()
+    employee_id = next(u["id"] for u in users if u["is_active"] and u["role"] != "director")
+    response = client.post(
+        "/api/tasks",
+        json={"title": "Проверка кэша", "assigned_to": employee_id},
+        headers=director,
+    )
+    assert response.status_code == 200, response.text
+
+    assert _get(client, director, url).headers["X-Cache"] == "MISS"
+    assert _get(client, director, url).headers["X-Cache"] == "HIT"
+
+
+def test_default_period_is_not_served_after_midnight(client, director, relay_idle, monkeypatch):
+    url = "/api/work-journal"
+    _get(client, director, url)
+    assert _get(client, director, url).headers["X-Cache"] == "HIT"
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(response_cache, "date", Tomorrow)
+    assert _get(client, director, url).headers["X-Cache"] == "MISS"
+
+
+def _summary_url() -> str:
+    # A period with today in it, so new orders show up in the totals.
+    return f"/api/reports/orders-summary?date_from={date.today().isoformat()}"
+
+
+def _outbox_tail() -> tuple[int, int]:
+    db = get_db()
+    row = db.execute(
+        "SELECT COALESCE(MAX(id), 0), SUM(CASE WHEN kind = ? THEN 1 ELSE 0 END) FROM realtime_outbox",
+        (outbox.REFRESHED_KIND,),
+    ).fetchone()
+    db.close()
+    return row[0], row[1] or 0
+
+
+def test_stale_refresh_is_announced_without_an_outbox_row(client, director, manager, relay_idle, monkeypatch):
+    published = []
+    monkeypatch.setattr(realtime, "_listeners", [*realtime._listeners, lambda kind, payload: published.append(kind)])
+    _get(client, director, _summary_url())
+    assert _get(client, director, _summary_url()).headers["X-Cache"] == "HIT"
+
+    assert client.post("/api/orders", json={"client_name": "SWR test", "items": []}, headers=manager).status_code == 200
+    tail = _outbox_tail()
+    assert _get(client, director, _summary_url()).headers["X-Cache"] == "STALE"
+
+    deadline = time.monotonic() + 10
+    while _get(client, director, _summary_url()).headers["X-Cache"] != "HIT":
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert outbox.REFRESHED_KIND in published
+    assert _outbox_tail() == tail
+
+
+def test_writer_is_not_served_a_body_older_than_own_write(client, director, relay_idle):
+    before = _get(client, director, _summary_url()).json()["totals"]["total_orders"]
+    assert _get(client, director, _summary_url()).headers["X-Cache"] == "HIT"
+
+    assert client.post("/api/orders", json={"client_name": "SWR test", "items": []}, headers=director).status_code == 200
+
+    response = _get(client, director, _summary_url())
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.json()["totals"]["total_orders"] == before + 1
@@ -0,0 +1,92 @@
+"""The rollups maintained by the write paths equal a rebuild from the source tables."""
+from backend.database import get_db
+from backend.rollups import rebuild_rollups
+
+ROLLUP_KEYS = {
+    "report_daily_orders": ("day", "status"),
+    "report_daily_services": ("day", "service_id"),
+    "report_daily_penalties": ("day",),
+    "report_daily_employees": ("day", "user_id"),
+}
+
+
+def _snapshot(db, table: str) -> dict:
+    """Rows by key with rounded values; rows the write paths left at zero are not rows of a rebuild."""
+    keys = ROLLUP_KEYS[table]
+    rows = {}
+    for row in db.execute(f"SELECT * FROM {table}").fetchall():
+        values = tuple(round(value, 2) for name, value in dict(row).items() if name not in keys)
+        if any(values):
+            rows[tuple(row[key] for key in keys)] = values
+    return rows
+
+
+def assert_rollups_match_rebuild(*tables: str) -> None:
+    db = get_db()
+    maintained = {table: _snapshot(db, table) for table in tables}
+    rebuild_rollups(db)
+    rebuilt = {table: _snapshot(db, table) for table in tables}
+    db.rollback()
+    db.close()
+    for table in tables:
+        assert maintained[table] == rebuilt[table], table
+
+
+def _create_order(client, headers, services: list[int]) -> int:
+    response = client.post(
+        "/api/orders",
+        json={
+            "client_name": "Rollup test",
+            "items": [{"service_id": service_id, "quantity": 2, "width": 1, "height": 1} for service_id in services],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def _move(client, headers, order_id: int, *statuses: str) -> None:
+    for status in statuses:
+        response = client.patch(f"/api/orders/{order_id}/status", json={"status": status}, headers=headers)
+        assert response.status_code == 200, response.text
+
+
+def test_finance_rollups_follow_order_and_incident_writes(client, director):
+    services = [service["id"] for service in client.get("/api/pricelist", headers=director).json()]
+    closed = _create_order(client, director, services[:2])
+    _move(client, director, closed, "design", "production", "ready", "closed")
+    cancelled = _create_order(client, director, services[2:4])
+    _move(client, director, cancelled, "cancelled")
+    defect = _create_order(client, director, services[:1])
+    _move(client, director, defect, "production", "defect", "cancelled")
+    _create_order(client, director, services[4:5])
+
+    employee = client.get("/api/users", headers=director).json()[-1]["id"]
+    for amount in (300, 0):
+        response = client.post(
+            "/api/hr/incidents",
+            json={"user_id": employee, "type": "late", "description": "rollup test", "deduction_amount": amount},
+            headers=director,
+        )
+        assert response.status_code == 200, response.text
+
+    assert_rollups_match_rebuild("report_daily_orders", "report_daily_services", "report_daily_penalties")
+
+
+def test_employee_rollups_follow_attendance_transitions_and_incidents(client, director, manager):
+    response = client.post("/api/hr/checkin", headers=manager)
+    assert response.status_code == 200, response.text
+    services = [service["id"] for service in client.get("/api/pricelist", headers=manager).json()]
+    order = _create_order(client, manager, services[:1])
+    _move(client, manager, order, "design")
+    _move(client, director, order, "production", "ready")
+
+    me = client.get("/api/auth/me", headers=manager).json()["id"]
+    response = client.post(
+        "/api/hr/incidents",
+        json={"user_id": me, "type": "complaint", "description": "rollup test", "deduction_amount": 150},
+        headers=director,
+    )
+    assert response.status_code == 200, response.text
+
+    assert_rollups_match_rebuild("report_daily_employees")
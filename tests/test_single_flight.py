@@ -0,0 +1,80 @@
+"""Single-flight: identical concurrent calls share one computation, never across an invalidation."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import single_flight as sf
+from backend.response_cache import invalidate_prefixes
+
+PREFIX = "/api/tests-single-flight"
+USER = {"id": 1, "role": "director"}
+
+
+def _blocking_endpoint():
+    """An endpoint that waits for `release`, and the list of its actual runs."""
+    release = threading.Event()
+    runs = []
+
+    @sf.single_flight(PREFIX)
+    def endpoint(date_from: str = "", user=None):
+        runs.append(date_from)
+        release.wait(5)
+        if date_from == "bad":
+            raise ValueError(date_from)
+        return {"date_from": date_from, "run": len(runs)}
+
+    return endpoint, release, runs
+
+
+def _wait_for_followers(count: int) -> None:
+    deadline = time.monotonic() + 5
+    while sum(call.followers for call in list(sf._calls.values())) < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_identical_calls_share_one_run():
+    endpoint, release, runs = _blocking_endpoint()
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(endpoint, date_from="2025-01-01", user=USER) for _ in range(4)]
+        other = pool.submit(endpoint, date_from="2025-02-01", user=USER)
+        _wait_for_followers(3)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert runs.count("2025-01-01") == 1
+    assert all(result is results[0] for result in results)
+    assert other.result()["date_from"] == "2025-02-01"
+    assert not sf._calls
+
+
+def test_followers_get_the_leaders_exception():
+    endpoint, release, runs = _blocking_endpoint()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(endpoint, date_from="bad", user=USER) for _ in range(3)]
+        _wait_for_followers(2)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert runs == ["bad"]
+
+
+def test_call_after_an_invalidation_does_not_join_an_older_run():
+    endpoint, release, runs = _blocking_endpoint()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(endpoint, date_from="2025-03-01", user=USER)
+        deadline = time.monotonic() + 5
+        while not runs:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        invalidate_prefixes([PREFIX])
+        second = pool.submit(endpoint, date_from="2025-03-01", user=USER)
+        while len(runs) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        release.set()
+        assert first.result() is not second.result()
+    assert runs == ["2025-03-01", "2025-03-01"]
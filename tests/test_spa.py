@@ -0,0 +1,78 @@
+"""SPA build from memory: the precompressed sibling the client accepts, immutable hashed assets only."""
+from types import SimpleNamespace
+
+import pytest
+
+from backend.spa import IMMUTABLE, REVALIDATE, load_manifest, spa_response
+
+FILES = {
+    "index.html": b"<!doctype html>",
+    "favicon.svg": b"<svg/>",
+    "assets/index-a1B2_c-D.js": b"console.log('app')",
+    "assets/index-a1B2_c-D.js.br": b"br body",
+    "assets/index-a1B2_c-D.js.gz": b"gzip body",
+    "assets/vendor-something.js": b"console.log('vendor')",
+    "assets/font-regular.woff2": b"font",
+}
+
+
+@pytest.fixture
+def dist(tmp_path):
+    for name, body in FILES.items():
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(body)
+    return str(tmp_path)
+
+
+@pytest.fixture(autouse=True)
+def fresh_manifest(monkeypatch):
+    """Each test loads its own build; the app's manifest is restored afterwards."""
+    monkeypatch.setattr("backend.spa._manifest", None)
+
+
+def _get(dist, path, **headers):
+    request = SimpleNamespace(headers=headers)
+    return spa_response(dist, path, request)
+
+
+def test_serves_the_accepted_sibling(dist):
+    cases = [
+        ("gzip, deflate, br", "br", b"br body"),
+        ("gzip", "gzip", b"gzip body"),
+        ("br;q=0, gzip", "gzip", b"gzip body"),
+        ("", None, b"console.log('app')"),
+    ]
+    etags = set()
+    for accept_encoding, encoding, body in cases:
+        response = _get(dist, "assets/index-a1B2_c-D.js", **{"Accept-Encoding": accept_encoding})
+        assert response.body == body
+        assert response.headers.get("Content-Encoding") == encoding
+        assert response.headers["Vary"] == "Accept-Encoding"
+        etags.add(response.headers["ETag"])
+    assert len(etags) == 3
+
+    response = _get(dist, "favicon.svg", **{"Accept-Encoding": "br, gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+
+
+def test_only_hashed_assets_are_immutable(dist):
+    manifest = load_manifest(dist)
+    assert manifest["assets/index-a1B2_c-D.js"]["cache_control"] == IMMUTABLE
+    for path in ("index.html", "favicon.svg", "assets/vendor-something.js", "assets/font-regular.woff2"):
+        assert manifest[path]["cache_control"] == REVALIDATE, path
+    assert "assets/index-a1B2_c-D.js.br" not in manifest
+
+
+def test_etag_revalidates_per_encoding(dist):
+    etag = _get(dist, "assets/index-a1B2_c-D.js", **{"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = _get(dist, "assets/index-a1B2_c-D.js", **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    response = _get(dist, "assets/index-a1B2_c-D.js", **{"Accept-Encoding": "br", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_unknown_paths(dist):
+    assert _get(dist, "assets/index-00000000.js").status_code == 404
+    assert _get(dist, "orders/15").body == FILES["index.html"]
@@ -0,0 +1,20 @@
+"""Request ids: made by the server; a client's X-Request-ID is only echoed next to the trace."""
+
+
+def test_client_request_id_is_not_the_trace_key(client, director, manager):
+    first = client.get("/api/tasks", headers={**manager, "X-Request-ID": "shared-id"})
+    second = client.get("/api/tasks", headers={**manager, "X-Request-ID": "shared-id"})
+    request_ids = {first.headers["X-Request-ID"], second.headers["X-Request-ID"]}
+    assert len(request_ids) == 2 and "shared-id" not in request_ids
+    assert first.headers["X-Client-Request-ID"] == "shared-id"
+
+    assert client.get("/api/debug/sql/shared-id", headers=director).status_code == 404
+    for request_id in request_ids:
+        trace = client.get(f"/api/debug/sql/{request_id}", headers=director).json()
+        assert trace["client_request_id"] == "shared-id"
+        assert trace["queries"] > 0
+
+
+def test_malformed_client_id_is_not_echoed(client, manager):
+    response = client.get("/api/tasks", headers={**manager, "X-Request-ID": "bad id\twith spaces"})
+    assert "X-Client-Request-ID" not in response.headers